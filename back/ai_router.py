@@ -1,21 +1,24 @@
 # ai_router.py
 
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from services.bedrock_service import BedrockService
+from services.tool_router import route_tool, local_decision, get_tool_router_stats
 from services.opensearch_service import (
-    get_opensearch_client, 
-    search_semantic_incidents, 
+    get_async_opensearch_client,
+    search_semantic_incidents_async,
     INDEX_NAME
 )
 import services.sql_service as sql_service
+from services.llm_cache import get_llm_cache_stats
+import asyncio
 import json
+import os
+import threading
 
-# --- IMPORTATIONS CRITIQUES AJOUTÉES ---
-from datetime import datetime, date
-from decimal import Decimal
-import psycopg2.extras # <-- C'EST L'IMPORT QUI MANQUAIT
-# --- FIN DES AJOUTS ---
+from serialization import FastJSONResponse, dumps_str
 
 
 # Initialiser les services
@@ -28,29 +31,17 @@ except Exception as e:
 # Pré-charger le schéma au démarrage (meilleure performance)
 DB_SCHEMA = sql_service.get_database_schema()
 
-router = APIRouter(prefix="/ai", tags=["AI Chatbot (Agent)"])
+# Exécution spéculative quand le choix de l'outil demande un appel au LLM:
+# - "off": étapes séquentielles
+# - "search": la recherche OpenSearch (sans coût Bedrock) démarre pendant le choix
+# - "full": la génération SQL (appel Bedrock) démarre aussi; payée même si la recherche l'emporte
+AGENT_SPECULATION = os.getenv("AGENT_SPECULATION", "search")
+
+router = APIRouter(prefix="/ai", tags=["AI Chatbot (Agent)"], default_response_class=FastJSONResponse)
 
 class AIQueryRequest(BaseModel):
     query: str
 
-# --- FONCTION DE CONVERSION (corrigée avec l'import) ---
-def convert_datetime_to_str(obj):
-    """Convertit les objets datetime, date, Decimal et RealDictRow en types JSON-serialisables"""
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    # Cette ligne fonctionne maintenant grâce à l'import
-    elif isinstance(obj, psycopg2.extras.RealDictRow): 
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, dict):
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_datetime_to_str(item) for item in obj]
-    return obj
-# --- FIN DE LA FONCTION ---
-
-
 # --- FONCTION format_rag_context_from_hits (TRADUITE) ---
 def format_rag_context_from_hits(hits: list) -> str:
     """
@@ -88,11 +79,102 @@ def format_rag_context_from_hits(hits: list) -> str:
 # --- FIN DE LA TRADUCTION ---
 
 
+# --- EXÉCUTION SPÉCULATIVE DES BRANCHES ---
+
+_speculation_lock = threading.Lock()
+_speculation_stats = {"routed_locally": 0, "speculated": 0, "search_used": 0, "search_wasted": 0,
+                      "sql_used": 0, "sql_wasted": 0}
+
+
+def _count_speculation(*keys: str):
+    with _speculation_lock:
+        for key in keys:
+            _speculation_stats[key] += 1
+
+
+async def generate_sql(user_query: str) -> str:
+    # Appel Bedrock bloquant exécuté hors de l'event loop
+    return await run_in_threadpool(bedrock_service.generate_sql_query, DB_SCHEMA, user_query)
+
+
+async def search_incidents(user_query: str) -> dict:
+    os_client = get_async_opensearch_client()
+    return await search_semantic_incidents_async(os_client, INDEX_NAME, user_query, size=3, profile="rag")
+
+
+def _discard(task: asyncio.Task):
+    """Annule une branche non retenue (une génération SQL déjà lancée va à son terme, hors requête)"""
+    task.cancel()
+    # Exception éventuelle récupérée: pas d'avertissement "Task exception was never retrieved"
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def choose_tool(user_query: str, speculation: str = AGENT_SPECULATION):
+    """
+    Choisit l'outil et retourne (outil, branche préparée): la tâche de la
+    première étape de l'outil choisi (recherche ou génération SQL) si elle a
+    été lancée par spéculation, sinon None.
+
+    Décision locale sûre (services/tool_router.py): rien à paralléliser.
+    Sinon, selon AGENT_SPECULATION, les branches démarrent pendant l'appel au
+    LLM; la branche non retenue est annulée. Latence: max(choix, branche)
+    au lieu de choix + branche.
+    """
+    # Décision locale sûre: déjà comptée par local_decision, aucun appel bloquant ici
+    tool_choice = local_decision(user_query)
+    if tool_choice is not None:
+        _count_speculation("routed_locally")
+        return tool_choice, None
+    if speculation not in ("search", "full"):
+        return await run_in_threadpool(route_tool, user_query, bedrock_service.decide_tool), None
+
+    _count_speculation("speculated")
+    branches = {"search": asyncio.create_task(search_incidents(user_query))}
+    if speculation == "full":
+        branches["sql"] = asyncio.create_task(generate_sql(user_query))
+
+    try:
+        tool_choice = await run_in_threadpool(route_tool, user_query, bedrock_service.decide_tool)
+    except BaseException:
+        for task in branches.values():
+            _discard(task)
+        raise
+
+    for branch, task in branches.items():
+        if branch != tool_choice:
+            _discard(task)
+            _count_speculation(f"{branch}_wasted")
+        else:
+            _count_speculation(f"{branch}_used")
+    return tool_choice, branches.get(tool_choice)
+
+
+def get_speculation_stats() -> dict:
+    with _speculation_lock:
+        return {"mode": AGENT_SPECULATION, **_speculation_stats}
+
+
+@router.get("/llm-cache")
+async def llm_cache_stats():
+    """Statistiques du cache des réponses Bedrock (taux de succès, latence et jetons économisés)"""
+    return FastJSONResponse({"status": "success", "cache": get_llm_cache_stats()})
+
+
+@router.get("/tool-router")
+async def tool_router_stats():
+    """Statistiques du routage local des questions (décisions locales / appels au LLM)"""
+    return FastJSONResponse({
+        "status": "success",
+        "router": get_tool_router_stats(),
+        "speculation": get_speculation_stats(),
+    })
+
+
 @router.post("/query")
 async def handle_ai_query(request: AIQueryRequest):
     """
     Endpoint de l'Agent Hybride:
-    1.  Décide de l'outil (SQL ou Search)
+    1.  Décide de l'outil (SQL ou Search): routeur local, LLM si incertain
     2.  Exécute l'outil choisi
     3.  Génère une réponse finale
     """
@@ -105,27 +187,26 @@ async def handle_ai_query(request: AIQueryRequest):
     user_query = request.query
     
     try:
-        # ÉTAPE 1: L'agent décide de l'outil
+        # ÉTAPE 1: L'agent décide de l'outil (branches lancées en parallèle si AGENT_SPECULATION)
         print(f"Agent: Deciding route for query: '{user_query}'")
-        tool_choice = bedrock_service.decide_tool(user_query)
-        print(f"Agent: Tool chosen: {tool_choice}")
+        tool_choice, prepared = await choose_tool(user_query)
+        print(f"Agent: Tool chosen: {tool_choice}{' (speculative branch)' if prepared else ''}")
 
         if tool_choice == "sql":
             # --- ROUTE SQL (Text-to-SQL) ---
             
             # ÉTAPE 2 (SQL): Générer le SQL
-            sql_query = bedrock_service.generate_sql_query(DB_SCHEMA, user_query)
+            sql_query = await prepared if prepared else await generate_sql(user_query)
             
             # ÉTAPE 3 (SQL): Exécuter le SQL
             try:
-                sql_results, columns = sql_service.execute_safe_sql(sql_query)
+                sql_results, columns = await sql_service.execute_safe_sql_async(sql_query)
                 
                 print(f"Agent SQL: DB returned {len(sql_results)} row(s).")
 
-                serializable_results = convert_datetime_to_str(sql_results)
-                
-                context = json.dumps(serializable_results)
-                data_payload = {"columns": columns, "rows": serializable_results}
+                # Sérialisation en une passe (datetime, Decimal, RealDictRow gérés nativement)
+                context = dumps_str(sql_results)
+                data_payload = {"columns": columns, "rows": sql_results}
             
             except Exception as e:
                 print(f"Error during SQL serialization: {repr(e)}")
@@ -134,21 +215,20 @@ async def handle_ai_query(request: AIQueryRequest):
 
             # ÉTAPE 4 (SQL): Générer la réponse finale
             print("Agent SQL: Generating response...")
-            ai_response = bedrock_service.generate_rag_response(context, user_query)
+            ai_response = await run_in_threadpool(bedrock_service.generate_rag_response, context, user_query)
             
-            return {
+            return FastJSONResponse({
                 "response": ai_response, 
                 "type": "sql", 
                 "data": data_payload, 
                 "query": sql_query
-            }
+            })
 
         else:
             # --- ROUTE RECHERCHE (RAG) ---
             
             # ÉTAPE 2 (RAG): Chercher dans OpenSearch
-            os_client = get_opensearch_client()
-            search_results = search_semantic_incidents(os_client, INDEX_NAME, user_query, size=3)
+            search_results = await prepared if prepared else await search_incidents(user_query)
             hits = search_results.get("hits", {}).get("hits", [])
 
             print(f"Agent RAG: OpenSearch returned {len(hits)} hit(s).")
@@ -158,7 +238,7 @@ async def handle_ai_query(request: AIQueryRequest):
             
             # ÉTAPE 4 (RAG): Générer la réponse finale
             print("Agent RAG: Generating response...")
-            ai_response = bedrock_service.generate_rag_response(context, user_query)
+            ai_response = await run_in_threadpool(bedrock_service.generate_rag_response, context, user_query)
             
             return {
                 "response": ai_response, 
@@ -169,4 +249,87 @@ async def handle_ai_query(request: AIQueryRequest):
     except Exception as e:
         error_message = repr(e)
         print(f"Major agent error: {error_message}")
-        raise HTTPException(status_code=500, detail=f"Agent error: {error_message}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Agent error: {error_message}")
+
+
+# --- STREAMING (Server-Sent Events) ---
+
+def sse_event(event: str, data) -> str:
+    """Formate un événement Server-Sent Events (données JSON sur une ligne)"""
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+
+async def agent_event_stream(user_query: str):
+    """
+    Même agent que /ai/query, en événements: étapes (tool, sql, rows, hits)
+    puis la réponse jeton par jeton (token), et done (ou error).
+    Les appels Bedrock bloquants s'exécutent hors de l'event loop.
+    """
+    try:
+        print(f"Agent (stream): Deciding route for query: '{user_query}'")
+        tool_choice, prepared = await choose_tool(user_query)
+        yield sse_event("tool", {"tool": tool_choice})
+
+        if tool_choice == "sql":
+            sql_query = await prepared if prepared else await generate_sql(user_query)
+            yield sse_event("sql", {"query": sql_query})
+
+            try:
+                sql_results, columns = await sql_service.execute_safe_sql_async(sql_query)
+                print(f"Agent SQL (stream): DB returned {len(sql_results)} row(s).")
+                context = dumps_str(sql_results)
+                yield sse_event("rows", {"count": len(sql_results), "columns": columns, "rows": sql_results})
+            except Exception as e:
+                print(f"Error during SQL execution: {repr(e)}")
+                context = json.dumps({"Error": str(e)})
+                yield sse_event("rows", {"count": 0, "error": str(e)})
+
+            done = {"type": "sql", "query": sql_query}
+
+        else:
+            search_results = await prepared if prepared else await search_incidents(user_query)
+            hits = search_results.get("hits", {}).get("hits", [])
+            print(f"Agent RAG (stream): OpenSearch returned {len(hits)} hit(s).")
+            yield sse_event("hits", {
+                "count": len(hits),
+                "event_ids": [hit.get("_source", {}).get("event_id") for hit in hits],
+            })
+
+            context = format_rag_context_from_hits(hits)
+            done = {"type": "search", "context_hits": len(hits)}
+
+        answer = bedrock_service.stream_rag_response(context, user_query)
+        try:
+            async for chunk in iterate_in_threadpool(answer):
+                yield sse_event("token", {"text": chunk})
+        finally:
+            # Client déconnecté: fermer le flux Bedrock (sinon il reste ouvert jusqu'au ramasse-miettes)
+            answer.close()
+
+        yield sse_event("done", done)
+
+    except Exception as e:
+        error_message = repr(e)
+        print(f"Major agent error (stream): {error_message}")
+        yield sse_event("error", {"message": f"Agent error: {error_message}"})
+
+
+@router.post("/query/stream")
+async def handle_ai_query_stream(request: AIQueryRequest):
+    """
+    Version streamée de /ai/query (text/event-stream): le premier événement
+    (outil choisi) arrive après le routage, la réponse s'affiche au fil de
+    sa génération.
+    """
+    if not bedrock_service:
+        raise HTTPException(
+            status_code=503, 
+            detail="Bedrock service is not initialized."
+        )
+
+    return StreamingResponse(
+        agent_event_stream(request.query),
+        media_type="text/event-stream",
+        # Pas de mise en mémoire tampon par un proxy (nginx) ni de cache
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,131 @@
+# benchmarks/bench_retrieval.py
+"""
+Benchmark de pertinence et de latence de la recherche RAG: mode lexical
+(BM25, requête actuelle) contre mode hybride (BM25 + k-NN sur les embeddings
+LSA), sur l'index publié. Le mode "local" interroge l'index BM25 embarqué
+(services/local_search_service.py) et ne nécessite pas OpenSearch.
+
+Requêtes "à élément connu": pour un échantillon d'incidents, quelques mots
+tirés de la description (éventuellement dans le désordre, avec des mots
+retirés). Un résultat est pertinent s'il a la même description que
+l'incident source. Mesures: recall@k, MRR@k et latence p50/p95 (sans cache).
+
+Prérequis: Postgres joignable et index construit par enhanced_indexing.py
+(reconstruction complète, ou --local-only pour le seul mode local); OpenSearch
+joignable pour les modes lexical et hybrid.
+
+Usage (depuis back/):
+    python -m benchmarks.bench_retrieval [--queries 200] [--words 3] [--k 3]
+    python -m benchmarks.bench_retrieval --modes local
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+from typing import Dict, List, Set, Tuple
+
+from database import query_db
+from services.local_search_service import search_local_incidents
+from services.opensearch_service import INDEX_NAME, get_opensearch_client, search_semantic_incidents
+from services.text_analysis import FRENCH_STOPWORDS, fold
+
+MODES = ("lexical", "hybrid", "local")
+
+
+def build_queries(count: int, words: int, seed: int) -> List[Tuple[str, Set[int]]]:
+    """(question, incidents pertinents) tirés au hasard parmi les incidents décrits"""
+    rng = random.Random(seed)
+    rows = query_db(
+        """
+        SELECT e.event_id, e.description, d.ids
+        FROM event e
+        JOIN (
+            SELECT description, array_agg(event_id) AS ids
+            FROM event
+            WHERE description IS NOT NULL
+            GROUP BY description
+        ) d ON d.description = e.description
+        ORDER BY random()
+        LIMIT %s;
+        """,
+        params=(count,),
+    )
+    queries = []
+    for row in rows:
+        terms = [word for word in row["description"].split() if fold(word) not in FRENCH_STOPWORDS]
+        if not terms:
+            continue
+        picked = rng.sample(terms, min(words, len(terms)))
+        queries.append((" ".join(picked), set(row["ids"])))
+    return queries
+
+
+def search(client, query_text: str, mode: str, k: int) -> dict:
+    # Les journaux de chaque recherche masqueraient le tableau de résultats
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "local":
+            return search_local_incidents(query_text, size=k)
+        return search_semantic_incidents(client, INDEX_NAME, query_text, size=k, use_cache=False, mode=mode)
+
+
+def evaluate(client, queries: List[Tuple[str, Set[int]]], mode: str, k: int) -> Dict[str, float]:
+    hits_at_k, reciprocal_ranks, latencies = 0, [], []
+    for query_text, relevant in queries:
+        started = time.perf_counter()
+        result = search(client, query_text, mode, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        ranked = [hit["_source"].get("event_id") for hit in result["hits"]["hits"]]
+        rank = next((position for position, event_id in enumerate(ranked, 1) if event_id in relevant), None)
+        if rank is not None:
+            hits_at_k += 1
+            reciprocal_ranks.append(1.0 / rank)
+        else:
+            reciprocal_ranks.append(0.0)
+
+    latencies.sort()
+    return {
+        "recall": hits_at_k / len(queries),
+        "mrr": statistics.fmean(reciprocal_ranks),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=3, help="mots de la description par question")
+    parser.add_argument("--k", type=int, default=3, help="résultats évalués (size de la recherche RAG)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--modes", default="lexical,hybrid", help=f"modes comparés parmi {', '.join(MODES)}")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise SystemExit(f"Modes inconnus: {', '.join(sorted(unknown))}")
+
+    client = get_opensearch_client() if set(modes) - {"local"} else None
+    queries = build_queries(args.queries, args.words, args.seed)
+    if not queries:
+        raise SystemExit("Aucun incident avec description: rien à évaluer")
+
+    # Premier passage non mesuré: chargement du modèle, caches disque/segments
+    for mode in modes:
+        for query_text, _ in queries[:10]:
+            search(client, query_text, mode, args.k)
+
+    print(f"{len(queries)} questions de {args.words} mots, k={args.k}:")
+    print(f"  {'mode':<10} {'recall@k':>9} {'MRR@k':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in modes:
+        metrics = evaluate(client, queries, mode, args.k)
+        print(f"  {mode:<10} {metrics['recall']:>9.3f} {metrics['mrr']:>7.3f} "
+              f"{metrics['p50']:>8.1f} {metrics['p95']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
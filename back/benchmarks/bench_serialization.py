@@ -0,0 +1,120 @@
+# benchmarks/bench_serialization.py
+"""
+Microbenchmark: ancienne sérialisation (convert_datetime_to_str + JSONResponse)
+contre serialization.FastJSONResponse, sur une page /get_events de 200 lignes
+et un résultat text-to-SQL de 200 lignes (RealDictRow).
+
+Usage (depuis back/):
+    python -m benchmarks.bench_serialization [--rows 200] [--repeat 2000]
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from psycopg2.extras import RealDictRow
+
+from serialization import FastJSONResponse, dumps_str
+
+
+def convert_datetime_to_str(obj):
+    """Copie de l'ancienne fonction des routers (référence)"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, RealDictRow):
+        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
+    elif isinstance(obj, dict):
+        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_datetime_to_str(item) for item in obj]
+    return obj
+
+
+def build_events_page(rows: int) -> dict:
+    """Page /get_events telle que construite par main.get_events"""
+    start = datetime(2024, 1, 1, 8, 30)
+    events = []
+    for i in range(rows):
+        events.append({
+            "id": i + 1,
+            "type": "NEAR_MISS",
+            "classification": "INJURY",
+            "start_datetime": start + timedelta(hours=i),
+            "end_datetime": start + timedelta(hours=i, minutes=45),
+            "description": f"Chute dans les escaliers du bâtiment {i} par temps froid, sol glissant",
+            "person": {
+                "id": i % 50,
+                "matricule": f"M{i % 50:05d}",
+                "name": "Alain",
+                "family_name": "Mercier",
+                "role": "Operator",
+            },
+        })
+    return {
+        "status": "success",
+        "offset": 0,
+        "total_count": 100000,
+        "count": rows,
+        "next_cursor": "eyJpZCI6MjAwfQ",
+        "events": events,
+    }
+
+
+def build_sql_rows(rows: int) -> list:
+    """Résultat de sql_service.execute_safe_sql (liste de RealDictRow)"""
+    result = []
+    for i in range(rows):
+        row = RealDictRow()
+        row["event_id"] = i + 1
+        row["type"] = "EQUIPMENT_FAILURE"
+        row["start_datetime"] = datetime(2024, 3, 1, 12, 0) + timedelta(days=i)
+        row["implementation_date"] = date(2024, 4, 1) + timedelta(days=i)
+        row["total_cost"] = Decimal("1250.50") + i
+        row["name"] = "Mercier"
+        result.append(row)
+    return result
+
+
+def bench(label: str, func, repeat: int) -> float:
+    seconds = min(timeit.repeat(func, number=repeat, repeat=5)) / repeat
+    print(f"  {label:<48} {seconds * 1e6:10.1f} µs")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = build_events_page(args.rows)
+    print(f"/get_events ({args.rows} lignes):")
+    old = bench("convert_datetime_to_str + JSONResponse", lambda: JSONResponse(convert_datetime_to_str(page)), args.repeat)
+    new = bench("FastJSONResponse", lambda: FastJSONResponse(page), args.repeat)
+    print(f"  gain: x{old / new:.1f}\n")
+
+    sql_rows = build_sql_rows(args.rows)
+    payload = {"response": "...", "type": "sql", "query": "SELECT ...", "columns": list(sql_rows[0].keys())}
+    print(f"text-to-SQL ({args.rows} lignes, contexte LLM + réponse):")
+
+    def old_sql():
+        rows = convert_datetime_to_str(sql_rows)
+        json.dumps(rows)
+        return JSONResponse({**payload, "data": {"rows": rows}})
+
+    def new_sql():
+        dumps_str(sql_rows)
+        return FastJSONResponse({**payload, "data": {"rows": sql_rows}})
+
+    old = bench("convert_datetime_to_str + json.dumps + JSONResponse", old_sql, args.repeat)
+    new = bench("dumps_str + FastJSONResponse", new_sql, args.repeat)
+    print(f"  gain: x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
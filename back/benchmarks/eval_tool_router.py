@@ -0,0 +1,122 @@
+# benchmarks/eval_tool_router.py
+"""
+Évaluation hors ligne du routeur local (services/tool_router.py) contre les
+décisions du LLM (BedrockService.decide_tool) journalisées par l'agent.
+
+Pour chaque seuil: couverture (part des questions décidées localement),
+accord avec le LLM sur ces questions, et accord global (les questions
+incertaines partent au LLM: seules les décisions locales peuvent être
+fausses). Comparaison des règles seules et du modèle entraîné sur une
+partie des décisions (évalué sur le reste), plus la latence du routage.
+
+Sources des décisions:
+- le journal TOOL_ROUTER_LOG (rempli en mode hybrid pour les questions
+  incertaines; TOOL_ROUTER_MODE=llm journalise toutes les questions)
+- --questions fichier.txt: une question par ligne, étiquetée par Bedrock
+  (appels réels, ajoutés au journal)
+
+Usage (depuis back/):
+    python -m benchmarks.eval_tool_router [--log chemin] [--test-fraction 0.3]
+    python -m benchmarks.eval_tool_router --questions questions.txt
+    python -m benchmarks.eval_tool_router --save   # entraîne sur tout le journal
+"""
+
+import argparse
+import random
+import time
+from typing import List, Sequence, Tuple
+
+from services.tool_router import (
+    SEED_EXAMPLES,
+    TOOL_ROUTER_LOG,
+    TOOL_ROUTER_MODEL,
+    ToolRouterModel,
+    extract_features,
+    load_decision_log,
+    log_decision,
+    train_tool_router,
+)
+
+THRESHOLDS = (0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+
+
+def label_with_llm(path: str) -> int:
+    """Étiquette les questions d'un fichier avec Bedrock et les ajoute au journal"""
+    from services.bedrock_service import BedrockService
+
+    bedrock_service = BedrockService()
+    seed = ToolRouterModel.seed()
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    for question in questions:
+        log_decision(question, bedrock_service.decide_tool(question), seed.probability(question))
+    return len(questions)
+
+
+def report(name: str, model: ToolRouterModel, examples: Sequence[Tuple[str, str]]):
+    probabilities = [model.probability(query) for query, _ in examples]
+    labels = [tool for _, tool in examples]
+    argmax_agreement = sum((p >= 0.5) == (tool == "sql") for p, tool in zip(probabilities, labels)) / len(labels)
+    print(f"\n{name} ({len(examples)} questions, accord sans LLM: {argmax_agreement:.3f})")
+    print(f"  {'seuil':>6} {'couverture':>11} {'accord local':>13} {'accord global':>14}")
+    for threshold in THRESHOLDS:
+        local = [
+            ("sql" if p >= threshold else "search", tool)
+            for p, tool in zip(probabilities, labels)
+            if p >= threshold or p <= 1.0 - threshold
+        ]
+        errors = sum(decided != tool for decided, tool in local)
+        local_agreement = f"{1.0 - errors / len(local):.3f}" if local else "-"
+        print(f"  {threshold:>6.2f} {len(local) / len(labels):>11.3f} {local_agreement:>13} "
+              f"{1.0 - errors / len(labels):>14.3f}")
+
+
+def latency_us(model: ToolRouterModel, queries: List[str]) -> Tuple[float, float]:
+    """p50 / p99 du routage d'une question jamais vue (sans le cache des caractéristiques)"""
+    timings = []
+    for query in queries:
+        extract_features.cache_clear()
+        started = time.perf_counter()
+        model.probability(query)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return timings[len(timings) // 2], timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=TOOL_ROUTER_LOG, help="journal des décisions du LLM (JSONL)")
+    parser.add_argument("--questions", help="fichier de questions à faire étiqueter par Bedrock")
+    parser.add_argument("--test-fraction", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", action="store_true", help=f"entraîne sur tout le journal et écrit {TOOL_ROUTER_MODEL}")
+    args = parser.parse_args()
+
+    if args.questions:
+        print(f"{label_with_llm(args.questions)} questions étiquetées par le LLM.")
+
+    seed_model = ToolRouterModel.seed()
+    report("Règles, exemples du prompt de routage", seed_model, SEED_EXAMPLES)
+
+    examples = load_decision_log(args.log)
+    if not examples:
+        raise SystemExit(f"\nAucune décision journalisée dans {args.log}: rien d'autre à évaluer")
+
+    random.Random(args.seed).shuffle(examples)
+    n_test = max(1, int(len(examples) * args.test_fraction))
+    test, train = examples[:n_test], examples[n_test:]
+    report("Règles seules, jeu de test", seed_model, test)
+    if train:
+        report(f"Modèle entraîné sur {len(train)} décisions, jeu de test", train_tool_router(train), test)
+
+    p50, p99 = latency_us(seed_model, [query for query, _ in examples[:1000]])
+    print(f"\nLatence du routage local: p50 {p50:.1f} µs, p99 {p99:.1f} µs")
+
+    if args.save:
+        model = train_tool_router(examples)
+        model.save(TOOL_ROUTER_MODEL)
+        print(f"Modèle entraîné sur {len(examples)} décisions: {TOOL_ROUTER_MODEL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,8 @@ from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
 from services.bedrock_service import BedrockService
 import services.sql_service as sql_service
-import json
 
-# --- IMPORTATIONS CRITIQUES (copiées de ai_router.py) ---
-from datetime import datetime, date
-from decimal import Decimal
-import psycopg2.extras
-# --- FIN DES IMPORTS ---
+from serialization import FastJSONResponse, dumps_str
 
 # Initialiser les services
 try:
@@ -22,26 +17,11 @@ except Exception as e:
 # Pré-charger le schéma
 DB_SCHEMA = sql_service.get_database_schema()
 
-router = APIRouter(prefix="/ai", tags=["AI Charting"])
+router = APIRouter(prefix="/ai", tags=["AI Charting"], default_response_class=FastJSONResponse)
 
 class AIChartRequest(BaseModel):
     query: str
 
-# --- FONCTION DE CONVERSION (copiée de ai_router.py) ---
-def convert_datetime_to_str(obj):
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, psycopg2.extras.RealDictRow): 
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, dict):
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_datetime_to_str(item) for item in obj]
-    return obj
-# --- FIN DE LA FONCTION ---
-
 
 @router.post("/chart")
 async def handle_ai_chart(request: AIChartRequest):
@@ -68,19 +48,18 @@ async def handle_ai_chart(request: AIChartRequest):
         # ÉTAPE 2: Exécuter le SQL
         print(f"Agent Graphique: Exécution: '{sql_query}'")
         try:
-            sql_results, columns = sql_service.execute_safe_sql(sql_query) # <-- 'columns' est récupéré ici
-            serializable_results = convert_datetime_to_str(sql_results)
-            context_json = json.dumps(serializable_results)
-            data_payload = {"columns": columns, "rows": serializable_results}
+            sql_results, columns = await sql_service.execute_safe_sql_async(sql_query) # <-- 'columns' est récupéré ici
+            context_json = dumps_str(sql_results)
+            data_payload = {"columns": columns, "rows": sql_results}
             
             # Gérer les cas d'erreur SQL avant d'appeler Bedrock
-            if serializable_results and "Erreur" in serializable_results[0]:
-                 return {
+            if sql_results and "Erreur" in sql_results[0]:
+                 return FastJSONResponse({
                     "type": "error",
-                    "analysis": {"chart_type": "list", "title": "Erreur SQL", "insight": serializable_results[0]["Erreur"]},
+                    "analysis": {"chart_type": "list", "title": "Erreur SQL", "insight": sql_results[0]["Erreur"]},
                     "data": data_payload,
                     "query": sql_query
-                }
+                })
 
         except Exception as e:
             print(f"Erreur lors de l'exécution/sérialisation SQL: {repr(e)}")
@@ -95,12 +74,12 @@ async def handle_ai_chart(request: AIChartRequest):
         # --- FIN DE LA CORRECTION ---
         
         # ÉTAPE 4: Retourner le package de données pour le frontend
-        return {
+        return FastJSONResponse({
             "type": "chart",
             "analysis": chart_analysis, # ex: {"chart_type": "bar", "title": "...", "index": "name", "categories": ["count"]}
             "data": data_payload,
             "query": sql_query
-        }
+        })
 
     except Exception as e:
         error_message = repr(e)
@@ -1,60 +1,402 @@
+import asyncio
+import functools
 import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2.extensions import make_dsn, TRANSACTION_STATUS_IDLE
 from psycopg2.extras import RealDictCursor
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Configuration du pool de connexions (surchargeable par variables d'environnement)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # secondes
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # attente max d'une connexion libre
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", "5"))  # 0 = à chaque emprunt
+# Threads dédiés aux requêtes lancées depuis les handlers async (par défaut: autant que de connexions)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX)))
+# Nombre de lignes ramenées par aller-retour en mode streaming (curseur serveur)
+DB_STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+
+
+def get_dsn() -> str:
+    """Construit le DSN PostgreSQL à partir des variables DB_*"""
+    return make_dsn(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        dbname=os.getenv("DB_NAME", "events"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "postgres")
+    )
+
+
+class PoolTimeout(Exception):
+    """Levée quand aucune connexion ne se libère dans le délai imparti"""
+
+
+class ConnectionPool:
+    """
+    Pool de connexions psycopg2 thread-safe.
+
+    - Ouvre jusqu'à `max_size` connexions, en garde au moins `min_size` ouvertes.
+    - Ferme les connexions inactives depuis plus de `idle_timeout` secondes.
+    - Vérifie la connexion à l'emprunt (SELECT 1 si elle dort depuis plus de
+      `healthcheck_interval` secondes) et la remplace si elle est morte.
+    - Si le pool est plein, l'appelant attend au plus `timeout` secondes.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = DB_POOL_MIN,
+        max_size: int = DB_POOL_MAX,
+        idle_timeout: float = DB_POOL_IDLE_TIMEOUT,
+        timeout: float = DB_POOL_TIMEOUT,
+        healthcheck_interval: float = DB_POOL_HEALTHCHECK_INTERVAL,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Taille de pool invalide: 0 <= min_size <= max_size et max_size >= 1")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()  # (connexion, horodatage du dernier rendu)
+        self._size = 0  # connexions ouvertes (inactives + empruntées + en cours d'ouverture)
+        self._in_use = 0
+        self._waiting = 0
+
+        # Statistiques cumulées
+        self._checkouts = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+        for _ in range(min_size):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _prune_idle(self, now: float) -> list:
+        """Retire les connexions inactives expirées (appelé sous verrou)"""
+        expired = []
+        # Les plus anciennes sont à gauche (on réutilise toujours la plus récente)
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._discarded += 1
+            expired.append(conn)
+        return expired
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if idle_for < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout: float = None):
+        """Emprunte une connexion au pool (à rendre avec putconn)"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn = None
+            idle_for = 0.0
+            create = False
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    for expired in self._prune_idle(now):
+                        self._close_quietly(expired)
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        idle_for = now - last_used
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Aucune connexion disponible après {timeout:.1f}s "
+                            f"(pool plein: {self.max_size} connexions)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                self._in_use += 1
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_for):
+                # Connexion morte: on la jette et on réessaie
+                self._close_quietly(conn)
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._discarded += 1
+                    self._cond.notify()
+                continue
+
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._checkout_time_total += elapsed
+                self._checkout_time_max = max(self._checkout_time_max, elapsed)
+            return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Rend une connexion au pool (ou la ferme si discard=True ou si elle est cassée)"""
+        if not discard and not conn.closed:
+            try:
+                # Terminer la transaction implicite pour ne pas laisser la connexion "idle in transaction"
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    def closeall(self):
+        """Ferme toutes les connexions inactives du pool"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        """Retourne les statistiques d'utilisation du pool"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "checkouts": checkouts,
+                "checkout_avg_ms": round(self._checkout_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_max_ms": round(self._checkout_time_max * 1000, 3),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Retourne le pool de connexions du processus (créé au premier appel)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_dsn())
+    return _pool
+
+
+def get_pool_stats() -> dict:
+    """Statistiques du pool (vide tant qu'aucune connexion n'a été demandée)"""
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
 def get_db_connection():
-    """Crée et retourne une connexion à la base de données PostgreSQL"""
+    """
+    Emprunte une connexion à la base de données PostgreSQL depuis le pool.
+    La connexion doit être rendue avec release_db_connection() (et non fermée).
+    """
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            port=os.getenv("DB_PORT", "5432"),
-            database=os.getenv("DB_NAME", "events"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", "postgres")
-        )
-        return conn
+        return get_pool().getconn()
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise Exception(f"Erreur de connexion à la base de données: {str(e)}")
 
+
+def release_db_connection(conn, discard: bool = False):
+    """Rend une connexion empruntée avec get_db_connection() au pool"""
+    get_pool().putconn(conn, discard=discard)
+
+
+@contextmanager
+def db_connection():
+    """Context manager: emprunte une connexion et la rend au pool en sortie"""
+    conn = get_db_connection()
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # Connexion probablement cassée: ne pas la remettre dans le pool
+        discard = True
+        raise
+    finally:
+        release_db_connection(conn, discard=discard)
+
+
 def query_db(query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = True):
     """
     Exécute une requête SQL et retourne les résultats
-    
+
     Args:
         query: La requête SQL à exécuter
         params: Les paramètres pour la requête (tuple)
         fetch_one: Si True, retourne un seul résultat (fetchone)
         fetch_all: Si True, retourne tous les résultats (fetchall). Ignoré si fetch_one=True
-    
+
     Returns:
         Les résultats de la requête (dict ou list de dict)
     """
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        
-        if fetch_one:
-            result = cursor.fetchone()
-        else:
-            result = cursor.fetchall()
-        
-        return result
+        with db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+
+                if fetch_one:
+                    result = cursor.fetchone()
+                else:
+                    result = cursor.fetchall()
+
+                return result
     except Exception as e:
         raise Exception(f"Erreur lors de l'exécution de la requête: {str(e)}")
+
+
+def stream_query_db(query: str, params: tuple = None, batch_size: int = DB_STREAM_BATCH_SIZE) -> Iterator[List[dict]]:
+    """
+    Exécute une requête SQL avec un curseur serveur nommé et retourne les résultats par lots.
+
+    Contrairement à query_db, le résultat n'est jamais chargé en entier en mémoire:
+    chaque itération ramène au plus `batch_size` lignes (RealDictRow). La connexion
+    est empruntée au pool au premier lot et rendue dès que le générateur est épuisé
+    ou fermé (break, close(), exception).
+
+    Args:
+        query: La requête SQL à exécuter (SELECT)
+        params: Les paramètres pour la requête (tuple)
+        batch_size: Nombre de lignes par lot
+
+    Yields:
+        Des listes de RealDictRow de taille <= batch_size
+    """
+    conn = get_db_connection()
+    discard = False
+    try:
+        # Un curseur nommé est un curseur côté serveur (DECLARE ... CURSOR)
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        discard = True
+        raise Exception(f"Erreur lors de l'exécution de la requête: {str(e)}")
+    except psycopg2.Error as e:
+        raise Exception(f"Erreur lors de l'exécution de la requête: {str(e)}")
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        release_db_connection(conn, discard=discard)
+
+
+# --- Accès asynchrone (pour les handlers FastAPI async) ---
+
+_executor = None
+_executor_lock = threading.Lock()
 
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Retourne l'exécuteur borné utilisé pour les requêtes lancées depuis l'event loop"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """
+    Exécute une fonction bloquante (psycopg2) dans l'exécuteur DB sans bloquer l'event loop.
+    Le nombre de threads est borné pour ne pas dépasser la taille du pool de connexions.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def query_db_async(query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = True):
+    """
+    Version async de query_db: mêmes arguments, mêmes résultats (RealDictRow),
+    mais la requête s'exécute hors de l'event loop.
+    """
+    return await run_in_db_executor(query_db, query, params=params, fetch_one=fetch_one, fetch_all=fetch_all)
@@ -1,30 +1,63 @@
 # enhanced_indexing.py
 
+import argparse
+import fcntl
+import math
+import os
+import queue
 import sys
-from database import query_db, get_db_connection
+import threading
+import time
+from contextlib import contextmanager
+from database import query_db, stream_query_db, get_db_connection, release_db_connection, DB_POOL_MAX, DB_STREAM_BATCH_SIZE
 from services.opensearch_service import (
     get_opensearch_client, 
-    ensure_index, 
-    index_incident
+    send_bulk_chunk,
+    bulk_delete_incidents,
+    create_versioned_index,
+    publish_index,
+    gc_index_versions,
+    get_alias_targets,
+    OS_BULK_WORKERS
 )
+from services.embedding_service import (
+    LsaModel,
+    fit_lsa_model,
+    get_embedding_model,
+    delete_embedding_model,
+    model_path,
+    EMBEDDING_FIT_SAMPLE,
+)
+from services.local_search_service import LocalIndexBuilder, delete_local_index
 from opensearchpy import OpenSearch
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Tuple
 import json
 
-# Nom de l'index défini dans main.py et opensearch_service.py
+# Alias de l'index défini dans main.py et opensearch_service.py
+# (désigne la dernière version publiée incidents_v<N>)
 INDEX_NAME = "incidents" 
 
-def fetch_rich_events() -> List[Dict[str, Any]]:
-    """
-    Récupère tous les événements de Postgres avec leurs données liées
-    en utilisant les aggrégations JSON de Postgres, basées sur l'UML.
-    """
-    print("Récupération des données enrichies depuis PostgreSQL...")
-    
-    # Cette requête utilise LEFT JOIN et json_agg pour agréger toutes
-    # les données liées en objets/tableaux JSON directement dans la BDD.
-    
-    sql = """
+# Nom de l'index local construit sans OpenSearch (--local-only)
+LOCAL_ONLY_INDEX = "incidents_local"
+
+def parse_rich_event(row) -> Dict[str, Any]:
+    """Convertit une ligne RealDictRow en dict et parse les champs JSON agrégés."""
+    # (psycopg2 < 3 ne décode pas auto json_agg en dicts quand il vient de RealDictCursor)
+    dict_row = dict(row)
+    for key in ['risks', 'corrective_measures', 'involved_employees', 'organizational_unit', 'declared_by']:
+        if isinstance(dict_row.get(key), str):
+            dict_row[key] = json.loads(dict_row[key])
+        elif dict_row.get(key) is None:
+             dict_row[key] = [] if key in ['risks', 'corrective_measures', 'involved_employees'] else {}
+    return dict_row
+
+# Cette requête utilise LEFT JOIN et json_agg pour agréger toutes
+# les données liées en objets/tableaux JSON directement dans la BDD.
+# Chaque relation N-N est pré-agrégée une seule fois par event_id dans une
+# table dérivée, puis jointe à event: pas de sous-requête exécutée par ligne
+# ni de GROUP BY sur le résultat final. {filter_<alias>} restreint chaque
+# table (même condition sur event_id) à une partition ou à une liste d'ids.
+RICH_EVENTS_SQL = """
     SELECT
         e.event_id,
         e.type,
@@ -49,84 +82,146 @@ def fetch_rich_events() -> List[Dict[str, Any]]:
             'matricule', p_decl.matricule
         ) AS declared_by,
         
-        -- Risques liés (relation N-N, via sous-requête)
-        COALESCE(
-            (
-                SELECT json_agg(json_build_object(
-                    'risk_id', r.risk_id,
-                    'name', r.name,
-                    'gravity', r.gravity,
-                    'probability', r.probability
-                ))
-                FROM event_risk er
-                JOIN risk r ON er.risk_id = r.risk_id
-                WHERE er.event_id = e.event_id
-            ),
-            '[]'::json
-        ) AS risks,
-        
-        -- Mesures correctives (relation N-N, via sous-requête)
-        COALESCE(
-            (
-                SELECT json_agg(json_build_object(
-                    'measure_id', cm.measure_id,
-                    'name', cm.name,
-                    'description', cm.description,
-                    'cost', cm.cost,
-                    'implementation_date', cm.implementation_date,
-                    'owner_name', p_owner.name || ' ' || p_owner.family_name
-                ))
-                FROM event_corrective_measure ecm
-                JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id
-                LEFT JOIN person p_owner ON cm.owner_id = p_owner.person_id
-                WHERE ecm.event_id = e.event_id
-            ),
-            '[]'::json
-        ) AS corrective_measures,
-        
-        -- Employés impliqués (relation N-N, via sous-requête)
-        COALESCE(
-            (
-                SELECT json_agg(json_build_object(
-                    'person_id', p_emp.person_id,
-                    'name', p_emp.name,
-                    'family_name', p_emp.family_name,
-                    'matricule', p_emp.matricule,
-                    'involvement_type', ee.involvement_type
-                ))
-                FROM event_employee ee
-                JOIN person p_emp ON ee.person_id = p_emp.person_id
-                WHERE ee.event_id = e.event_id
-            ),
-            '[]'::json
-        ) AS involved_employees
+        COALESCE(r.risks, '[]'::json) AS risks,
+        COALESCE(m.corrective_measures, '[]'::json) AS corrective_measures,
+        COALESCE(emp.involved_employees, '[]'::json) AS involved_employees
         
     FROM event e
     LEFT JOIN organizational_unit ou ON e.organizational_unit_id = ou.unit_id
     LEFT JOIN person p_decl ON e.declared_by_id = p_decl.person_id
-    
-    GROUP BY e.event_id, ou.unit_id, p_decl.person_id
+
+    -- Risques liés (relation N-N)
+    LEFT JOIN (
+        SELECT
+            er.event_id,
+            json_agg(json_build_object(
+                'risk_id', r.risk_id,
+                'name', r.name,
+                'gravity', r.gravity,
+                'probability', r.probability
+            )) AS risks
+        FROM event_risk er
+        JOIN risk r ON er.risk_id = r.risk_id
+        {filter_er}
+        GROUP BY er.event_id
+    ) r ON r.event_id = e.event_id
+
+    -- Mesures correctives (relation N-N)
+    LEFT JOIN (
+        SELECT
+            ecm.event_id,
+            json_agg(json_build_object(
+                'measure_id', cm.measure_id,
+                'name', cm.name,
+                'description', cm.description,
+                'cost', cm.cost,
+                'implementation_date', cm.implementation_date,
+                'owner_name', p_owner.name || ' ' || p_owner.family_name
+            )) AS corrective_measures
+        FROM event_corrective_measure ecm
+        JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id
+        LEFT JOIN person p_owner ON cm.owner_id = p_owner.person_id
+        {filter_ecm}
+        GROUP BY ecm.event_id
+    ) m ON m.event_id = e.event_id
+
+    -- Employés impliqués (relation N-N)
+    LEFT JOIN (
+        SELECT
+            ee.event_id,
+            json_agg(json_build_object(
+                'person_id', p_emp.person_id,
+                'name', p_emp.name,
+                'family_name', p_emp.family_name,
+                'matricule', p_emp.matricule,
+                'involvement_type', ee.involvement_type
+            )) AS involved_employees
+        FROM event_employee ee
+        JOIN person p_emp ON ee.person_id = p_emp.person_id
+        {filter_ee}
+        GROUP BY ee.event_id
+    ) emp ON emp.event_id = e.event_id
+
+    {filter_e}
     ORDER BY e.event_id;
+"""
+
+def rich_events_query(
+    event_ids: Optional[List[int]] = None,
+    id_range: Optional[Tuple[int, int]] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
     """
-    
+    Requête (et paramètres) de lecture des événements enrichis.
+
+    Args:
+        event_ids: Limite la lecture à ces événements
+        id_range: Limite la lecture à l'intervalle [début, fin[ d'event_id (partition)
+    """
+    if event_ids is not None:
+        condition, params = "WHERE {alias}.event_id = ANY(%(event_ids)s)", {"event_ids": list(event_ids)}
+    elif id_range is not None:
+        condition = "WHERE {alias}.event_id >= %(id_start)s AND {alias}.event_id < %(id_end)s"
+        params = {"id_start": id_range[0], "id_end": id_range[1]}
+    else:
+        condition, params = "", None
+
+    sql = RICH_EVENTS_SQL
+    for alias in ("e", "er", "ecm", "ee"):
+        sql = sql.replace(f"{{filter_{alias}}}", condition.format(alias=alias))
+    return sql, params
+
+def partition_rich_events_queries(
+    partitions: int,
+    event_ids: Optional[List[int]] = None,
+) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Découpe la lecture en `partitions` requêtes indépendantes, à exécuter en
+    parallèle sur des connexions distinctes: intervalles d'event_id de même
+    largeur, ou tranches contiguës de la liste event_ids.
+    """
+    if partitions <= 1:
+        return [rich_events_query(event_ids)]
+
+    if event_ids is not None:
+        ids = sorted(event_ids)
+        size = max(1, math.ceil(len(ids) / partitions))
+        return [rich_events_query(ids[i:i + size]) for i in range(0, len(ids), size)]
+
+    bounds = query_db("SELECT MIN(event_id) AS first_id, MAX(event_id) AS last_id FROM event;", fetch_one=True)
+    if bounds["first_id"] is None:
+        return [rich_events_query()]
+    first_id, last_id = bounds["first_id"], bounds["last_id"]
+    width = max(1, math.ceil((last_id - first_id + 1) / partitions))
+    return [
+        rich_events_query(id_range=(start, min(start + width, last_id + 1)))
+        for start in range(first_id, last_id + 1, width)
+    ]
+
+def fetch_rich_events(
+    batch_size: int = DB_STREAM_BATCH_SIZE,
+    event_ids: Optional[List[int]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Récupère les événements de Postgres avec leurs données liées
+    en utilisant les aggrégations JSON de Postgres, basées sur l'UML.
+
+    Les lignes sont lues via un curseur serveur (stream_query_db) et renvoyées
+    par lots de `batch_size` dicts: la mémoire reste constante quelle que soit
+    la taille de la table event.
+
+    Args:
+        event_ids: Si fourni, limite la lecture à ces événements (synchro incrémentale)
+    """
+    print("Récupération des données enrichies depuis PostgreSQL...")
+    sql, params = rich_events_query(event_ids)
+
     try:
-        # query_db retourne une liste de RealDictRow (similaires à des dicts)
-        results = query_db(sql, fetch_all=True)
-        
-        # Convertir les RealDictRow en vrais dicts et parser les strings JSON
-        # (psycopg2 < 3 ne décode pas auto json_agg en dicts quand il vient de RealDictCursor)
-        final_results = []
-        for row in results:
-            dict_row = dict(row)
-            for key in ['risks', 'corrective_measures', 'involved_employees', 'organizational_unit', 'declared_by']:
-                if isinstance(dict_row.get(key), str):
-                    dict_row[key] = json.loads(dict_row[key])
-                elif dict_row.get(key) is None:
-                     dict_row[key] = [] if key in ['risks', 'corrective_measures', 'involved_employees'] else {}
-            final_results.append(dict_row)
-
-        print(f"Terminé. {len(final_results)} événements récupérés et parsés.")
-        return final_results
+        total = 0
+        for rows in stream_query_db(sql, params, batch_size=batch_size):
+            batch = [parse_rich_event(row) for row in rows]
+            total += len(batch)
+            yield batch
+        print(f"Terminé. {total} événements récupérés et parsés.")
     except Exception as e:
         print(f"Erreur fatale lors de la requête SQL: {e}")
         sys.exit(1)
@@ -166,68 +261,718 @@ def build_full_text_field(doc: Dict[str, Any]) -> str:
 
     return " ".join(filter(None, texts))
 
-def main_indexing():
+def build_document(row) -> Dict[str, Any]:
+    """Document prêt à indexer (avec full_text_search) à partir d'une ligne de RICH_EVENTS_SQL"""
+    doc = parse_rich_event(row)
+    # Créer le champ de recherche aggrégé
+    doc["full_text_search"] = build_full_text_field(doc)
+    return doc
+
+# --- Embeddings (recherche hybride) ---
+
+def train_embedding_model(index_name: str, sample_size: int = EMBEDDING_FIT_SAMPLE) -> Optional[LsaModel]:
+    """
+    Apprend le modèle d'embeddings sur un échantillon aléatoire d'incidents et
+    l'enregistre pour la version d'index donnée. Retourne None si les
+    embeddings sont désactivés (sample_size <= 0) ou si l'apprentissage échoue:
+    l'index est alors construit sans embeddings (recherche lexicale seule).
+    """
+    if sample_size <= 0:
+        return None
+    try:
+        started = time.monotonic()
+        rows = query_db("SELECT event_id FROM event ORDER BY random() LIMIT %s;", params=(sample_size,))
+        if not rows:
+            return None
+        sql, params = rich_events_query(event_ids=[row["event_id"] for row in rows])
+        texts = [
+            build_document(row)["full_text_search"]
+            for batch in stream_query_db(sql, params)
+            for row in batch
+        ]
+        model = fit_lsa_model(texts)
+        model.save(model_path(index_name))
+        print(f"Modèle d'embeddings appris sur {len(texts)} incidents ({len(model.vocabulary)} termes, "
+              f"{model.dim} dimensions) en {time.monotonic() - started:.1f}s.")
+        return model
+    except Exception as e:
+        print(f"Apprentissage du modèle d'embeddings impossible, index sans embeddings: {e}")
+        return None
+
+def attach_embeddings(docs: List[Dict[str, Any]], model: LsaModel):
+    """Ajoute le champ embedding aux documents (omis pour un texte sans terme connu)"""
+    vectors = model.embed([doc["full_text_search"] for doc in docs])
+    for doc, vector in zip(docs, vectors):
+        if vector.any():
+            doc["embedding"] = vector.tolist()
+
+# --- Pipeline Postgres -> OpenSearch ---
+
+# Threads de construction des documents par défaut
+PIPELINE_BUILDERS = max(1, min(4, os.cpu_count() or 1))
+# Partitions d'event_id lues en parallèle (une connexion Postgres chacune)
+INDEX_PARTITIONS = int(os.getenv("INDEX_PARTITIONS", "1"))
+# Fin de flux dans les files du pipeline
+_END = object()
+
+def run_indexing_pipeline(
+    os_client: OpenSearch,
+    index_name: str,
+    event_ids: Optional[List[int]] = None,
+    batch_size: int = DB_STREAM_BATCH_SIZE,
+    workers: int = OS_BULK_WORKERS,
+    builders: int = PIPELINE_BUILDERS,
+    partitions: int = INDEX_PARTITIONS,
+    on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    embedding_model: Optional[LsaModel] = None,
+) -> Dict[str, Any]:
+    """
+    Indexe les événements enrichis en flux, en trois étages reliés par des files bornées:
+
+        `partitions` curseurs serveur en parallèle (lots de batch_size lignes)
+          -> `builders` threads: parse JSON + full_text_search (+ embedding)
+          -> `workers` threads: requêtes _bulk de OS_BULK_CHUNK_SIZE documents au plus (send_bulk_chunk)
+
+    Chaque file contient au plus un lot en attente par thread consommateur: un
+    étage lent fait attendre les précédents (contre-pression). La mémoire du
+    pipeline reste bornée à environ 2 x (builders + workers) lots quel que soit
+    le volume (hors ce que conserve on_batch), et la lecture en base se poursuit
+    pendant les envois.
+
+    Avec partitions > 1, la plage d'event_id est découpée (partition_rich_events_queries)
+    et chaque partition est lue sur sa propre connexion du pool: la lecture se
+    répartit sur plusieurs cœurs côté Postgres. partitions est ramené à
+    DB_POOL_MAX (avec un avertissement): une partition de plus attendrait une
+    connexion jusqu'au délai du pool et ferait échouer tout le passage.
+
+    Args:
+        on_batch: Appelé par les builders sur chaque lot de documents construits
+            (ex: mémoriser les signatures de la synchro incrémentale)
+        embedding_model: Modèle de la version d'index cible; sans modèle, les
+            documents sont indexés sans embedding
+
+    Returns:
+        Un rapport {read, indexed, failed, errors, seconds, docs_per_sec, stages}
+        où stages donne le temps cumulé passé dans chaque étage
+    """
+    start = time.monotonic()
+    if partitions > DB_POOL_MAX:
+        print(f"Avertissement: {partitions} partitions demandées pour {DB_POOL_MAX} connexions "
+              f"(DB_POOL_MAX): lecture sur {DB_POOL_MAX} partitions.")
+        partitions = DB_POOL_MAX
+    queries = partition_rich_events_queries(partitions, event_ids)
+    rows_queue: "queue.Queue" = queue.Queue(maxsize=builders)
+    docs_queue: "queue.Queue" = queue.Queue(maxsize=workers)
+    abort = threading.Event()
+    lock = threading.Lock()
+    failures: List[BaseException] = []
+    errors: List[Dict[str, Any]] = []
+    counters = {"read": 0, "indexed": 0, "failed": 0, "readers_left": len(queries), "builders_left": builders}
+    stages = {"read": 0.0, "build": 0.0, "send": 0.0}
+
+    def fail(exc: BaseException):
+        with lock:
+            failures.append(exc)
+        abort.set()
+
+    def put(target: "queue.Queue", item) -> bool:
+        while not abort.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(source: "queue.Queue"):
+        while True:
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                if abort.is_set():
+                    return _END
+
+    def produce(sql: str, params: Optional[Dict[str, Any]]):
+        batches = stream_query_db(sql, params, batch_size=batch_size)
+        try:
+            while True:
+                started = time.monotonic()
+                rows = next(batches, None)
+                with lock:
+                    stages["read"] += time.monotonic() - started
+                if rows is None or not put(rows_queue, rows):
+                    break
+                with lock:
+                    counters["read"] += len(rows)
+        except BaseException as e:
+            fail(e)
+        finally:
+            # Libère le curseur serveur et la connexion, même en cas d'arrêt anticipé
+            batches.close()
+            with lock:
+                counters["readers_left"] -= 1
+                last = counters["readers_left"] == 0
+            if last:
+                for _ in range(builders):
+                    put(rows_queue, _END)
+
+    def build():
+        try:
+            while True:
+                rows = get(rows_queue)
+                if rows is _END:
+                    break
+                started = time.monotonic()
+                docs = [build_document(row) for row in rows]
+                if embedding_model is not None:
+                    attach_embeddings(docs, embedding_model)
+                if on_batch:
+                    on_batch(docs)
+                with lock:
+                    stages["build"] += time.monotonic() - started
+                if not put(docs_queue, docs):
+                    break
+        except BaseException as e:
+            fail(e)
+        finally:
+            with lock:
+                counters["builders_left"] -= 1
+                last = counters["builders_left"] == 0
+            if last:
+                for _ in range(workers):
+                    put(docs_queue, _END)
+
+    def send():
+        try:
+            while True:
+                docs = get(docs_queue)
+                if docs is _END:
+                    break
+                started = time.monotonic()
+                ok_count, chunk_errors = send_bulk_chunk(os_client, index_name, docs)
+                with lock:
+                    stages["send"] += time.monotonic() - started
+                    counters["indexed"] += ok_count
+                    counters["failed"] += len(chunk_errors)
+                    errors.extend(chunk_errors)
+        except BaseException as e:
+            fail(e)
+
+    threads = [
+        threading.Thread(target=produce, args=query, name=f"index-reader-{i}")
+        for i, query in enumerate(queries)
+    ]
+    threads += [threading.Thread(target=build, name=f"index-builder-{i}") for i in range(builders)]
+    threads += [threading.Thread(target=send, name=f"index-sender-{i}") for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+
+    seconds = time.monotonic() - start
+    report = {
+        "read": counters["read"],
+        "indexed": counters["indexed"],
+        "failed": counters["failed"],
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(counters["indexed"] / seconds, 1) if seconds > 0 else 0.0,
+        "stages": {stage: round(value, 3) for stage, value in stages.items()},
+    }
+    print(f"Pipeline '{index_name}': {report['read']} lus, {report['indexed']} indexés, "
+          f"{report['failed']} en échec en {report['seconds']}s ({report['docs_per_sec']} docs/s) | "
+          f"temps cumulés: lecture {report['stages']['read']}s ({len(queries)} partitions), "
+          f"construction {report['stages']['build']}s ({builders} threads), envoi {report['stages']['send']}s ({workers} threads)")
+    return report
+
+# --- Synchronisation incrémentale ---
+
+# Fichier d'état de la synchro incrémentale (watermark + signature des incidents indexés)
+INDEX_STATE_FILE = os.getenv(
+    "INDEX_STATE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "index_state.json"),
+)
+
+# Tables dont une suppression peut retirer un incident ou l'un de ses liens
+# (détectée via les compteurs n_tup_del de pg_stat_user_tables)
+DELETE_TRACKED_TABLES = ("event", "event_risk", "event_corrective_measure", "event_employee")
+
+# Listes liées d'un document dont on mémorise la taille (signature)
+LINK_KEYS = ("risks", "corrective_measures", "involved_employees")
+
+# Incidents dont une ligne, ou une ligne référencée par le document indexé, a été
+# écrite par une transaction postérieure au watermark. xmin est un xid 32 bits qui
+# boucle: on compare des âges (age(), distance modulo 2^32 au xid courant, calculée
+# dans la même requête pour les deux côtés) plutôt que les valeurs brutes, ce qui
+# reste exact tant que le watermark a moins de 2^31 transactions (voir
+# incremental_sync). Seule exception: une ligne écrite il y a plus de 2^31
+# transactions (xmin brut conservé après gel) peut retomber dans l'intervalle et
+# être réindexée inutilement (faux positif, jamais d'oubli).
+CHANGED_EVENTS_SQL = """
+    WITH watermark AS (SELECT age(%(xid)s::text::xid) AS age)
+    SELECT e.event_id
+    FROM event e
+    WHERE age(e.xmin) BETWEEN 0 AND (SELECT age FROM watermark)
+       OR e.declared_by_id IN (SELECT person_id FROM person WHERE age(xmin) BETWEEN 0 AND (SELECT age FROM watermark))
+       OR e.organizational_unit_id IN (
+           SELECT unit_id FROM organizational_unit WHERE age(xmin) BETWEEN 0 AND (SELECT age FROM watermark)
+       )
+    UNION
+    SELECT er.event_id
+    FROM event_risk er
+    WHERE age(er.xmin) BETWEEN 0 AND (SELECT age FROM watermark)
+       OR er.risk_id IN (SELECT risk_id FROM risk WHERE age(xmin) BETWEEN 0 AND (SELECT age FROM watermark))
+    UNION
+    SELECT ecm.event_id
+    FROM event_corrective_measure ecm
+    WHERE age(ecm.xmin) BETWEEN 0 AND (SELECT age FROM watermark)
+       OR ecm.measure_id IN (
+           SELECT cm.measure_id
+           FROM corrective_measure cm
+           WHERE age(cm.xmin) BETWEEN 0 AND (SELECT age FROM watermark)
+              OR cm.owner_id IN (SELECT person_id FROM person WHERE age(xmin) BETWEEN 0 AND (SELECT age FROM watermark))
+       )
+    UNION
+    SELECT ee.event_id
+    FROM event_employee ee
+    WHERE age(ee.xmin) BETWEEN 0 AND (SELECT age FROM watermark)
+       OR ee.person_id IN (SELECT person_id FROM person WHERE age(xmin) BETWEEN 0 AND (SELECT age FROM watermark));
+"""
+
+# Taille des listes liées de chaque incident, avec les mêmes jointures que fetch_rich_events
+LINK_COUNTS_SQL = """
+    SELECT
+        e.event_id,
+        COALESCE(r.n, 0) AS risks,
+        COALESCE(m.n, 0) AS corrective_measures,
+        COALESCE(p.n, 0) AS involved_employees
+    FROM event e
+    LEFT JOIN (
+        SELECT er.event_id, COUNT(*) AS n
+        FROM event_risk er
+        JOIN risk r ON er.risk_id = r.risk_id
+        GROUP BY er.event_id
+    ) r ON r.event_id = e.event_id
+    LEFT JOIN (
+        SELECT ecm.event_id, COUNT(*) AS n
+        FROM event_corrective_measure ecm
+        JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id
+        GROUP BY ecm.event_id
+    ) m ON m.event_id = e.event_id
+    LEFT JOIN (
+        SELECT ee.event_id, COUNT(*) AS n
+        FROM event_employee ee
+        JOIN person p_emp ON ee.person_id = p_emp.person_id
+        GROUP BY ee.event_id
+    ) p ON p.event_id = e.event_id;
+"""
+
+def get_xid_watermark() -> int:
+    """
+    Plus ancien txid encore en cours: toute transaction plus ancienne est terminée
+    et ses écritures sont donc visibles par la lecture qui suit.
+    """
+    row = query_db("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xid;", fetch_one=True)
+    return int(row["xid"])
+
+def get_delete_counters() -> Dict[str, int]:
+    """Nombre cumulé de suppressions par table suivie (pg_stat_user_tables)"""
+    rows = query_db(
+        "SELECT relname, n_tup_del FROM pg_stat_user_tables WHERE relname = ANY(%s);",
+        params=(list(DELETE_TRACKED_TABLES),),
+    )
+    return {row["relname"]: int(row["n_tup_del"]) for row in rows}
+
+def fetch_changed_event_ids(since_xid: int) -> Set[int]:
+    """Incidents modifiés (directement ou via leurs liens) depuis le watermark donné"""
+    rows = query_db(CHANGED_EVENTS_SQL, params={"xid": since_xid % 2**32})
+    return {row["event_id"] for row in rows}
+
+def fetch_link_signatures() -> Dict[int, List[int]]:
+    """Signature (taille des listes liées) de chaque incident présent en base"""
+    signatures = {}
+    for rows in stream_query_db(LINK_COUNTS_SQL):
+        for row in rows:
+            signatures[row["event_id"]] = [row[key] for key in LINK_KEYS]
+    return signatures
+
+def link_signature(doc: Dict[str, Any]) -> List[int]:
+    return [len(doc.get(key) or []) for key in LINK_KEYS]
+
+def load_index_state(state_file: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    state["events"] = {int(event_id): signature for event_id, signature in state["events"].items()}
+    return state
+
+def save_index_state(state_file: str, state: Dict[str, Any]):
+    """Écriture atomique: un passage interrompu ne laisse jamais un état tronqué"""
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+@contextmanager
+def sync_lock(state_file: str):
+    """Empêche deux synchros simultanées (ex: cron toutes les minutes et passage lent)"""
+    with open(f"{state_file}.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise Exception(f"Une synchronisation est déjà en cours ({state_file}.lock)")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _signature_recorder(signatures: Dict[int, List[int]]) -> Callable[[List[Dict[str, Any]]], None]:
+    """Callback on_batch du pipeline: mémorise la signature de chaque document construit"""
+    def record(docs: List[Dict[str, Any]]):
+        signatures.update((doc["event_id"], link_signature(doc)) for doc in docs)
+    return record
+
+def _error_ids(errors: List[Dict[str, Any]]) -> Set[int]:
+    ids = set()
+    for error in errors:
+        try:
+            ids.add(int(error["id"]))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+def full_sync(
+    os_client: OpenSearch,
+    state_file: str,
+    batch_size: int = DB_STREAM_BATCH_SIZE,
+    workers: int = OS_BULK_WORKERS,
+    builders: int = PIPELINE_BUILDERS,
+    partitions: int = INDEX_PARTITIONS,
+) -> Dict[str, Any]:
+    """
+    Reconstruction complète sans interruption de service: les documents sont
+    chargés dans un nouvel index versionné pendant que l'alias INDEX_NAME
+    continue de servir l'ancien, puis l'alias est basculé et l'état de
+    synchro enregistré. L'index local de repli (services/local_search_service.py)
+    est construit à partir des mêmes documents.
+
+    Mémoire: en plus des lots du pipeline, seuls la signature de chaque incident
+    (enregistrée dans le fichier d'état) et le vocabulaire de l'index local
+    restent en mémoire; les postings de l'index local sont écrites sur disque
+    lot par lot.
+    """
+    # Un état antérieur ne décrira plus l'index publié après la bascule
+    if os.path.exists(state_file):
+        os.remove(state_file)
+
+    # Watermark pris AVANT la lecture: une écriture concurrente sera revue au prochain passage
+    watermark = get_xid_watermark()
+    delete_counters = get_delete_counters()
+
+    new_index = create_versioned_index(os_client, INDEX_NAME)
+    embedding_model = train_embedding_model(new_index)
+    print(f"Indexation des documents dans '{new_index}'...")
+    signatures: Dict[int, List[int]] = {}
+    record_signatures = _signature_recorder(signatures)
+    local_builder = LocalIndexBuilder(new_index)
+
+    def on_batch(docs: List[Dict[str, Any]]):
+        record_signatures(docs)
+        local_builder.add(docs)
+
+    try:
+        # Rafraîchissement déjà désactivé à la création de l'index
+        report = run_indexing_pipeline(
+            os_client,
+            new_index,
+            batch_size=batch_size,
+            workers=workers,
+            builders=builders,
+            partitions=partitions,
+            on_batch=on_batch,
+            embedding_model=embedding_model,
+        )
+        if report["indexed"] == 0 and report["failed"] > 0:
+            raise Exception(f"Aucun document indexé dans '{new_index}' ({report['failed']} en échec)")
+        local_builder.finish()
+        publish_index(os_client, INDEX_NAME, new_index)
+    except BaseException:
+        # L'ancien index reste publié; on ne garde pas une version incomplète
+        os_client.indices.delete(index=new_index, ignore_unavailable=True)
+        delete_embedding_model(new_index)
+        local_builder.abort()
+        delete_local_index(new_index)
+        raise
+
+    for deleted_index in gc_index_versions(os_client, INDEX_NAME):
+        delete_embedding_model(deleted_index)
+        delete_local_index(deleted_index)
+
+    failed_ids = _error_ids(report["errors"])
+    for event_id in failed_ids:
+        signatures.pop(event_id, None)
+    save_index_state(state_file, {
+        "index": INDEX_NAME,
+        "xid_watermark": watermark,
+        "delete_counters": delete_counters,
+        "retry": sorted(failed_ids),
+        "events": signatures,
+    })
+    return {"mode": "full", "index": new_index, "deleted": 0, **report}
+
+def incremental_sync(
+    os_client: OpenSearch,
+    state: Dict[str, Any],
+    state_file: str,
+    batch_size: int = DB_STREAM_BATCH_SIZE,
+    workers: int = OS_BULK_WORKERS,
+    builders: int = PIPELINE_BUILDERS,
+    partitions: int = INDEX_PARTITIONS,
+) -> Optional[Dict[str, Any]]:
+    """
+    Réindexe uniquement les incidents modifiés depuis le dernier passage et
+    supprime les documents des incidents disparus.
+
+    - Écritures (event, liens, risques, mesures, personnes, unités): détectées par
+      l'âge du xmin des lignes, comparé à celui du watermark enregistré (robuste au
+      bouclage des xid; faux positifs possibles pour des lignes écrites il y a plus
+      de 2^31 transactions, voir CHANGED_EVENTS_SQL).
+    - Suppressions: seulement si les compteurs n_tup_del ont bougé, en comparant
+      la signature (taille des listes liées) de chaque incident à celle enregistrée.
+
+    Returns:
+        Le rapport du passage, ou None si une reconstruction complète est nécessaire
+        (2^31 transactions ou plus depuis le dernier passage: les xmin ne se comparent
+        plus au watermark). Un bouclage des xid 32 bits seul ne l'impose pas.
+    """
+    watermark = get_xid_watermark()
+    previous_watermark = state["xid_watermark"]
+    if watermark - previous_watermark >= 2**31:
+        print("Plus de 2^31 transactions depuis le dernier passage.")
+        return None
+
+    delete_counters = get_delete_counters()
+    events: Dict[int, List[int]] = state["events"]
+
+    dirty = fetch_changed_event_ids(previous_watermark)
+    dirty.update(state.get("retry", []))
+
+    previous_counters = state.get("delete_counters", {})
+    if any(delete_counters.get(table) != previous_counters.get(table) for table in DELETE_TRACKED_TABLES):
+        current = fetch_link_signatures()
+        dirty.update(event_id for event_id in events if event_id not in current)
+        dirty.update(
+            event_id for event_id, signature in current.items()
+            if events.get(event_id) != signature
+        )
+
+    report: Dict[str, Any] = {"mode": "incremental", "changed": len(dirty), "indexed": 0,
+                              "deleted": 0, "failed": 0, "errors": []}
+    if dirty:
+        print(f"{len(dirty)} incident(s) à synchroniser dans '{INDEX_NAME}'...")
+        # Même espace d'embeddings que les documents déjà publiés
+        targets = get_alias_targets(os_client, INDEX_NAME)
+        embedding_model = get_embedding_model(targets[0]) if len(targets) == 1 else None
+        signatures: Dict[int, List[int]] = {}
+        pipeline_report = run_indexing_pipeline(
+            os_client,
+            INDEX_NAME,
+            event_ids=sorted(dirty),
+            batch_size=batch_size,
+            workers=workers,
+            builders=builders,
+            partitions=partitions,
+            on_batch=_signature_recorder(signatures),
+            embedding_model=embedding_model,
+        )
+        report.update(pipeline_report)
+
+        # Incidents demandés mais absents de Postgres: supprimés depuis
+        gone = dirty - set(signatures)
+        deleted, delete_errors = bulk_delete_incidents(os_client, INDEX_NAME, sorted(gone))
+        report["deleted"] = deleted
+        report["failed"] += len(delete_errors)
+        report["errors"] = report["errors"] + delete_errors
+
+        failed_ids = _error_ids(report["errors"])
+        for event_id in gone:
+            events.pop(event_id, None)
+        for event_id, signature in signatures.items():
+            if event_id not in failed_ids:
+                events[event_id] = signature
+        state["retry"] = sorted(failed_ids)
+    else:
+        state["retry"] = []
+
+    state["xid_watermark"] = watermark
+    state["delete_counters"] = delete_counters
+    save_index_state(state_file, state)
+    return report
+
+def build_local_only_index(batch_size: int = DB_STREAM_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Construit uniquement l'index local (sans OpenSearch): substitut du cluster
+    pour le développement, les tests et benchmarks (--local-only).
+    """
+    start = time.monotonic()
+    builder = LocalIndexBuilder(LOCAL_ONLY_INDEX)
+    read = 0
+    try:
+        sql, params = rich_events_query()
+        for rows in stream_query_db(sql, params, batch_size=batch_size):
+            builder.add([build_document(row) for row in rows])
+            read += len(rows)
+        builder.finish()
+    except BaseException:
+        builder.abort()
+        raise
+    return {"mode": "local", "index": LOCAL_ONLY_INDEX, "read": read,
+            "seconds": round(time.monotonic() - start, 3)}
+
+def main_indexing(
+    incremental: bool = False,
+    state_file: str = INDEX_STATE_FILE,
+    batch_size: int = DB_STREAM_BATCH_SIZE,
+    workers: int = OS_BULK_WORKERS,
+    builders: int = PIPELINE_BUILDERS,
+    partitions: int = INDEX_PARTITIONS,
+    local_only: bool = False,
+):
     """
     Script principal pour l'indexation enrichie.
+
+    Args:
+        incremental: Ne synchronise que les changements depuis le dernier passage
+            (reconstruction complète si aucun état valide n'est enregistré)
+        state_file: Fichier d'état de la synchro incrémentale
+        batch_size: Lignes lues par lot en base (découpé en requêtes _bulk de OS_BULK_CHUNK_SIZE documents)
+        workers: Requêtes _bulk envoyées en parallèle
+        builders: Threads de construction des documents
+        partitions: Partitions d'event_id lues en parallèle en base
+        local_only: Construit seulement l'index local de repli (OpenSearch non requis)
     """
     print("Démarrage du script d'indexation enrichie...")
     
     # 1. Vérifier la connexion à la BDD
     try:
         conn = get_db_connection()
-        conn.close()
+        release_db_connection(conn)
         print("Connexion PostgreSQL vérifiée.")
     except Exception as e:
         print(f"Échec de la connexion à PostgreSQL: {e}")
         print("Vérifiez vos variables d'environnement (DB_HOST, DB_USER, etc.)")
         sys.exit(1)
+
+    if local_only:
+        try:
+            report = build_local_only_index(batch_size=batch_size)
+        except Exception as e:
+            print(f"Échec de la construction de l'index local: {e}")
+            sys.exit(1)
+        print(f"\nIndex local '{report['index']}' construit: {report['read']} documents en {report['seconds']}s.")
+        return
         
-    # 2. Obtenir le client OpenSearch et (re)créer l'index
+    # 2. Obtenir le client OpenSearch
     try:
         os_client = get_opensearch_client()
         if not os_client.ping():
             raise Exception("Ping OpenSearch a échoué. Vérifiez que le service tourne.")
-        
-        # Optionnel: Supprimer l'ancien index pour repartir à zéro
-        if os_client.indices.exists(index=INDEX_NAME):
-            print(f"Suppression de l'ancien index '{INDEX_NAME}'...")
-            os_client.indices.delete(index=INDEX_NAME)
-            
-        # S'assure que l'index existe avec le bon mapping
-        ensure_index(os_client, INDEX_NAME)
-        print("Client OpenSearch connecté et index (re)créé.")
+        print("Client OpenSearch connecté.")
     except Exception as e:
         print(f"Échec de la connexion à OpenSearch: {e}")
         sys.exit(1)
-        
-    # 3. Récupérer les données de Postgres
-    events_data = fetch_rich_events()
-    
-    if not events_data:
-        print("Aucun événement trouvé dans la base de données. Arrêt.")
+
+    # 3. Synchroniser (incrémental si possible, sinon reconstruction complète)
+    try:
+        with sync_lock(state_file):
+            report = None
+            if incremental:
+                state = load_index_state(state_file)
+                if state is None or state.get("index") != INDEX_NAME:
+                    print("Aucun état de synchronisation valide: reconstruction complète.")
+                elif not os_client.indices.exists(index=INDEX_NAME):
+                    print(f"L'index '{INDEX_NAME}' n'existe pas: reconstruction complète.")
+                else:
+                    report = incremental_sync(
+                        os_client, state, state_file,
+                        batch_size=batch_size, workers=workers, builders=builders, partitions=partitions,
+                    )
+            if report is None:
+                report = full_sync(
+                    os_client, state_file,
+                    batch_size=batch_size, workers=workers, builders=builders, partitions=partitions,
+                )
+    except Exception as e:
+        print(f"Échec de la synchronisation: {e}")
+        sys.exit(1)
+
+    for error in report["errors"][:100]:
+        print(f"Erreur lors de l'indexation du document {error['id']}: [{error['status']}] {error['error']}")
+
+    if report["mode"] == "incremental":
+        print(f"\nSynchronisation incrémentale terminée. {report['changed']} incident(s) modifié(s): "
+              f"{report['indexed']} réindexé(s), {report['deleted']} supprimé(s), {report['failed']} en échec.")
         return
 
-    # 4. Préparer et indexer les documents
-    print(f"Indexation de {len(events_data)} documents dans '{INDEX_NAME}'...")
-    count = 0
-    for doc in events_data:
-        event_id = doc["event_id"]
-        
-        # Créer le champ de recherche aggrégé
-        doc["full_text_search"] = build_full_text_field(doc)
-        
-        try:
-            index_incident(os_client, INDEX_NAME, event_id, doc)
-            count += 1
-            if count % 100 == 0:
-                print(f"  ... {count}/{len(events_data)} indexés")
-        except Exception as e:
-            print(f"Erreur lors de l'indexation du document {event_id}: {e}")
+    if report["indexed"] == 0 and report["failed"] == 0:
+        print("Aucun événement trouvé dans la base de données. Arrêt.")
+        return
 
-    # Forcer un rafraîchissement de l'index à la fin
-    os_client.indices.refresh(index=INDEX_NAME)
-    print(f"\nIndexation terminée. {count} documents traités.")
+    print(f"\nIndexation terminée. {report['indexed']} documents indexés dans '{report['index']}', "
+          f"{report['failed']} en échec ({report['docs_per_sec']} docs/s).")
     print(f"Vous pouvez maintenant utiliser l'endpoint RAG '/ai/query'.")
 
 if __name__ == "__main__":
-    main_indexing() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Indexation des incidents dans OpenSearch")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Ne réindexe que les incidents modifiés/supprimés depuis le dernier passage",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=INDEX_STATE_FILE,
+        help="Fichier d'état de la synchro incrémentale (défaut: INDEX_STATE_FILE)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=OS_BULK_WORKERS,
+        help="Requêtes _bulk envoyées en parallèle (défaut: OS_BULK_WORKERS)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DB_STREAM_BATCH_SIZE,
+        help="Lignes lues par lot en base (défaut: DB_STREAM_BATCH_SIZE); taille des requêtes _bulk: OS_BULK_CHUNK_SIZE",
+    )
+    parser.add_argument(
+        "--builders",
+        type=int,
+        default=PIPELINE_BUILDERS,
+        help="Threads de construction des documents (défaut: nombre de CPU, 4 max)",
+    )
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=INDEX_PARTITIONS,
+        help="Partitions d'event_id lues en parallèle, une connexion chacune, DB_POOL_MAX au plus (défaut: INDEX_PARTITIONS)",
+    )
+    parser.add_argument(
+        "--local-only",
+        action="store_true",
+        help="Construit seulement l'index BM25 local de repli, sans OpenSearch",
+    )
+    args = parser.parse_args()
+    main_indexing(
+        incremental=args.incremental,
+        state_file=args.state_file,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        builders=args.builders,
+        partitions=args.partitions,
+        local_only=args.local_only,
+    )
@@ -1,12 +1,28 @@
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
-from datetime import datetime, date
-from decimal import Decimal
-from database import query_db
+from serialization import FastJSONResponse
+from datetime import datetime, date, time, timedelta
+from database import query_db_async, stream_query_db, run_in_db_executor, get_pool_stats
+from services.cache_service import TTLCache, MISSING, get_data_version
+from services.event_service import fetch_event_details, get_cached_dashboard, dashboard_cache, MAX_DETAILS_BATCH, DASHBOARD_SECTIONS
 from fastapi import Request
-from opensearchpy import OpenSearch
-from services.opensearch_service import get_opensearch_client, ensure_index, INDEX_NAME
+from opensearchpy import OpenSearch, NotFoundError
+from services.opensearch_service import (
+    get_opensearch_client,
+    close_opensearch_client,
+    close_async_opensearch_client,
+    ensure_index,
+    ensure_index_when_available,
+    forget_index,
+    bulk_index_incidents,
+    invalidate_search_cache,
+    get_search_cache_stats,
+    get_search_status,
+    INDEX_NAME,
+)
 import boto3
+import base64
+import os
+import binascii
 import json
 from typing import List, Optional, Tuple
 import re
@@ -15,6 +31,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from ai_router import router as ai_api_router
 from chart_router import router as chart_api_router 
 from report_router import router as report_api_router
+from search_router import router as search_api_router
 
 origins = [
     "*"
@@ -25,7 +42,7 @@ origins = [
 
 
 INDEX_NAME = "incidents"
-app = FastAPI(title="FireTeams API")
+app = FastAPI(title="FireTeams API", default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,26 +55,82 @@ app.add_middleware(
 app.include_router(ai_api_router)
 app.include_router(chart_api_router)
 app.include_router(report_api_router) 
+app.include_router(search_api_router)
+
+# Curseur opaque pour la pagination par clé (keyset) de /get_events
+def encode_events_cursor(last_event_id: int) -> str:
+    """Encode la clé de tri du dernier event de la page en jeton opaque"""
+    payload = json.dumps({"id": last_event_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_events_cursor(token: str) -> int:
+    """Décode un jeton produit par encode_events_cursor (ValueError si invalide)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(payload["id"])
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid 'after' cursor") from e
+
+
+# Cache des total_count de /get_events (stratégie "cached"), par jeu de filtres normalisé
+EVENTS_COUNT_CACHE_TTL = float(os.getenv("EVENTS_COUNT_CACHE_TTL", "30"))
+EVENTS_COUNT_TABLES = ("event", "person")
+events_count_cache = TTLCache(ttl=EVENTS_COUNT_CACHE_TTL, max_entries=1024)
+
+async def count_events(where_clause: str, params: tuple, strategy: str, cache_key: tuple) -> int:
+    """
+    Compte les events correspondant aux filtres selon la stratégie demandée:
+    - "exact": COUNT(*) complet
+    - "estimate": estimation du planificateur (EXPLAIN), sans parcourir la table
+    - "cached": COUNT(*) exact mis en cache (TTL court, invalidé dès que event/person changent)
+    """
+    from_clause = f"""
+        FROM event e
+        LEFT JOIN person p ON e.declared_by_id = p.person_id
+        {where_clause}
+    """
+
+    if strategy == "estimate":
+        plan_rows = await query_db_async(
+            f"EXPLAIN (FORMAT JSON) SELECT 1 {from_clause};", params=params if params else None
+        )
+        plan = plan_rows[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    version = None
+    if strategy == "cached":
+        version = await run_in_db_executor(get_data_version, EVENTS_COUNT_TABLES)
+        cached_total = events_count_cache.get(cache_key, version)
+        if cached_total is not MISSING:
+            return cached_total
 
-# Fonction pour convertir les datetime, date et Decimal en types JSON-serialisables
-def convert_datetime_to_str(obj):
-    """Convertit les objets datetime, date et Decimal en types JSON-serialisables"""
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_datetime_to_str(item) for item in obj]
-    return obj
+    total_count_rows = await query_db_async(
+        f"SELECT COUNT(*) as total_event {from_clause};", params=params if params else None
+    )
+    total = total_count_rows[0]["total_event"] if total_count_rows else 0
+
+    if strategy == "cached":
+        events_count_cache.set(cache_key, total, version)
+    return total
 
 
 @app.on_event("startup")
 def setup_search():
-    """S'assure que l'index OpenSearch existe au démarrage"""
-    client = get_opensearch_client()
-    ensure_index(client, INDEX_NAME)
+    """
+    Crée le client OpenSearch partagé et s'assure que l'index existe au démarrage.
+    Cluster injoignable: l'application démarre quand même (RAG sur l'index local)
+    et l'index est vérifié dès que le cluster répond.
+    """
+    ensure_index_when_available(INDEX_NAME)
+
+
+@app.on_event("shutdown")
+async def close_search():
+    close_opensearch_client()
+    await close_async_opensearch_client()
 
 
 @app.get("/")
@@ -68,10 +141,10 @@ async def root():
 async def db_status():
     """Route pour vérifier la connexion à la base de données"""
     try:
-        version = query_db("SELECT version();", fetch_one=True)
-        db_info = query_db("SELECT current_database(), current_user;", fetch_one=True)
+        version = await query_db_async("SELECT version();", fetch_one=True)
+        db_info = await query_db_async("SELECT current_database(), current_user;", fetch_one=True)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "status": "success",
             "message": "Connexion à la base de données réussie",
             "database": db_info["current_database"],
@@ -79,7 +152,7 @@ async def db_status():
             "postgres_version": version["version"]
         })
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -91,19 +164,19 @@ async def db_status():
 async def get_tables():
     """Route pour lister les tables de la base de données"""
     try:
-        tables = query_db("""
+        tables = await query_db_async("""
             SELECT table_name 
             FROM information_schema.tables 
             WHERE table_schema = 'public'
             ORDER BY table_name;
         """)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "status": "success",
             "tables": [table["table_name"] for table in tables]
         })
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -111,6 +184,14 @@ async def get_tables():
             }
         )
 
+@app.get("/db/pool")
+async def db_pool_stats():
+    """Route pour consulter les statistiques du pool de connexions PostgreSQL"""
+    return FastJSONResponse({
+        "status": "success",
+        "pool": get_pool_stats()
+    })
+
 @app.get("/get_events")
 async def get_events(
     offset: int = 0,
@@ -121,12 +202,24 @@ async def get_events(
     classification: Optional[str] = Query(None),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
+    after: Optional[str] = Query(None),
+    count_strategy: str = Query("exact", pattern="^(exact|estimate|cached)$"),
+    with_count: bool = Query(True),
 ):
-    """Route pour récupérer les événements avec pagination et filtres optionnels"""
+    """
+    Route pour récupérer les événements avec pagination et filtres optionnels.
+
+    Deux modes de pagination:
+    - offset: `offset` + `limit` (historique)
+    - curseur: `after` = `next_cursor` de la page précédente (coût constant quelle que soit la page)
+
+    `count_strategy` choisit le calcul de total_count (exact, estimate, cached);
+    `with_count=false` ne le calcule pas du tout (total_count = null, ex: scroll infini).
+    """
     try:
         # Validation: offset doit être >= 0
         if offset < 0:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=400,
                 content={
                     "status": "error",
@@ -135,7 +228,7 @@ async def get_events(
             )
 
         if start_date and end_date and end_date < start_date:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=400,
                 content={
                     "status": "error",
@@ -143,6 +236,19 @@ async def get_events(
                 }
             )
 
+        after_event_id = None
+        if after:
+            try:
+                after_event_id = decode_events_cursor(after)
+            except ValueError as e:
+                return FastJSONResponse(
+                    status_code=400,
+                    content={
+                        "status": "error",
+                        "message": str(e)
+                    }
+                )
+
         sanitized_employee = employee_matricule.strip() if employee_matricule else None
         sanitized_type = event_type.strip() if event_type else None
         sanitized_classification = classification.strip() if classification else None
@@ -166,28 +272,47 @@ async def get_events(
             filters_sql.append("e.classification = %s")
             filter_params.append(sanitized_classification)
 
+        # Intervalles semi-ouverts [start_date 00:00, end_date + 1 jour 00:00) sur la colonne brute:
+        # contrairement à DATE(e.start_datetime), un index sur start_datetime reste utilisable
         if start_date:
-            filters_sql.append("DATE(e.start_datetime) >= %s")
-            filter_params.append(start_date)
+            filters_sql.append("e.start_datetime >= %s")
+            filter_params.append(datetime.combine(start_date, time.min))
 
         if end_date:
-            filters_sql.append("DATE(e.start_datetime) <= %s")
-            filter_params.append(end_date)
+            filters_sql.append("e.start_datetime < %s")
+            filter_params.append(datetime.combine(end_date + timedelta(days=1), time.min))
 
         where_clause = ""
         if filters_sql:
             where_clause = "WHERE " + " AND ".join(filters_sql)
 
-        count_query = f"""
-            SELECT COUNT(*) as total_event
-            FROM event e
-            LEFT JOIN person p ON e.declared_by_id = p.person_id
-            {where_clause};
-        """
-        count_params = tuple(filter_params)
-        total_count_rows = query_db(count_query, params=count_params if count_params else None)
-        total_count_value = total_count_rows[0]["total_event"] if total_count_rows else 0
-        
+        total_count_value = None
+        if with_count:
+            count_cache_key = (
+                event_id,
+                sanitized_employee.lower() if sanitized_employee else None,
+                sanitized_type,
+                sanitized_classification,
+                start_date,
+                end_date,
+            )
+            total_count_value = await count_events(
+                where_clause, tuple(filter_params), count_strategy, count_cache_key
+            )
+
+        # Mode curseur: on repart après la dernière clé vue au lieu de sauter `offset` lignes
+        page_filters_sql = list(filters_sql)
+        page_params = list(filter_params)
+        if after_event_id is not None:
+            page_filters_sql.append("e.event_id > %s")
+            page_params.append(after_event_id)
+
+        page_where_clause = ""
+        if page_filters_sql:
+            page_where_clause = "WHERE " + " AND ".join(page_filters_sql)
+
+        page_offset = 0 if after_event_id is not None else offset
+
         # Récupérer les lignes avec tous les champs nécessaires pour l'interface Incident
         events_query = f"""
             SELECT 
@@ -204,12 +329,12 @@ async def get_events(
                 p.role
             FROM event e
             LEFT JOIN person p ON e.declared_by_id = p.person_id
-            {where_clause}
+            {page_where_clause}
             ORDER BY e.event_id
             LIMIT %s OFFSET %s;
         """
-        events_params = tuple(filter_params + [limit, offset])
-        events = query_db(events_query, params=events_params)
+        events_params = tuple(page_params + [limit, page_offset])
+        events = await query_db_async(events_query, params=events_params)
         
         # Transformer les résultats pour correspondre à l'interface Incident simplifiée
         events_payload: list[dict] = []
@@ -236,20 +361,24 @@ async def get_events(
                 }
             )
 
-        # Convertir les datetime en strings pour la sérialisation JSON
-        events_serializable = convert_datetime_to_str(events_payload)
+        # Page pleine: il reste potentiellement des lignes après la dernière clé
+        next_cursor = None
+        if len(events) == limit:
+            next_cursor = encode_events_cursor(events[-1]["event_id"])
 
-        return JSONResponse(
+        return FastJSONResponse(
             {
                 "status": "success",
-                "offset": offset,
+                "offset": page_offset,
                 "total_count": total_count_value,
-                "count": len(events_serializable),
-                "events": events_serializable,
+                "count_strategy": count_strategy if with_count else None,
+                "count": len(events_payload),
+                "next_cursor": next_cursor,
+                "events": events_payload,
             }
         )
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -257,52 +386,70 @@ async def get_events(
             }
         )
 
-@app.get("/get_basic_info")
-async def get_basic_info():
-    """Retourne des indicateurs globaux pour le tableau de bord"""
+def _parse_dashboard_sections(sections: Optional[str]) -> List[str]:
+    """Transforme 'a,b,c' en liste de sections (toutes si vide)"""
+    if not sections:
+        return list(DASHBOARD_SECTIONS)
+    return list(dict.fromkeys(part.strip() for part in sections.split(",") if part.strip()))
+
+@app.get("/dashboard")
+async def get_dashboard(
+    sections: Optional[str] = Query(None, description="Sections séparées par des virgules (toutes par défaut)"),
+    top_organization_limit: int = 5,
+    classification_limit: int = 5,
+    recent_limit: int = 7,
+):
+    """Retourne tous les widgets du tableau de bord, calculés en une seule requête"""
     try:
-        total_incidents_row = query_db(
-            "SELECT COUNT(*) AS total FROM event;", fetch_one=True
-        )
-        critical_risk_row = query_db(
-            """
-            SELECT COUNT(DISTINCT er.event_id) AS total
-            FROM event_risk er
-            INNER JOIN risk r ON er.risk_id = r.risk_id
-            WHERE r.gravity ILIKE 'critical%';
-            """,
-            fetch_one=True,
-        )
-        no_corrective_row = query_db(
-            """
-            SELECT COUNT(*) AS total
-            FROM event e
-            LEFT JOIN event_corrective_measure ecm ON e.event_id = ecm.event_id
-            WHERE ecm.event_id IS NULL;
-            """,
-            fetch_one=True,
+        if min(top_organization_limit, classification_limit, recent_limit) <= 0:
+            return FastJSONResponse(
+                status_code=400,
+                content={
+                    "status": "error",
+                    "message": "Limits must be positive integers",
+                },
+            )
+
+        requested = _parse_dashboard_sections(sections)
+        unknown = [section for section in requested if section not in DASHBOARD_SECTIONS]
+        if unknown:
+            return FastJSONResponse(
+                status_code=400,
+                content={
+                    "status": "error",
+                    "message": f"Unknown section(s): {', '.join(unknown)}. Available: {', '.join(DASHBOARD_SECTIONS)}",
+                },
+            )
+
+        data = await get_cached_dashboard(
+            requested,
+            top_organization_limit=top_organization_limit,
+            classification_limit=classification_limit,
+            recent_limit=recent_limit,
         )
-        total_cost_row = query_db(
-            """
-            SELECT COALESCE(SUM(cm.cost), 0) AS total_cost
-            FROM event_corrective_measure ecm
-            INNER JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id;
-            """,
-            fetch_one=True,
+        return FastJSONResponse({"status": "success", "data": data})
+    except Exception as e:
+        return FastJSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "message": f"Erreur lors de la récupération du tableau de bord: {str(e)}",
+            },
         )
 
-        payload = convert_datetime_to_str(
-            {
-                "total_event_count": total_incidents_row["total"] if total_incidents_row else 0,
-                "total_critical_risk_count": critical_risk_row["total"] if critical_risk_row else 0,
-                "total_no_corrective_measure_count": no_corrective_row["total"] if no_corrective_row else 0,
-                "total_corrective_measure_cost": total_cost_row["total_cost"] if total_cost_row else 0,
-            }
-        )
+@app.get("/dashboard/cache")
+async def get_dashboard_cache_stats():
+    """Statistiques du cache des agrégats du tableau de bord"""
+    return FastJSONResponse({"status": "success", "cache": dashboard_cache.stats()})
 
-        return JSONResponse({"status": "success", "data": payload})
+@app.get("/get_basic_info")
+async def get_basic_info():
+    """Retourne des indicateurs globaux pour le tableau de bord"""
+    try:
+        data = await get_cached_dashboard(["basic_info"])
+        return FastJSONResponse({"status": "success", "data": data["basic_info"]})
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -315,7 +462,7 @@ async def get_most_recent_incidents(limit: int = 7):
     """Retourne les incidents les plus récents"""
     try:
         if limit <= 0:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=400,
                 content={
                     "status": "error",
@@ -323,53 +470,10 @@ async def get_most_recent_incidents(limit: int = 7):
                 },
             )
 
-        events = query_db(
-            """
-            SELECT
-                e.event_id,
-                e.type,
-                e.classification,
-                e.start_datetime,
-                e.end_datetime,
-                p.person_id,
-                p.matricule,
-                p.name,
-                p.family_name,
-                p.role
-            FROM event e
-            LEFT JOIN person p ON e.declared_by_id = p.person_id
-            ORDER BY e.start_datetime DESC NULLS LAST, e.event_id DESC
-            LIMIT %s;
-            """,
-            params=(limit,),
-        )
-
-        incidents: list[dict] = []
-        for event in events:
-            incident = {
-                "id": event["event_id"],
-                "type": event["type"],
-                "classification": event["classification"],
-                "start_datetime": event["start_datetime"],
-                "end_datetime": event["end_datetime"],
-                "person": None,
-            }
-
-            if event["person_id"]:
-                incident["person"] = {
-                    "id": event["person_id"],
-                    "matricule": event["matricule"],
-                    "name": event["name"],
-                    "family_name": event["family_name"],
-                    "role": event["role"],
-                }
-
-            incidents.append(incident)
-
-        payload = convert_datetime_to_str(incidents)
-        return JSONResponse({"incidents": payload})
+        data = await get_cached_dashboard(["recent_incidents"], recent_limit=limit)
+        return FastJSONResponse({"incidents": data["recent_incidents"]})
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -382,7 +486,7 @@ async def get_top_organization(limit: int = 5):
     """Retourne les unités organisationnelles avec le plus d'incidents"""
     try:
         if limit <= 0:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=400,
                 content={
                     "status": "error",
@@ -390,39 +494,10 @@ async def get_top_organization(limit: int = 5):
                 },
             )
 
-        rows = query_db(
-            """
-            SELECT
-                ou.unit_id,
-                ou.identifier,
-                ou.name,
-                ou.location,
-                COUNT(*) AS total
-            FROM event e
-            INNER JOIN organizational_unit ou ON e.organizational_unit_id = ou.unit_id
-            GROUP BY ou.unit_id, ou.identifier, ou.name, ou.location
-            ORDER BY total DESC, ou.unit_id ASC
-            LIMIT %s;
-            """,
-            params=(limit,),
-        )
-
-        top_entries = [
-            {
-                "organization": {
-                    "id": row["unit_id"],
-                    "identifier": row["identifier"],
-                    "name": row["name"],
-                    "location": row["location"],
-                },
-                "value": row["total"],
-            }
-            for row in rows
-        ]
-
-        return JSONResponse({"top_organization": top_entries})
+        data = await get_cached_dashboard(["top_organization"], top_organization_limit=limit)
+        return FastJSONResponse({"top_organization": data["top_organization"]})
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -434,28 +509,10 @@ async def get_top_organization(limit: int = 5):
 async def get_incident_by_type():
     """Retourne le nombre total d'incidents par type"""
     try:
-        rows = query_db(
-            """
-            SELECT
-                e.type,
-                COUNT(*) AS total
-            FROM event e
-            GROUP BY e.type
-            ORDER BY total DESC, e.type ASC;
-            """
-        )
-
-        payload = [
-            {
-                "type": row["type"],
-                "value": row["total"],
-            }
-            for row in rows
-        ]
-
-        return JSONResponse({"incidents_by_type": payload})
+        data = await get_cached_dashboard(["incidents_by_type"])
+        return FastJSONResponse({"incidents_by_type": data["incidents_by_type"]})
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -468,7 +525,7 @@ async def get_incident_by_classification(limit: int = 5):
     """Retourne le nombre total d'incidents par classification (max 5)"""
     try:
         if limit <= 0:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=400,
                 content={
                     "status": "error",
@@ -476,224 +533,98 @@ async def get_incident_by_classification(limit: int = 5):
                 },
             )
 
-        rows = query_db(
-            """
-            SELECT
-                e.classification,
-                COUNT(*) AS total
-            FROM event e
-            GROUP BY e.classification
-            ORDER BY total DESC, e.classification ASC
-            LIMIT %s;
-            """,
-            params=(limit,),
+        data = await get_cached_dashboard(["incidents_by_classification"], classification_limit=limit)
+        return FastJSONResponse({"incidents": data["incidents_by_classification"]})
+    except Exception as e:
+        return FastJSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "message": f"Erreur lors de la récupération des incidents par classification: {str(e)}",
+            },
         )
 
-        payload = [
-            {
-                "classification": row["classification"],
-                "value": row["total"],
-            }
-            for row in rows
-        ]
+@app.get("/events/details")
+async def get_events_details(ids: str = Query(..., description="Liste d'IDs séparés par des virgules, ex: 1,2,3")):
+    """Route pour récupérer les détails de plusieurs événements en une seule requête"""
+    try:
+        try:
+            event_ids = [int(part) for part in ids.split(",") if part.strip()]
+        except ValueError:
+            return FastJSONResponse(
+                status_code=400,
+                content={
+                    "status": "error",
+                    "message": "ids must be a comma-separated list of integers"
+                }
+            )
+
+        # Dédoublonner en conservant l'ordre demandé
+        event_ids = list(dict.fromkeys(event_ids))
+        if not event_ids or len(event_ids) > MAX_DETAILS_BATCH:
+            return FastJSONResponse(
+                status_code=400,
+                content={
+                    "status": "error",
+                    "message": f"ids must contain between 1 and {MAX_DETAILS_BATCH} event IDs"
+                }
+            )
 
-        return JSONResponse({"incidents": payload})
+        details = await run_in_db_executor(fetch_event_details, event_ids)
+
+        return FastJSONResponse({
+            "status": "success",
+            "events": [details[i] for i in event_ids if i in details],
+            "missing": [i for i in event_ids if i not in details]
+        })
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
-                "message": f"Erreur lors de la récupération des incidents par classification: {str(e)}",
-            },
+                "message": f"Erreur lors de la récupération des détails des événements: {str(e)}"
+            }
         )
 
 @app.get("/{event_id}/details")
 async def get_event_details(event_id: int):
-    """Route pour récupérer tous les détails d'un événement"""
+    """Route pour récupérer tous les détails d'un événement (une seule requête SQL)"""
     try:
-        # Récupérer les détails de l'événement avec inner join person
-        event = query_db("""
-            SELECT 
-                e.event_id,
-                e.description,
-                e.start_datetime,
-                e.end_datetime,
-                e.type,
-                e.classification,
-                p.matricule,
-                p.name,
-                p.family_name,
-                p.person_id
-            FROM event e
-            INNER JOIN person p ON e.declared_by_id = p.person_id
-            WHERE e.event_id = %s;
-        """, params=(event_id,), fetch_one=True)
-        
-        if not event:
-            return JSONResponse(
+        details = await run_in_db_executor(fetch_event_details, [event_id])
+        result = details.get(event_id)
+
+        if not result:
+            return FastJSONResponse(
                 status_code=404,
                 content={
                     "status": "error",
                     "message": f"Événement avec l'ID {event_id} introuvable"
                 }
             )
-        
-        # Récupérer les employés impliqués avec inner join person
-        employees = query_db("""
-            SELECT 
-                ee.person_id,
-                ee.involvement_type,
-                p.matricule,
-                p.name,
-                p.family_name
-            FROM event_employee ee
-            INNER JOIN person p ON ee.person_id = p.person_id
-            WHERE ee.event_id = %s;
-        """, params=(event_id,))
-        
-        # Récupérer l'unité organisationnelle
-        organizational_unit = query_db("""
-            SELECT 
-                ou.identifier,
-                ou.name, 
-                ou.location, 
-                ou.unit_id
-            FROM event e
-            INNER JOIN organizational_unit ou ON e.organizational_unit_id = ou.unit_id
-            WHERE e.event_id = %s;
-        """, params=(event_id,), fetch_one=True)
-        
-        # Récupérer les mesures correctives avec inner join corrective_measure et person
-        corrective_measures = query_db("""
-            SELECT 
-                cm.measure_id,
-                cm.name,
-                cm.implementation_date AS implementation,
-                cm.description,
-                cm.cost,
-                cm.owner_id,
-                p_owner.matricule AS owner_matricule,
-                p_owner.name AS owner_name,
-                p_owner.family_name AS owner_family_name,
-                cm_ou.unit_id AS cm_ou_unit_id,
-                cm_ou.identifier AS cm_ou_identifier,
-                cm_ou.name AS cm_ou_name,
-                cm_ou.location AS cm_ou_location
-            FROM event_corrective_measure ecm
-            INNER JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id
-            INNER JOIN person p_owner ON cm.owner_id = p_owner.person_id
-            LEFT JOIN organizational_unit cm_ou ON cm.organizational_unit_id = cm_ou.unit_id
-            WHERE ecm.event_id = %s;
-        """, params=(event_id,))
-        
-        # Récupérer les risques avec inner join risk
-        risks = query_db("""
-            SELECT 
-                r.risk_id,
-                r.name,
-                r.gravity,
-                r.probability
-            FROM event_risk er
-            INNER JOIN risk r ON er.risk_id = r.risk_id
-            WHERE er.event_id = %s;
-        """, params=(event_id,))
-        
-        risks_payload = None
-        if risks:
-            risks_payload = [
-                {
-                    "id": r['risk_id'],
-                    "name": r['name'],
-                    "gravity": r['gravity'],
-                    "probability": r['probability']
-                }
-                for r in risks
-            ]
-        
-        # Construire la réponse selon la structure demandée
-        result = {
-            "id": event['event_id'],
-            "description": event['description'],
-            "start_datetime": event['start_datetime'],
-            "end_datetime": event['end_datetime'],
-            "type": event['type'],
-            "classification": event['classification'],
-            "person": {
-                "id": event['person_id'],
-                "matricule": event['matricule'],
-                "name": event['name'],
-                "family_name": event['family_name']
-            },
-            "employees": [
-                {
-                    "linked_person" : {
-                        "id": emp['person_id'],
-                        "matricule": emp['matricule'],
-                        "name": emp['name'],
-                        "family_name": emp['family_name']
-                    },
-                    "involvement_type" : emp['involvement_type']
-                    
-                }
-                for emp in (employees if employees else [])
-            ],
-            "organizational_unit": {
-                "id": organizational_unit['unit_id'] if organizational_unit else None,
-                "identifier": organizational_unit['identifier'] if organizational_unit else None,
-                "name": organizational_unit['name'] if organizational_unit else None,
-                "location": organizational_unit['location'] if organizational_unit else None,
-            } if organizational_unit else None,
-            "corrective_measures": [
-                {
-                    "id": cm['measure_id'],
-                    "name": cm['name'],
-                    "implementation": cm['implementation'],
-                    "description": cm['description'],
-                    "cost": cm['cost'],
-                    "owner": {
-                        "id": cm['owner_id'],
-                        "matricule": cm['owner_matricule'],
-                        "name": cm['owner_name'],
-                        "family_name": cm['owner_family_name']
-                    },
-                    "organization_unit": {
-                        "id": cm['cm_ou_unit_id'],
-                        "identifier": cm['cm_ou_identifier'],
-                        "name": cm['cm_ou_name'],
-                        "location": cm['cm_ou_location'],
-                    } if cm['cm_ou_unit_id'] is not None else None
-                }
-                for cm in (corrective_measures if corrective_measures else [])
-            ],
-            "risks": risks_payload
-        }
-        
-        # Convertir les datetime en strings pour la sérialisation JSON
-        result_serializable = convert_datetime_to_str(result)
-        
-        return JSONResponse({
+
+        return FastJSONResponse({
             "status": "success",
-            "event": result_serializable
+            "event": result
         })
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "status": "error",
                 "message": f"Erreur lors de la récupération des détails de l'événement: {str(e)}"
             }
         )
-    
 
 
 
-@app.post("/opensearch/index/all")
-async def opensearch_index_all():
-    """
-    Charge tous les events depuis Postgres et indexe dans OpenSearch (full-text).
-    """
-    try:
-        rows = query_db("""
+
+def _index_all_events() -> dict:
+    """Lit les events par lots (curseur serveur) et les indexe par requêtes _bulk parallèles"""
+    client = get_opensearch_client()
+    ensure_index(client, INDEX_NAME)
+
+    def docs():
+        for rows in stream_query_db("""
             SELECT
               event_id,
               type,
@@ -703,38 +634,66 @@ async def opensearch_index_all():
               description
             FROM event
             ORDER BY event_id
-        """, fetch_one=False)
+        """):
+            for r in rows:
+                yield {
+                    "event_id": r["event_id"],
+                    "type": r.get("type"),
+                    "classification": r.get("classification"),
+                    "start_datetime": r.get("start_datetime"),
+                    "end_datetime": r.get("end_datetime"),
+                    "description": r.get("description"),
+                }
 
-        client = get_opensearch_client()
-        ensure_index(client, INDEX_NAME)
-
-        count = 0
-        for r in rows:
-            doc_id = r["event_id"]
-            index_incident(client, INDEX_NAME, doc_id, {
-                "event_id": r["event_id"],
-                "type": r.get("type"),
-                "classification": r.get("classification"),
-                "start_datetime": r.get("start_datetime"),
-                "end_datetime": r.get("end_datetime"),
-                "description": r.get("description"),
-            })
-            count += 1
-
-        return {"status": "indexed", "count": count}
+    report = bulk_index_incidents(client, INDEX_NAME, docs())
+    invalidate_search_cache()
+    return report
+
+@app.post("/opensearch/index/all")
+async def opensearch_index_all():
+    """
+    Charge tous les events depuis Postgres et indexe dans OpenSearch (full-text).
+    """
+    try:
+        report = await run_in_db_executor(_index_all_events)
+        return {"status": "indexed", "count": report["indexed"], **report}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
+        return FastJSONResponse(status_code=500, content={"status": "error", "message": str(e)})
+
+@app.get("/opensearch/search-cache")
+async def opensearch_search_cache_stats():
+    """Statistiques du cache des recherches RAG (taux de succès, mémoire utilisée)"""
+    return FastJSONResponse({"status": "success", "cache": get_search_cache_stats()})
+
+@app.get("/opensearch/search-status")
+async def opensearch_search_status():
+    """État du disjoncteur des recherches RAG et de l'index local de repli"""
+    return FastJSONResponse({"status": "success", **get_search_status()})
 
 @app.get("/opensearch/count")
 async def opensearch_count():
     """Retourne le nombre de documents indexés dans OpenSearch"""
     try:
         client = get_opensearch_client()
-        ensure_index(client, INDEX_NAME)
-        res = client.count(index=INDEX_NAME)
+        try:
+            # Existence de l'index vérifiée au démarrage: une seule requête ici
+            res = client.count(index=INDEX_NAME)
+        except NotFoundError:
+            # Alias / index supprimé depuis le démarrage. Lecture seule: on ne recrée
+            # rien ici (un incidents_v1 vide masquerait les versions existantes)
+            forget_index(INDEX_NAME)
+            return FastJSONResponse(
+                status_code=404,
+                content={
+                    "index": INDEX_NAME,
+                    "doc_count": 0,
+                    "status": "error",
+                    "message": f"Index '{INDEX_NAME}' introuvable (indexation à lancer)",
+                },
+            )
         return {"index": INDEX_NAME, "doc_count": res.get("count", 0)}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
+        return FastJSONResponse(status_code=500, content={"status": "error", "message": str(e)})
 
 
 
@@ -4,18 +4,16 @@ from fastapi import APIRouter, HTTPException, Body
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from services.bedrock_service import BedrockService
+from services.tool_router import route_tool
 import services.sql_service as sql_service
 import services.pdf_service as pdf_service
-import json
 import io
 
 # --- IMPORTATIONS CRITIQUES (copiées de ai_router.py) ---
-from datetime import datetime, date
-from decimal import Decimal
-import psycopg2.extras
+from serialization import to_jsonable
 from services.opensearch_service import (
-    get_opensearch_client, 
-    search_semantic_incidents, 
+    get_async_opensearch_client,
+    search_semantic_incidents_async,
     INDEX_NAME
 )
 # --- FIN DES IMPORTS ---
@@ -36,21 +34,6 @@ router = APIRouter(prefix="/ai", tags=["AI Reporting"])
 class AIReportRequest(BaseModel):
     query: str
 
-# --- FONCTION DE CONVERSION (copiée de ai_router.py) ---
-def convert_datetime_to_str(obj):
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, psycopg2.extras.RealDictRow): 
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, dict):
-        return {key: convert_datetime_to_str(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_datetime_to_str(item) for item in obj]
-    return obj
-# --- FIN DE LA FONCTION ---
-
 # --- FONCTION DE CONTEXTE RAG (TRADUITE) ---
 def format_rag_context_from_hits(hits: list) -> str:
     """
@@ -107,7 +90,7 @@ async def handle_ai_report(request: AIReportRequest):
     try:
         # --- NOUVELLE LOGIQUE : AGENT HYBRIDE ---
         print(f"Report Agent: Deciding route for query: '{user_query}'")
-        tool_choice = bedrock_service.decide_tool(user_query)
+        tool_choice = route_tool(user_query, bedrock_service.decide_tool)
         print(f"Report Agent: Tool chosen: {tool_choice}")
 
         if tool_choice == "sql":
@@ -120,8 +103,9 @@ async def handle_ai_report(request: AIReportRequest):
             # ÉTAPE 2: Exécuter le SQL
             print(f"Report Agent: Executing: '{sql_query}'")
             try:
-                sql_results, columns = sql_service.execute_safe_sql(sql_query)
-                serializable_results = convert_datetime_to_str(sql_results)
+                sql_results, columns = await sql_service.execute_safe_sql_async(sql_query)
+                # Types JSON natifs (datetime ISO, Decimal -> float) pour les cellules du PDF
+                serializable_results = to_jsonable(sql_results)
                 data_payload = {"columns": columns, "rows": serializable_results}
                 
                 if serializable_results and "Error" in serializable_results[0]:
@@ -145,8 +129,10 @@ async def handle_ai_report(request: AIReportRequest):
             # --- ROUTE RAG (Pour les PDF de texte) ---
             
             # ÉTAPE 1: Chercher dans OpenSearch
-            os_client = get_opensearch_client()
-            search_results = search_semantic_incidents(os_client, INDEX_NAME, user_query, size=3)
+            os_client = get_async_opensearch_client()
+            search_results = await search_semantic_incidents_async(
+                os_client, INDEX_NAME, user_query, size=3, profile="rag"
+            )
             hits = search_results.get("hits", {}).get("hits", [])
 
             # ÉTAPE 2: Formater le contexte
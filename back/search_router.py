@@ -0,0 +1,157 @@
+# search_router.py
+
+import base64
+import binascii
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Query
+from opensearchpy import NotFoundError, RequestError, TransportError
+
+from serialization import FastJSONResponse
+from services.opensearch_service import (
+    get_async_opensearch_client,
+    build_faceted_search_body,
+    faceted_search_sort,
+    parse_facets,
+    INDEX_NAME,
+)
+
+router = APIRouter(tags=["Search"], default_response_class=FastJSONResponse)
+
+
+def encode_search_cursor(query_text: Optional[str], sort_values: List[Any]) -> str:
+    """Encode les valeurs de tri du dernier résultat en jeton opaque (search_after)"""
+    payload = {"s": "score" if query_text else "date", "v": sort_values}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(token: str, query_text: Optional[str]) -> List[Any]:
+    """
+    Décode un jeton produit par encode_search_cursor (ValueError si invalide,
+    ou s'il provient d'une recherche triée autrement).
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        sort_kind, values = payload["s"], payload["v"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid 'after' cursor") from e
+    expected_kind = "score" if query_text else "date"
+    if sort_kind != expected_kind or not isinstance(values, list) or len(values) != len(faceted_search_sort(query_text)):
+        raise ValueError("Invalid 'after' cursor for this query")
+    return values
+
+
+def _search_result(hit: dict) -> dict:
+    source = hit.get("_source", {})
+    return {
+        "id": source.get("event_id"),
+        "score": hit.get("_score"),
+        "type": source.get("type"),
+        "classification": source.get("classification"),
+        "start_datetime": source.get("start_datetime"),
+        "end_datetime": source.get("end_datetime"),
+        "description": source.get("description"),
+        "organizational_unit": source.get("organizational_unit"),
+        "declared_by": source.get("declared_by"),
+        "highlight": hit.get("highlight", {}),
+    }
+
+
+@router.get("/search")
+async def search_incidents(
+    q: Optional[str] = Query(None, max_length=500),
+    event_type: Optional[List[str]] = Query(None, alias="type"),
+    classification: Optional[List[str]] = Query(None),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    unit: Optional[str] = Query(None, description="Nom exact de l'unité organisationnelle"),
+    unit_id: Optional[int] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None),
+    facets: bool = Query(True),
+):
+    """
+    Recherche d'incidents sur l'index OpenSearch (analyse française, surlignage).
+
+    - `q`: texte intégral (syntaxe simple_query_string, tous les termes requis);
+      sans `q`, les incidents les plus récents d'abord
+    - `type`, `classification` (répétables), `start_date`/`end_date`, `unit`/`unit_id`: filtres exacts
+    - `after` = `next_cursor` de la page précédente (search_after: coût constant
+      quelle que soit la profondeur)
+    - `facets`: comptes par type, classification, unité et mois (première page seulement)
+    """
+    if start_date and end_date and end_date < start_date:
+        return FastJSONResponse(
+            status_code=400,
+            content={"status": "error", "message": "end_date must be greater than or equal to start_date"},
+        )
+
+    query_text = q.strip() if q and q.strip() else None
+    search_after = None
+    if after:
+        try:
+            search_after = decode_search_cursor(after, query_text)
+        except ValueError as e:
+            return FastJSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+
+    # Intervalles semi-ouverts [start_date 00:00, end_date + 1 jour 00:00), comme /get_events
+    start = datetime.combine(start_date, time.min).isoformat() if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), time.min).isoformat() if end_date else None
+    with_facets = facets and search_after is None
+
+    body = build_faceted_search_body(
+        query_text=query_text,
+        event_types=[value.strip() for value in event_type or [] if value.strip()],
+        classifications=[value.strip() for value in classification or [] if value.strip()],
+        start=start,
+        end=end,
+        unit=unit.strip() if unit and unit.strip() else None,
+        unit_id=unit_id,
+        size=limit,
+        search_after=search_after,
+        with_facets=with_facets,
+    )
+
+    try:
+        client = get_async_opensearch_client()
+        response = await client.search(index=INDEX_NAME, body=body)
+    except NotFoundError:
+        return FastJSONResponse(
+            status_code=503,
+            content={"status": "error", "message": f"Index de recherche '{INDEX_NAME}' introuvable (indexation à lancer)"},
+        )
+    except RequestError as e:
+        return FastJSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Recherche invalide: {e.error}"},
+        )
+    except TransportError as e:
+        return FastJSONResponse(
+            status_code=503,
+            content={"status": "error", "message": f"Moteur de recherche indisponible: {e}"},
+        )
+    except Exception as e:
+        return FastJSONResponse(
+            status_code=500,
+            content={"status": "error", "message": f"Erreur lors de la recherche: {str(e)}"},
+        )
+
+    hits = response["hits"]["hits"]
+    # Page pleine: il reste potentiellement des résultats après le dernier
+    next_cursor = None
+    if len(hits) == limit:
+        next_cursor = encode_search_cursor(query_text, hits[-1]["sort"])
+
+    return FastJSONResponse({
+        "status": "success",
+        "total": response["hits"]["total"],
+        "count": len(hits),
+        "took_ms": response.get("took"),
+        "next_cursor": next_cursor,
+        "results": [_search_result(hit) for hit in hits],
+        "facets": parse_facets(response.get("aggregations", {})) if with_facets else None,
+    })
@@ -0,0 +1,49 @@
+# serialization.py
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# Options communes: clés non-str (ex: int) acceptées, tableaux NumPy sérialisés directement
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """Types non gérés nativement par orjson (datetime, date, dict et RealDictRow le sont)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Sérialise en JSON (UTF-8) en une seule passe.
+    datetime/date -> ISO 8601, Decimal -> float, RealDictRow -> objet.
+    """
+    return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+
+def dumps_str(obj: Any) -> str:
+    """Comme dumps(), mais retourne une str (ex: contexte JSON pour le LLM)"""
+    return dumps(obj).decode("utf-8")
+
+
+def to_jsonable(obj: Any) -> Any:
+    """
+    Retourne une copie composée uniquement de types JSON natifs (str, float, dict...).
+    À réserver aux cas où la structure Python est réutilisée (ex: génération PDF);
+    pour une réponse HTTP, passer directement l'objet à FastJSONResponse.
+    """
+    return orjson.loads(dumps(obj))
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse sérialisée avec orjson: accepte directement les résultats de
+    query_db (RealDictRow, datetime, Decimal) sans conversion préalable.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
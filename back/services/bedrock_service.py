@@ -4,7 +4,10 @@ import boto3
 import json
 import os
 import re
-from typing import List, Dict, Any, Literal
+import time
+from typing import List, Dict, Any, Iterator, Literal, Optional, Tuple
+
+from services.llm_cache import llm_cache
 
 MODEL_ID = "arn:aws:bedrock:us-east-1:010526273152:inference-profile/us.meta.llama3-2-11b-instruct-v1:0" 
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
@@ -21,24 +24,47 @@ class BedrockService:
             print("Error: Could not initialize Boto3 Bedrock client.")
             raise Exception(f"Bedrock client error: {e}")
 
+    def _prepare_call(self, system_prompt: str, user_content: str, temperature: float, max_tokens: int) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Paramètres de converse / converse_stream, et clé du cache des réponses
+        (None si l'appel n'est pas déterministe, voir services/llm_cache.py).
+        """
+        messages = [
+            {
+                "role": "user", 
+                "content": [{"text": user_content}]
+            }
+        ]
+        inference_config = {
+            "temperature": temperature,
+            "maxTokens": max_tokens
+        }
+        request = {
+            "modelId": MODEL_ID,
+            "system": [{"text": system_prompt}],
+            "messages": messages,
+            "inferenceConfig": inference_config
+        }
+        cache_key = None
+        if llm_cache.accepts(inference_config):
+            cache_key = llm_cache.make_key(MODEL_ID, system_prompt, messages, inference_config)
+        return request, cache_key
+
     def _call_bedrock(self, system_prompt: str, user_content: str, temperature: float = 0.0, max_tokens: int = 2048) -> str:
-        """Helper function to call the Bedrock converse API."""
+        """Helper function to call the Bedrock converse API (cached when deterministic)."""
+        request, cache_key = self._prepare_call(system_prompt, user_content, temperature, max_tokens)
+        if cache_key is not None:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         try:
-            response = self.bedrock.converse(
-                modelId=MODEL_ID,
-                system=[{"text": system_prompt}],
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": [{"text": user_content}]
-                    }
-                ],
-                inferenceConfig={
-                    "temperature": temperature,
-                    "maxTokens": max_tokens
-                }
-            )
-            return response["output"]["message"]["content"][0]["text"]
+            started = time.perf_counter()
+            response = self.bedrock.converse(**request)
+            text = response["output"]["message"]["content"][0]["text"]
+            if cache_key is not None:
+                llm_cache.set(cache_key, text, MODEL_ID, time.perf_counter() - started, response.get("usage"))
+            return text
 
         except Exception as e:
             print(f"Error during Bedrock call (converse): {e}")
@@ -46,6 +72,45 @@ class BedrockService:
                 print(f"Error: Access denied. Have you requested access to model '{MODEL_ID}' in the Bedrock console?")
             raise e 
 
+    def _stream_bedrock(self, system_prompt: str, user_content: str, temperature: float = 0.0, max_tokens: int = 2048) -> Iterator[str]:
+        """
+        Helper function to call the Bedrock converse_stream API: yields the text
+        chunks as they are generated. Une réponse en cache est rendue d'un bloc;
+        une réponse complète est mise en cache comme avec _call_bedrock.
+        """
+        request, cache_key = self._prepare_call(system_prompt, user_content, temperature, max_tokens)
+        if cache_key is not None:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        stream = None
+        try:
+            started = time.perf_counter()
+            stream = self.bedrock.converse_stream(**request)["stream"]
+            chunks, usage = [], None
+            for event in stream:
+                if "contentBlockDelta" in event:
+                    text = event["contentBlockDelta"]["delta"].get("text")
+                    if text:
+                        chunks.append(text)
+                        yield text
+                elif "metadata" in event:
+                    usage = event["metadata"].get("usage")
+            if cache_key is not None:
+                llm_cache.set(cache_key, "".join(chunks), MODEL_ID, time.perf_counter() - started, usage)
+
+        except Exception as e:
+            print(f"Error during Bedrock call (converse_stream): {e}")
+            if "AccessDeniedException" in str(e):
+                print(f"Error: Access denied. Have you requested access to model '{MODEL_ID}' in the Bedrock console?")
+            raise e
+        finally:
+            # Client déconnecté: on arrête de lire le flux
+            if stream is not None:
+                stream.close()
+
     def decide_tool(self, user_query: str) -> Literal["sql", "search"]:
         """
         Decides which tool to use (SQL or RAG/Semantic Search).
@@ -148,9 +213,9 @@ class BedrockService:
         return sql_query.strip().replace(";", "")
 
     # --- FONCTION generate_rag_response (Refonte Totale du Prompt) ---
-    def generate_rag_response(self, context: str, user_query: str) -> str:
+    def _rag_system_prompt(self, context: str) -> str:
         """
-        Generates a natural language response based on a context (RAG or SQL).
+        Builds the answer prompt around a context (RAG or SQL).
         """
         
         base_prompt = """
@@ -198,9 +263,25 @@ class BedrockService:
         
         # Concaténation sécurisée
         system_prompt = base_prompt + context + "\n--- END CONTEXT ---"
-        
+        return system_prompt
+
+    def generate_rag_response(self, context: str, user_query: str) -> str:
+        """
+        Generates a natural language response based on a context (RAG or SQL).
+        """
         return self._call_bedrock(
-            system_prompt=system_prompt, 
+            system_prompt=self._rag_system_prompt(context), 
+            user_content=user_query, 
+            temperature=0.1, 
+            max_tokens=2048
+        )
+
+    def stream_rag_response(self, context: str, user_query: str) -> Iterator[str]:
+        """
+        Same as generate_rag_response, streamed: yields the answer chunk by chunk.
+        """
+        return self._stream_bedrock(
+            system_prompt=self._rag_system_prompt(context), 
             user_content=user_query, 
             temperature=0.1, 
             max_tokens=2048
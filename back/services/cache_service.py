@@ -0,0 +1,212 @@
+# services/cache_service.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional, Tuple
+
+from database import query_db
+
+# Valeur renvoyée par TTLCache.get quand la clé est absente / expirée / périmée
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Petit cache en mémoire (thread-safe) avec expiration et éviction LRU.
+
+    Chaque entrée peut être associée à une "version" des données: une entrée
+    dont la version ne correspond plus à la version courante est considérée
+    comme périmée, même si son TTL n'est pas écoulé.
+
+    get_or_compute() garantit qu'un seul appelant recalcule une clé donnée pour
+    une version donnée; les appels concurrents attendent son résultat.
+    get_or_compute_async() fait de même depuis l'event loop, sans bloquer de thread.
+
+    Avec max_bytes, la taille de chaque valeur (estimée par sizeof) est
+    comptabilisée et les entrées les moins récemment utilisées sont évincées
+    tant que le budget est dépassé.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._bytes = 0
+        self._evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._inflight = {}  # (clé, version) -> threading.Event du calcul en cours
+        self._inflight_async = {}  # (clé, version) -> asyncio.Event (accédé depuis l'event loop seulement)
+        self._computes = 0
+        self._coalesced = 0
+
+    def get(self, key: Hashable, version: Any = None) -> Any:
+        """Retourne la valeur en cache ou MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_version, value, _ = entry
+                if expires_at > now and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                self._remove(key)
+            self._misses += 1
+            return MISSING
+
+    def _remove(self, key: Hashable):
+        """Retire une entrée (verrou déjà pris)"""
+        self._bytes -= self._entries.pop(key)[3]
+
+    def set(self, key: Hashable, value: Any, version: Any = None):
+        """Stocke une valeur pour `ttl` secondes"""
+        size = self._sizeof(value) if self._sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # plus grande que tout le budget: on ne la garde pas
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, version, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], version: Any = None) -> Any:
+        """
+        Retourne la valeur en cache, ou la calcule avec compute() et la stocke.
+        Si un autre thread calcule déjà (clé, version), on attend son résultat
+        au lieu de lancer un second calcul (single-flight).
+        """
+        while True:
+            value = self.get(key, version)
+            if value is not MISSING:
+                return value
+
+            flight_key = (key, version)
+            with self._lock:
+                done = self._inflight.get(flight_key)
+                leader = done is None
+                if leader:
+                    done = threading.Event()
+                    self._inflight[flight_key] = done
+                else:
+                    self._coalesced += 1
+
+            if not leader:
+                done.wait()
+                # Le calcul du leader a pu échouer: dans ce cas on retente nous-mêmes
+                continue
+
+            try:
+                value = compute()
+                self.set(key, value, version)
+                with self._lock:
+                    self._computes += 1
+                return value
+            finally:
+                with self._lock:
+                    self._inflight.pop(flight_key, None)
+                done.set()
+
+    async def get_or_compute_async(
+        self, key: Hashable, compute: Callable[[], Awaitable[Any]], version: Any = None
+    ) -> Any:
+        """
+        Comme get_or_compute, pour les routes async: compute() est une coroutine
+        (ex: requête via run_in_db_executor) et les appels concurrents attendent
+        son résultat sur l'event loop, sans occuper un thread de l'exécuteur.
+        """
+        while True:
+            value = self.get(key, version)
+            if value is not MISSING:
+                return value
+
+            flight_key = (key, version)
+            done = self._inflight_async.get(flight_key)
+            if done is not None:
+                with self._lock:
+                    self._coalesced += 1
+                await done.wait()
+                # Le calcul du leader a pu échouer (ou être annulé): on retente nous-mêmes
+                continue
+
+            done = asyncio.Event()
+            self._inflight_async[flight_key] = done
+            try:
+                value = await compute()
+                self.set(key, value, version)
+                with self._lock:
+                    self._computes += 1
+                return value
+            finally:
+                self._inflight_async.pop(flight_key, None)
+                done.set()
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Supprime une entrée (ou tout le cache si key est None)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "computes": self._computes,
+                "coalesced": self._coalesced,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self._bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
+
+
+def get_data_version(tables: Iterable[str]) -> Tuple[Any, ...]:
+    """
+    Sonde bon marché de la "version" des données: MAX(event_id) et le nombre
+    cumulé d'insertions/mises à jour/suppressions sur les tables données
+    (compteurs de pg_stat_user_tables). Toute écriture sur ces tables change
+    la version, ce qui invalide les entrées de cache qui en dépendent.
+
+    Les compteurs pg_stat sont publiés avec un décalage (quelques secondes au
+    plus): les caches qui s'appuient dessus gardent donc un TTL court.
+    """
+    row = query_db(
+        """
+        SELECT
+            (SELECT MAX(event_id) FROM event) AS max_event_id,
+            (
+                SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+                FROM pg_stat_user_tables
+                WHERE relname = ANY(%s)
+            ) AS modifications;
+        """,
+        params=(list(tables),),
+        fetch_one=True,
+    )
+    return (row["max_event_id"], int(row["modifications"]))
@@ -0,0 +1,188 @@
+# services/embedding_service.py
+
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.text_analysis import analyze
+
+# Embeddings calculés localement (CPU, sans modèle externe): TF-IDF projeté
+# par LSA sur EMBEDDING_DIM dimensions. Le modèle est appris à chaque
+# reconstruction de l'index et enregistré à côté de la version d'index
+# correspondante, pour que les requêtes soient projetées dans le même espace
+# que les documents.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "128"))
+EMBEDDING_MAX_FEATURES = int(os.getenv("EMBEDDING_MAX_FEATURES", "2048"))  # taille du vocabulaire
+EMBEDDING_FIT_SAMPLE = int(os.getenv("EMBEDDING_FIT_SAMPLE", "20000"))  # documents pour l'apprentissage
+EMBEDDING_MODEL_DIR = os.getenv(
+    "EMBEDDING_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models"),
+)
+
+# Lignes traitées par bloc (matrice TF-IDF dense bloc x vocabulaire)
+_BLOCK_ROWS = 1024
+
+
+class LsaModel:
+    """TF-IDF (tf sous-linéaire, normalisé L2) projeté sur les composantes principales (LSA)"""
+
+    def __init__(self, vocabulary: Sequence[str], idf: np.ndarray, components: np.ndarray):
+        self.vocabulary = list(vocabulary)
+        self.term_index = {term: i for i, term in enumerate(self.vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)  # (vocabulaire, dim)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1]
+
+    def tfidf(self, token_lists: Sequence[List[str]]) -> np.ndarray:
+        """Matrice TF-IDF dense (documents x vocabulaire), lignes normalisées"""
+        matrix = np.zeros((len(token_lists), len(self.vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(token_lists):
+            ids = [self.term_index[token] for token in tokens if token in self.term_index]
+            if ids:
+                terms, counts = np.unique(ids, return_counts=True)
+                matrix[row, terms] = (1.0 + np.log(counts)) * self.idf[terms]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Vecteurs normalisés (textes x dim). Un texte sans aucun terme connu
+        donne un vecteur nul (à ne pas indexer / interroger).
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), _BLOCK_ROWS):
+            chunk = texts[start:start + _BLOCK_ROWS]
+            projected = self.tfidf([analyze(text) for text in chunk]) @ self.components
+            norms = np.linalg.norm(projected, axis=1, keepdims=True)
+            np.divide(projected, norms, out=projected, where=norms > 0)
+            vectors[start:start + len(chunk)] = projected
+        return vectors
+
+    def embed_query(self, text: str) -> Optional[List[float]]:
+        """Vecteur d'une requête, ou None si elle ne contient aucun terme connu"""
+        vector = self.embed([text])[0]
+        return vector.tolist() if vector.any() else None
+
+    def save(self, path: str):
+        """Enregistre le modèle (npz, écriture atomique)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.array(self.vocabulary, dtype=str),
+                idf=self.idf,
+                components=self.components,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LsaModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["vocabulary"].tolist(), data["idf"], data["components"])
+
+
+def fit_lsa_model(
+    texts: Sequence[str],
+    dim: int = EMBEDDING_DIM,
+    max_features: int = EMBEDDING_MAX_FEATURES,
+    min_df: int = 2,
+) -> LsaModel:
+    """
+    Apprend un modèle LSA sur un échantillon de textes.
+    Vocabulaire: les max_features termes les plus fréquents (en nombre de
+    documents) apparaissant dans au moins min_df documents; les termes
+    communs sont déjà atténués par l'idf. Les composantes sont
+    les vecteurs propres principaux de X^T X, accumulée par blocs pour ne
+    jamais matérialiser toute la matrice TF-IDF.
+    """
+    token_lists = [analyze(text) for text in texts]
+    n_docs = len(token_lists)
+    if n_docs == 0:
+        raise Exception("Aucun texte pour apprendre le modèle d'embeddings")
+
+    document_frequency = Counter()
+    for tokens in token_lists:
+        document_frequency.update(set(tokens))
+
+    candidates = [(count, term) for term, count in document_frequency.items() if count >= min_df]
+    if not candidates:
+        # Petit corpus: on garde tous les termes
+        candidates = [(count, term) for term, count in document_frequency.items()]
+    if not candidates:
+        raise Exception("Aucun terme exploitable pour le modèle d'embeddings")
+
+    candidates.sort(key=lambda item: (-item[0], item[1]))
+    vocabulary = sorted(term for _, term in candidates[:max_features])
+    df = np.array([document_frequency[term] for term in vocabulary], dtype=np.float64)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+    model = LsaModel(vocabulary, idf, np.zeros((len(vocabulary), 0), dtype=np.float32))
+    gram = np.zeros((len(vocabulary), len(vocabulary)), dtype=np.float64)
+    for start in range(0, n_docs, _BLOCK_ROWS):
+        block = model.tfidf(token_lists[start:start + _BLOCK_ROWS]).astype(np.float64)
+        gram += block.T @ block
+
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    order = np.argsort(eigenvalues)[::-1][:dim]
+    components = eigenvectors[:, order] * (eigenvalues[order] > 1e-9)
+    if components.shape[1] < dim:
+        # Vocabulaire plus petit que la dimension: colonnes nulles (dimension fixe du mapping)
+        components = np.hstack([components, np.zeros((len(vocabulary), dim - components.shape[1]))])
+
+    return LsaModel(vocabulary, idf, components)
+
+
+# ==================== MODÈLES PAR VERSION D'INDEX ====================
+
+_models: Dict[str, Tuple[float, LsaModel]] = {}
+_models_lock = threading.Lock()
+
+
+def model_path(index_name: str) -> str:
+    """Fichier du modèle associé à une version d'index (ex: incidents_v3)"""
+    return os.path.join(EMBEDDING_MODEL_DIR, f"{index_name}.npz")
+
+
+def get_embedding_model(index_name: str) -> Optional[LsaModel]:
+    """
+    Modèle de la version d'index donnée (chargé une fois par processus,
+    rechargé si le fichier change), ou None si l'index n'a pas d'embeddings.
+    """
+    path = model_path(index_name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _models_lock:
+        cached = _models.get(index_name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        model = LsaModel.load(path)
+    except Exception as e:
+        print(f"[EMBEDDINGS] Modèle illisible {path}: {e}")
+        return None
+
+    with _models_lock:
+        _models[index_name] = (mtime, model)
+    return model
+
+
+def delete_embedding_model(index_name: str):
+    """Supprime le modèle d'une version d'index (après suppression de l'index)"""
+    with _models_lock:
+        _models.pop(index_name, None)
+    try:
+        os.remove(model_path(index_name))
+    except FileNotFoundError:
+        pass
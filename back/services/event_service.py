@@ -0,0 +1,351 @@
+# services/event_service.py
+
+import os
+from database import query_db, run_in_db_executor
+from services.cache_service import TTLCache, get_data_version
+from typing import Dict, Any, List
+
+# Nombre maximum d'incidents demandés en une fois à /events/details
+MAX_DETAILS_BATCH = 100
+
+# Document de détail complet d'un incident, construit en une seule requête
+# (agrégations JSON côté serveur, comme enhanced_indexing.fetch_rich_events).
+# La structure correspond exactement à la réponse de /{event_id}/details.
+EVENT_DETAILS_SQL = """
+    SELECT
+        e.event_id,
+        json_build_object(
+            'id', e.event_id,
+            'description', e.description,
+            'start_datetime', e.start_datetime,
+            'end_datetime', e.end_datetime,
+            'type', e.type,
+            'classification', e.classification,
+            'person', json_build_object(
+                'id', p.person_id,
+                'matricule', p.matricule,
+                'name', p.name,
+                'family_name', p.family_name
+            ),
+            'employees', COALESCE(
+                (
+                    SELECT json_agg(json_build_object(
+                        'linked_person', json_build_object(
+                            'id', ee.person_id,
+                            'matricule', p_emp.matricule,
+                            'name', p_emp.name,
+                            'family_name', p_emp.family_name
+                        ),
+                        'involvement_type', ee.involvement_type
+                    ))
+                    FROM event_employee ee
+                    INNER JOIN person p_emp ON ee.person_id = p_emp.person_id
+                    WHERE ee.event_id = e.event_id
+                ),
+                '[]'::json
+            ),
+            'organizational_unit', CASE WHEN ou.unit_id IS NULL THEN NULL ELSE json_build_object(
+                'id', ou.unit_id,
+                'identifier', ou.identifier,
+                'name', ou.name,
+                'location', ou.location
+            ) END,
+            'corrective_measures', COALESCE(
+                (
+                    SELECT json_agg(json_build_object(
+                        'id', cm.measure_id,
+                        'name', cm.name,
+                        'implementation', cm.implementation_date,
+                        'description', cm.description,
+                        'cost', cm.cost,
+                        'owner', json_build_object(
+                            'id', cm.owner_id,
+                            'matricule', p_owner.matricule,
+                            'name', p_owner.name,
+                            'family_name', p_owner.family_name
+                        ),
+                        'organization_unit', CASE WHEN cm_ou.unit_id IS NULL THEN NULL ELSE json_build_object(
+                            'id', cm_ou.unit_id,
+                            'identifier', cm_ou.identifier,
+                            'name', cm_ou.name,
+                            'location', cm_ou.location
+                        ) END
+                    ))
+                    FROM event_corrective_measure ecm
+                    INNER JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id
+                    INNER JOIN person p_owner ON cm.owner_id = p_owner.person_id
+                    LEFT JOIN organizational_unit cm_ou ON cm.organizational_unit_id = cm_ou.unit_id
+                    WHERE ecm.event_id = e.event_id
+                ),
+                '[]'::json
+            ),
+            -- null (et non []) quand l'incident n'a aucun risque, comme l'ancienne route
+            'risks', (
+                SELECT json_agg(json_build_object(
+                    'id', r.risk_id,
+                    'name', r.name,
+                    'gravity', r.gravity,
+                    'probability', r.probability
+                ))
+                FROM event_risk er
+                INNER JOIN risk r ON er.risk_id = r.risk_id
+                WHERE er.event_id = e.event_id
+            )
+        ) AS event
+    FROM event e
+    INNER JOIN person p ON e.declared_by_id = p.person_id
+    LEFT JOIN organizational_unit ou ON e.organizational_unit_id = ou.unit_id
+    WHERE e.event_id = ANY(%s);
+"""
+
+
+def fetch_event_details(event_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Récupère le détail complet de plusieurs incidents en un seul aller-retour.
+
+    Returns:
+        Un dict {event_id: document}. Les ids introuvables (ou sans déclarant)
+        sont absents du résultat.
+    """
+    if not event_ids:
+        return {}
+    rows = query_db(EVENT_DETAILS_SQL, params=(list(event_ids),))
+    return {row["event_id"]: row["event"] for row in rows}
+
+
+# --- Tableau de bord ---
+
+DASHBOARD_SECTIONS = (
+    "basic_info",
+    "top_organization",
+    "incidents_by_type",
+    "incidents_by_classification",
+    "recent_incidents",
+)
+
+# Agrégats par incident, puis tous les regroupements du tableau de bord en un seul
+# parcours de la table event (GROUPING SETS + agrégats FILTER).
+_DASHBOARD_AGGREGATES_CTE = """
+    measures AS (
+        SELECT ecm.event_id, SUM(cm.cost) AS cost
+        FROM event_corrective_measure ecm
+        LEFT JOIN corrective_measure cm ON ecm.measure_id = cm.measure_id
+        GROUP BY ecm.event_id
+    ),
+    critical AS (
+        SELECT DISTINCT er.event_id
+        FROM event_risk er
+        INNER JOIN risk r ON er.risk_id = r.risk_id
+        WHERE r.gravity ILIKE 'critical%%'
+    ),
+    grouped AS (
+        SELECT
+            GROUPING(e.type) AS g_type,
+            GROUPING(e.classification) AS g_classification,
+            GROUPING(e.organizational_unit_id) AS g_unit,
+            e.type,
+            e.classification,
+            e.organizational_unit_id,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE c.event_id IS NOT NULL) AS critical,
+            COUNT(*) FILTER (WHERE m.event_id IS NULL) AS no_measure,
+            COALESCE(SUM(m.cost), 0) AS cost
+        FROM event e
+        LEFT JOIN measures m ON m.event_id = e.event_id
+        LEFT JOIN critical c ON c.event_id = e.event_id
+        GROUP BY GROUPING SETS ((), (e.type), (e.classification), (e.organizational_unit_id))
+    )
+"""
+
+_DASHBOARD_SECTION_SQL = {
+    "basic_info": """
+        (
+            SELECT json_build_object(
+                'total_event_count', g.total,
+                'total_critical_risk_count', g.critical,
+                'total_no_corrective_measure_count', g.no_measure,
+                'total_corrective_measure_cost', g.cost
+            )
+            FROM grouped g
+            WHERE g.g_type = 1 AND g.g_classification = 1 AND g.g_unit = 1
+        )
+    """,
+    "top_organization": """
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                'organization', json_build_object(
+                    'id', t.unit_id,
+                    'identifier', t.identifier,
+                    'name', t.name,
+                    'location', t.location
+                ),
+                'value', t.total
+            ) ORDER BY t.total DESC, t.unit_id ASC), '[]'::json)
+            FROM (
+                SELECT ou.unit_id, ou.identifier, ou.name, ou.location, g.total
+                FROM grouped g
+                INNER JOIN organizational_unit ou ON g.organizational_unit_id = ou.unit_id
+                WHERE g.g_unit = 0
+                ORDER BY g.total DESC, ou.unit_id ASC
+                LIMIT %(top_organization_limit)s
+            ) t
+        )
+    """,
+    "incidents_by_type": """
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                'type', g.type,
+                'value', g.total
+            ) ORDER BY g.total DESC, g.type ASC), '[]'::json)
+            FROM grouped g
+            WHERE g.g_type = 0
+        )
+    """,
+    "incidents_by_classification": """
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                'classification', t.classification,
+                'value', t.total
+            ) ORDER BY t.total DESC, t.classification ASC), '[]'::json)
+            FROM (
+                SELECT g.classification, g.total
+                FROM grouped g
+                WHERE g.g_classification = 0
+                ORDER BY g.total DESC, g.classification ASC
+                LIMIT %(classification_limit)s
+            ) t
+        )
+    """,
+    "recent_incidents": """
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id', t.event_id,
+                'type', t.type,
+                'classification', t.classification,
+                'start_datetime', t.start_datetime,
+                'end_datetime', t.end_datetime,
+                'person', CASE WHEN t.person_id IS NULL THEN NULL ELSE json_build_object(
+                    'id', t.person_id,
+                    'matricule', t.matricule,
+                    'name', t.name,
+                    'family_name', t.family_name,
+                    'role', t.role
+                ) END
+            ) ORDER BY t.start_datetime DESC NULLS LAST, t.event_id DESC), '[]'::json)
+            FROM (
+                SELECT
+                    e.event_id,
+                    e.type,
+                    e.classification,
+                    e.start_datetime,
+                    e.end_datetime,
+                    p.person_id,
+                    p.matricule,
+                    p.name,
+                    p.family_name,
+                    p.role
+                FROM event e
+                LEFT JOIN person p ON e.declared_by_id = p.person_id
+                ORDER BY e.start_datetime DESC NULLS LAST, e.event_id DESC
+                LIMIT %(recent_limit)s
+            ) t
+        )
+    """,
+}
+
+
+def compute_dashboard(
+    sections: List[str] = DASHBOARD_SECTIONS,
+    top_organization_limit: int = 5,
+    classification_limit: int = 5,
+    recent_limit: int = 7,
+) -> Dict[str, Any]:
+    """
+    Calcule les widgets du tableau de bord demandés en une seule requête SQL.
+
+    Les sections agrégées (basic_info, top_organization, incidents_by_type,
+    incidents_by_classification) partagent un unique parcours de event;
+    recent_incidents est une lecture indexée séparée dans la même requête.
+
+    Returns:
+        Un dict {section: données} limité aux sections demandées
+    """
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown dashboard section(s): {', '.join(unknown)}")
+    if not sections:
+        return {}
+
+    select_list = ",\n".join(
+        f"{_DASHBOARD_SECTION_SQL[section]} AS {section}" for section in sections
+    )
+    needs_aggregates = any(section != "recent_incidents" for section in sections)
+    with_clause = f"WITH {_DASHBOARD_AGGREGATES_CTE}" if needs_aggregates else ""
+
+    row = query_db(
+        f"{with_clause} SELECT {select_list};",
+        params={
+            "top_organization_limit": top_organization_limit,
+            "classification_limit": classification_limit,
+            "recent_limit": recent_limit,
+        },
+        fetch_one=True,
+    )
+    return {section: row[section] for section in sections}
+
+
+# --- Cache du tableau de bord ---
+
+# Tables dont dépendent les agrégats: toute écriture change la version des données
+DASHBOARD_TABLES = (
+    "event",
+    "person",
+    "organizational_unit",
+    "risk",
+    "event_risk",
+    "corrective_measure",
+    "event_corrective_measure",
+)
+# Plafond de fraîcheur, même si la sonde de version ne voit aucun changement
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "300"))
+# La sonde de version elle-même est mémorisée brièvement pour absorber les rafales
+DASHBOARD_VERSION_PROBE_TTL = float(os.getenv("DASHBOARD_VERSION_PROBE_TTL", "1"))
+
+dashboard_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL, max_entries=256)
+_dashboard_version_cache = TTLCache(ttl=DASHBOARD_VERSION_PROBE_TTL, max_entries=1)
+
+
+async def get_dashboard_data_version():
+    """Version courante des données du tableau de bord (sonde mémorisée DASHBOARD_VERSION_PROBE_TTL s)"""
+    return await _dashboard_version_cache.get_or_compute_async(
+        "version", lambda: run_in_db_executor(get_data_version, DASHBOARD_TABLES)
+    )
+
+
+async def get_cached_dashboard(
+    sections: List[str] = DASHBOARD_SECTIONS,
+    top_organization_limit: int = 5,
+    classification_limit: int = 5,
+    recent_limit: int = 7,
+) -> Dict[str, Any]:
+    """
+    compute_dashboard avec cache: le résultat est réutilisé tant que la version
+    des données ne change pas (et au plus DASHBOARD_CACHE_TTL secondes). Une
+    rafale de requêtes identiques ne déclenche qu'un seul recalcul par version:
+    les autres requêtes l'attendent sur l'event loop, seul le calcul occupe un
+    thread de l'exécuteur DB. L'ordre des sections ne change pas la clé.
+    """
+    sections = sorted(set(sections))
+    version = await get_dashboard_data_version()
+    key = (tuple(sections), top_organization_limit, classification_limit, recent_limit)
+    return await dashboard_cache.get_or_compute_async(
+        key,
+        lambda: run_in_db_executor(
+            compute_dashboard,
+            sections,
+            top_organization_limit=top_organization_limit,
+            classification_limit=classification_limit,
+            recent_limit=recent_limit,
+        ),
+        version,
+    )
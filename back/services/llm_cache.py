@@ -0,0 +1,243 @@
+# services/llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from services.cache_service import TTLCache, MISSING
+
+# Cache des réponses Bedrock: une réponse n'est réutilisée que pour un appel
+# identique (modèle, prompts, inferenceConfig) et déterministe (température
+# <= LLM_CACHE_MAX_TEMPERATURE). Deux niveaux: mémoire du processus (LRU) puis
+# SQLite sur disque, partagé entre les workers.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # durée de vie d'une réponse (s)
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))  # appels plus aléatoires non mis en cache
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # budget du fichier SQLite
+LLM_CACHE_DB = os.getenv(
+    "LLM_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.sqlite3"),
+)
+
+# Nettoyage du disque (expirés + LRU au-delà du budget) toutes les N écritures
+_PRUNE_EVERY = 50
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        latency REAL NOT NULL,
+        input_tokens INTEGER NOT NULL,
+        output_tokens INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access);
+"""
+
+
+class LLMCache:
+    """
+    Cache à deux niveaux des réponses LLM. Une erreur du niveau disque
+    (fichier verrouillé, disque plein...) n'interrompt jamais l'appel au
+    modèle: elle est comptée et l'appel se fait sans cache.
+    """
+
+    def __init__(
+        self,
+        db_path: str = LLM_CACHE_DB,
+        ttl: float = LLM_CACHE_TTL,
+        memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        max_temperature: float = LLM_CACHE_MAX_TEMPERATURE,
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_temperature = max_temperature
+        # Valeur en mémoire: (réponse, latence, jetons entrée, jetons sortie)
+        self.memory = TTLCache(ttl=ttl, max_entries=memory_entries)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+            "disk_errors": 0,
+            "saved_seconds": 0.0,
+            "saved_input_tokens": 0,
+            "saved_output_tokens": 0,
+        }
+
+    # --- Clé ---
+
+    def accepts(self, inference_config: Dict[str, Any]) -> bool:
+        """Seuls les appels déterministes sont mis en cache"""
+        if not LLM_CACHE_ENABLED:
+            return False
+        cacheable = inference_config.get("temperature", 1.0) <= self.max_temperature
+        if not cacheable:
+            with self._lock:
+                self._counters["bypassed"] += 1
+        return cacheable
+
+    @staticmethod
+    def make_key(model_id: str, system_prompt: str, messages: Any, inference_config: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"model": model_id, "system": system_prompt, "messages": messages, "config": inference_config},
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- Disque ---
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexion SQLite du processus (verrou déjà pris)"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=2.0, check_same_thread=False, isolation_level=None)
+            # WAL: lectures concurrentes des autres workers pendant une écriture
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _disk_error(self, action: str, error: Exception):
+        self._counters["disk_errors"] += 1
+        print(f"[LLM CACHE] Erreur SQLite ({action}): {error}")
+
+    def _prune(self, db: sqlite3.Connection):
+        """Supprime les réponses expirées puis les moins récemment lues au-delà du budget"""
+        now = time.time()
+        db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        rows = db.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall()
+        victims = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        db.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+
+    # --- API ---
+
+    def get(self, key: str) -> Optional[str]:
+        """Réponse en cache (mémoire puis disque), ou None"""
+        entry = self.memory.get(key)
+        if entry is not MISSING:
+            self._record_hit("memory_hits", entry)
+            return entry[0]
+
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._connection()
+                row = db.execute(
+                    "SELECT response, latency, input_tokens, output_tokens, expires_at "
+                    "FROM llm_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and row[4] > now:
+                    db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                self._disk_error("lecture", e)
+                row = None
+
+        if row is None or row[4] <= now:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+
+        entry = row[:4]
+        self.memory.set(key, entry)
+        self._record_hit("disk_hits", entry)
+        return entry[0]
+
+    def _record_hit(self, counter: str, entry: tuple):
+        _, latency, input_tokens, output_tokens = entry
+        with self._lock:
+            self._counters[counter] += 1
+            self._counters["saved_seconds"] += latency
+            self._counters["saved_input_tokens"] += input_tokens
+            self._counters["saved_output_tokens"] += output_tokens
+
+    def set(self, key: str, response: str, model_id: str, latency: float, usage: Optional[Dict[str, Any]] = None):
+        """Enregistre une réponse (latence et jetons servent aux statistiques d'économie)"""
+        usage = usage or {}
+        entry = (response, latency, int(usage.get("inputTokens", 0)), int(usage.get("outputTokens", 0)))
+        self.memory.set(key, entry)
+
+        now = time.time()
+        with self._lock:
+            self._counters["stores"] += 1
+            try:
+                db = self._connection()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache "
+                    "(key, model, response, size, latency, input_tokens, output_tokens, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, model_id, response, len(response.encode("utf-8")), *entry[1:], now, now + self.ttl, now),
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._prune(db)
+            except sqlite3.Error as e:
+                self._disk_error("écriture", e)
+
+    def clear(self):
+        self.memory.invalidate()
+        with self._lock:
+            try:
+                self._connection().execute("DELETE FROM llm_cache")
+            except sqlite3.Error as e:
+                self._disk_error("purge", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            try:
+                entries, size = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                ).fetchone()
+                disk = {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "path": self.db_path}
+            except sqlite3.Error as e:
+                self._disk_error("statistiques", e)
+                disk = {"error": str(e)}
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        counters["saved_seconds"] = round(counters["saved_seconds"], 3)
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "max_temperature": self.max_temperature,
+            "ttl": self.ttl,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            **counters,
+            "memory": self.memory.stats(),
+            "disk": disk,
+        }
+
+
+llm_cache = LLMCache()
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """Statistiques du cache des réponses LLM (compteurs propres à ce processus)"""
+    return llm_cache.stats()
@@ -0,0 +1,376 @@
+# services/local_search_service.py
+
+import json
+import os
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from serialization import dumps
+from services.text_analysis import analyze
+
+# Moteur BM25 embarqué: copie des documents de l'index OpenSearch, construite
+# par enhanced_indexing.py à chaque reconstruction. Sert de repli quand le
+# cluster est indisponible (disjoncteur de opensearch_service) et de
+# substitut local pour les benchmarks.
+#
+# Format sur disque (un répertoire par version d'index, tableaux .npy
+# projetés en mémoire: le chargement ne lit rien, les pages sont partagées
+# entre les workers):
+#   vocabulary.json     termes, dans l'ordre des term_id
+#   term_offsets.npy    int64[T+1]: postings du terme t = [offsets[t], offsets[t+1])
+#   postings_docs.npy   int32: numéro de document (croissant pour un terme)
+#   postings_tf.npy     uint16: fréquence du terme dans le document
+#   doc_lengths.npy     int32: nombre de termes de chaque document
+#   event_ids.npy       int64: event_id de chaque document
+#   store_offsets.npy   int64[N+1]: _source du document d dans store.bin
+#   store.bin           _source JSON concaténés
+#   meta.json           écrit en dernier: sa présence marque un index complet
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "local"),
+)
+LOCAL_INDEX_RELOAD_TTL = float(os.getenv("LOCAL_INDEX_RELOAD_TTL", "30"))  # recherche d'une version plus récente (s)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_ARRAYS = ("term_offsets", "postings_docs", "postings_tf", "doc_lengths", "event_ids", "store_offsets")
+
+
+def local_index_path(index_name: str, directory: str = LOCAL_INDEX_DIR) -> str:
+    return os.path.join(directory, index_name)
+
+
+# Fichiers bruts écrits par LocalIndexBuilder.add (un lot à la suite de l'autre)
+_SPILL_DTYPES = {
+    "run_terms": np.int32,      # postings de chaque lot, triées par terme
+    "run_docs": np.int32,
+    "run_tf": np.uint16,
+    "doc_lengths": np.int32,
+    "event_ids": np.int64,
+    "store_offsets": np.int64,
+}
+# Éléments copiés à la fois des fichiers bruts vers les tableaux .npy
+_COPY_CHUNK = 1 << 20
+
+
+def _read_spill(path: str, dtype) -> np.ndarray:
+    """Fichier brut projeté en mémoire (tableau vide si le fichier l'est)"""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class LocalIndexBuilder:
+    """
+    Construit un index local à partir des documents de enhanced_indexing.
+    add() peut être appelé depuis plusieurs threads (callback on_batch du pipeline).
+
+    Mémoire bornée: chaque lot est écrit aussitôt dans le répertoire temporaire
+    (postings triées par terme, longueurs, event_id, _source); seul le
+    vocabulaire reste en mémoire. finish() fusionne les lots dans les tableaux
+    finaux projetés en mémoire, un lot à la fois.
+    """
+
+    def __init__(self, index_name: str, directory: str = LOCAL_INDEX_DIR):
+        self.index_name = index_name
+        self.path = local_index_path(index_name, directory)
+        self.tmp_path = f"{self.path}.tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self._store = open(os.path.join(self.tmp_path, "store.bin"), "wb")
+        self._spill = {name: open(self._spill_path(name), "wb") for name in _SPILL_DTYPES}
+        self._spill["store_offsets"].write(np.zeros(1, dtype=np.int64).tobytes())
+        self._lock = threading.Lock()
+        self._terms: Dict[str, int] = {}
+        # Fin de chaque lot dans les fichiers run_* (un élément par appel à add)
+        self._run_ends = array("q")
+        self._n_docs = 0
+        self._n_postings = 0
+        self._total_length = 0
+        self._store_size = 0
+
+    def _spill_path(self, name: str) -> str:
+        return os.path.join(self.tmp_path, f"{name}.bin")
+
+    def add(self, docs: Iterable[Dict[str, Any]]):
+        # Analyse et sérialisation hors verrou
+        prepared = []
+        for doc in docs:
+            terms = Counter(analyze(doc.get("full_text_search") or ""))
+            source = dumps({key: value for key, value in doc.items() if key != "embedding"})
+            prepared.append((doc["event_id"], terms, source))
+        if not prepared:
+            return
+
+        with self._lock:
+            term_ids, doc_refs, tfs = array("i"), array("i"), array("H")
+            doc_lengths, event_ids, store_offsets = array("i"), array("q"), array("q")
+            for event_id, terms, source in prepared:
+                doc_ref = self._n_docs
+                self._n_docs += 1
+                event_ids.append(event_id)
+                doc_lengths.append(sum(terms.values()))
+                for term, tf in terms.items():
+                    term_ids.append(self._terms.setdefault(term, len(self._terms)))
+                    doc_refs.append(doc_ref)
+                    tfs.append(min(tf, 65535))
+                self._store.write(source)
+                self._store_size += len(source)
+                store_offsets.append(self._store_size)
+
+            # Tri stable: les documents d'un terme restent dans l'ordre croissant
+            run_terms = np.array(term_ids, dtype=np.int32)
+            order = np.argsort(run_terms, kind="stable")
+            self._spill["run_terms"].write(run_terms[order].tobytes())
+            self._spill["run_docs"].write(np.array(doc_refs, dtype=np.int32)[order].tobytes())
+            self._spill["run_tf"].write(np.array(tfs, dtype=np.uint16)[order].tobytes())
+            self._spill["doc_lengths"].write(doc_lengths.tobytes())
+            self._spill["event_ids"].write(event_ids.tobytes())
+            self._spill["store_offsets"].write(store_offsets.tobytes())
+            self._n_postings += len(term_ids)
+            self._total_length += sum(doc_lengths)
+            self._run_ends.append(self._n_postings)
+
+    def _merge_postings(self) -> np.ndarray:
+        """
+        Écrit postings_docs / postings_tf groupées par terme à partir des lots
+        (tri par dénombrement: chaque lot est recopié à la position courante de
+        ses termes). Retourne term_offsets.
+        """
+        n_terms = len(self._terms)
+        run_terms = _read_spill(self._spill_path("run_terms"), np.int32)
+        run_docs = _read_spill(self._spill_path("run_docs"), np.int32)
+        run_tf = _read_spill(self._spill_path("run_tf"), np.uint16)
+        runs = list(zip([0, *self._run_ends[:-1]], self._run_ends))
+
+        counts = np.zeros(n_terms, dtype=np.int64)
+        for start, end in runs:
+            terms, run_counts = np.unique(run_terms[start:end], return_counts=True)
+            counts[terms] += run_counts
+        term_offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(counts, out=term_offsets[1:])
+
+        postings_docs = np.lib.format.open_memmap(
+            os.path.join(self.tmp_path, "postings_docs.npy"), mode="w+", dtype=np.int32, shape=(self._n_postings,)
+        )
+        postings_tf = np.lib.format.open_memmap(
+            os.path.join(self.tmp_path, "postings_tf.npy"), mode="w+", dtype=np.uint16, shape=(self._n_postings,)
+        )
+        # Lots dans l'ordre des documents: les postings d'un terme restent croissantes
+        cursor = term_offsets[:-1].copy()
+        for start, end in runs:
+            terms = np.asarray(run_terms[start:end])
+            unique, first, run_counts = np.unique(terms, return_index=True, return_counts=True)
+            rank = np.arange(len(terms)) - np.repeat(first, run_counts)
+            positions = cursor[terms] + rank
+            postings_docs[positions] = run_docs[start:end]
+            postings_tf[positions] = run_tf[start:end]
+            cursor[unique] += run_counts
+        postings_docs.flush()
+        postings_tf.flush()
+        del postings_docs, postings_tf, run_terms, run_docs, run_tf
+        return term_offsets
+
+    def _spill_to_npy(self, name: str):
+        """Recopie un fichier brut dans son tableau .npy, par tranches"""
+        dtype = _SPILL_DTYPES[name]
+        source = _read_spill(self._spill_path(name), dtype)
+        target = np.lib.format.open_memmap(
+            os.path.join(self.tmp_path, f"{name}.npy"), mode="w+", dtype=dtype, shape=(len(source),)
+        )
+        for start in range(0, len(source), _COPY_CHUNK):
+            target[start:start + _COPY_CHUNK] = source[start:start + _COPY_CHUNK]
+        target.flush()
+        del target, source
+
+    def finish(self) -> str:
+        """Écrit l'index et le met en place (remplace une version existante du même nom)"""
+        with self._lock:
+            self._store.close()
+            for spill in self._spill.values():
+                spill.close()
+            np.save(os.path.join(self.tmp_path, "term_offsets.npy"), self._merge_postings())
+            for name in ("doc_lengths", "event_ids", "store_offsets"):
+                self._spill_to_npy(name)
+            for name in _SPILL_DTYPES:
+                os.remove(self._spill_path(name))
+            with open(os.path.join(self.tmp_path, "vocabulary.json"), "w", encoding="utf-8") as f:
+                json.dump(list(self._terms), f, ensure_ascii=False)
+
+            n_docs = self._n_docs
+            meta = {
+                "index": self.index_name,
+                "documents": n_docs,
+                "terms": len(self._terms),
+                "postings": self._n_postings,
+                "avg_doc_length": (self._total_length / n_docs) if n_docs else 0.0,
+                "built_at": time.time(),
+            }
+            with open(os.path.join(self.tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(self.tmp_path, self.path)
+        print(f"Index local '{self.index_name}': {n_docs} documents, {meta['terms']} termes "
+              f"({self.path}).")
+        return self.path
+
+    def abort(self):
+        """Abandonne la construction (fichiers temporaires supprimés)"""
+        with self._lock:
+            self._store.close()
+            for spill in self._spill.values():
+                spill.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class LocalSearchIndex:
+    """Index BM25 en lecture seule, projeté en mémoire"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "vocabulary.json"), "r", encoding="utf-8") as f:
+            self.term_index = {term: term_id for term_id, term in enumerate(json.load(f))}
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        store_file = os.path.join(path, "store.bin")
+        self.store = (
+            np.memmap(store_file, dtype=np.uint8, mode="r")
+            if os.path.getsize(store_file) else np.zeros(0, dtype=np.uint8)
+        )
+        self.name = self.meta["index"]
+        self.n_docs = int(self.meta["documents"])
+        self.avg_doc_length = float(self.meta["avg_doc_length"]) or 1.0
+
+    def source(self, doc_ref: int) -> Dict[str, Any]:
+        start, end = self.store_offsets[doc_ref], self.store_offsets[doc_ref + 1]
+        return orjson.loads(self.store[start:end].tobytes())
+
+    def search(self, query_text: str, size: int = 3) -> Dict[str, Any]:
+        """Recherche BM25 sur full_text_search; réponse au format d'un _search OpenSearch"""
+        started = time.perf_counter()
+        term_ids = {self.term_index[term] for term in analyze(query_text) if term in self.term_index}
+        if not term_ids or self.n_docs == 0:
+            return empty_local_result(self.name)
+
+        doc_parts, score_parts = [], []
+        for term_id in term_ids:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = np.asarray(self.postings_docs[start:end])
+            tf = self.postings_tf[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[docs] / self.avg_doc_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+
+        # Accumulation par document (tableaux de taille N, sans tri)
+        docs = np.concatenate(doc_parts)
+        matched = np.flatnonzero(np.bincount(docs, minlength=self.n_docs))
+        scores = np.bincount(docs, weights=np.concatenate(score_parts), minlength=self.n_docs)[matched]
+        if len(scores) > size:
+            candidates = np.argpartition(-scores, size)[:size]
+        else:
+            candidates = np.arange(len(scores))
+        top = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        hits = [
+            {
+                "_index": self.name,
+                "_id": str(int(self.event_ids[matched[i]])),
+                "_score": float(scores[i]),
+                "_source": self.source(int(matched[i])),
+            }
+            for i in top
+        ]
+        return {
+            "took": round((time.perf_counter() - started) * 1000, 3),
+            "engine": "local",
+            "hits": {
+                "total": {"value": int(len(matched)), "relation": "eq"},
+                "max_score": hits[0]["_score"] if hits else None,
+                "hits": hits,
+            },
+        }
+
+
+def empty_local_result(index_name: Optional[str] = None) -> Dict[str, Any]:
+    return {"engine": "local", "index": index_name, "hits": {"hits": [], "total": {"value": 0}}}
+
+
+# ==================== INDEX COURANT ====================
+
+_local_index: Optional[LocalSearchIndex] = None
+_local_index_key: Optional[Tuple[float, str]] = None
+_checked_at = 0.0
+_local_lock = threading.Lock()
+
+
+def _latest_index(directory: str = LOCAL_INDEX_DIR) -> Optional[Tuple[float, str]]:
+    """(date de construction, chemin) de l'index complet (meta.json présent) le plus récent"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return None
+    complete = []
+    for name in names:
+        meta_file = os.path.join(directory, name, "meta.json")
+        if not name.endswith(".tmp") and os.path.exists(meta_file):
+            complete.append((os.path.getmtime(meta_file), os.path.join(directory, name)))
+    return max(complete) if complete else None
+
+
+def get_local_index() -> Optional[LocalSearchIndex]:
+    """
+    Index local le plus récent (chargé une fois par processus; une version plus
+    récente est recherchée au plus toutes les LOCAL_INDEX_RELOAD_TTL s).
+    """
+    global _local_index, _local_index_key, _checked_at
+    now = time.monotonic()
+    if _local_index is not None and now - _checked_at < LOCAL_INDEX_RELOAD_TTL:
+        return _local_index
+
+    with _local_lock:
+        if _local_index is not None and now - _checked_at < LOCAL_INDEX_RELOAD_TTL:
+            return _local_index
+        _checked_at = now
+        latest = _latest_index()
+        if latest != _local_index_key:
+            _local_index_key = latest
+            _local_index = None
+            if latest is not None:
+                try:
+                    _local_index = LocalSearchIndex(latest[1])
+                    print(f"Index local chargé: {latest[1]} ({_local_index.n_docs} documents).")
+                except Exception as e:
+                    print(f"Index local illisible {latest[1]}: {e}")
+        return _local_index
+
+
+def search_local_incidents(query_text: str, size: int = 3) -> Dict[str, Any]:
+    """Recherche RAG sur l'index local (résultat vide si aucun index n'a été construit)"""
+    index = get_local_index()
+    if index is None:
+        print("Aucun index local disponible (lancer enhanced_indexing.py).")
+        return empty_local_result()
+    return index.search(query_text, size)
+
+
+def delete_local_index(index_name: str):
+    """Supprime l'index local d'une version d'index (après suppression de l'index)"""
+    shutil.rmtree(local_index_path(index_name), ignore_errors=True)
+
+
+def get_local_index_stats() -> Dict[str, Any]:
+    index = get_local_index()
+    return {"available": False} if index is None else {"available": True, "path": index.path, **index.meta}
@@ -1,10 +1,59 @@
 # services/opensearch_service.py
 
-from opensearchpy import OpenSearch, NotFoundError
-from typing import List, Optional, Dict, Any
+from opensearchpy import OpenSearch, AsyncOpenSearch, NotFoundError, TransportError, helpers
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 import os
+import threading
+import time
+import unicodedata
+
+from serialization import dumps
+from services.cache_service import TTLCache, MISSING
+from services.embedding_service import EMBEDDING_DIM, get_embedding_model
+from services.local_search_service import search_local_incidents, get_local_index_stats
 INDEX_NAME = "incidents"
 
+# Client partagé par le processus (pool de connexions HTTP keep-alive)
+OS_POOL_MAXSIZE = int(os.getenv("OS_POOL_MAXSIZE", "20"))  # connexions HTTP max vers le cluster
+OS_TIMEOUT = float(os.getenv("OS_TIMEOUT", "10"))  # délai (s) d'une requête standard (recherche, count)
+OS_MAX_RETRIES = int(os.getenv("OS_MAX_RETRIES", "2"))  # nouvelles tentatives sur erreur réseau / timeout
+OS_BULK_REQUEST_TIMEOUT = float(os.getenv("OS_BULK_REQUEST_TIMEOUT", "120"))  # délai (s) d'une requête _bulk
+
+# Paramètres d'indexation en masse (API _bulk)
+OS_BULK_CHUNK_SIZE = int(os.getenv("OS_BULK_CHUNK_SIZE", "500"))  # documents par requête _bulk
+OS_BULK_MAX_CHUNK_BYTES = int(os.getenv("OS_BULK_MAX_CHUNK_BYTES", str(10 * 1024 * 1024)))  # taille max d'une requête
+OS_BULK_WORKERS = int(os.getenv("OS_BULK_WORKERS", "4"))  # requêtes _bulk en parallèle
+OS_BULK_MAX_RETRIES = int(os.getenv("OS_BULK_MAX_RETRIES", "3"))  # nouvelles tentatives des documents en échec
+
+# Cache des résultats de search_semantic_incidents
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))  # durée de vie max d'un résultat (s)
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # budget mémoire (JSON)
+# Fréquence max (s) de la sonde de "génération" de l'index (index désigné par l'alias + compteurs)
+SEARCH_GENERATION_PROBE_TTL = float(os.getenv("SEARCH_GENERATION_PROBE_TTL", "5"))
+
+# Index versionnés: INDEX_NAME est un alias vers le dernier index publié (incidents_v<N>)
+OS_INDEX_REPLICAS = int(os.getenv("OS_INDEX_REPLICAS", "0"))  # réplicas de l'index publié
+OS_INDEX_KEEP_VERSIONS = int(os.getenv("OS_INDEX_KEEP_VERSIONS", "1"))  # anciennes versions conservées (retour arrière)
+# Requêtes jouées sur un nouvel index avant publication (caches chauds)
+WARMUP_QUERIES = ("incident", "risque de chute", "mesure corrective", "blessure")
+
+# Recherche hybride: "lexical" (BM25 seul) ou "hybrid" (BM25 + k-NN sur les embeddings)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "lexical")
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))  # poids du score lexical dans la fusion (0..1)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # candidats demandés à chaque sous-recherche
+
+# Disjoncteur des recherches RAG: repli sur l'index local (services/local_search_service.py)
+OS_BREAKER_FAILURES = int(os.getenv("OS_BREAKER_FAILURES", "3"))  # échecs consécutifs avant ouverture
+OS_BREAKER_RESET_TIMEOUT = float(os.getenv("OS_BREAKER_RESET_TIMEOUT", "30"))  # délai (s) avant un nouvel essai
+# Cluster injoignable au démarrage: délai (s) entre deux essais de création de l'index
+OS_STARTUP_RETRY_INTERVAL = float(os.getenv("OS_STARTUP_RETRY_INTERVAL", "10"))
+
+# Recherche publique /search (search_router.py)
+SEARCH_FACET_SIZE = int(os.getenv("SEARCH_FACET_SIZE", "20"))  # valeurs max par facette
+
 
 
 # Host par défaut pour OpenSearch lancé via Docker
@@ -13,8 +62,8 @@ OS_PORT = int(os.getenv("OS_PORT", 9200))
 # Utilisez des credentials si vous en avez configuré
 OS_AUTH = ('admin', 'FireTeams@2025!') # Adaptez ('admin', 'admin') ou commentez si pas d'auth
 
-def get_opensearch_client() -> OpenSearch:
-    """Crée et retourne un client OpenSearch."""
+def _client_args() -> Dict[str, Any]:
+    """Paramètres communs aux clients OpenSearch synchrone et asynchrone."""
     client_args = {
         "hosts": [{'host': OS_HOST, 'port': OS_PORT}],
         "http_auth": OS_AUTH,
@@ -22,12 +71,137 @@ def get_opensearch_client() -> OpenSearch:
         "verify_certs": False,
         "ssl_assert_hostname": False,
         "ssl_show_warn": False,
+        # Connexions réutilisées (keep-alive) entre les requêtes et les threads
+        "pool_maxsize": OS_POOL_MAXSIZE,
+        "timeout": OS_TIMEOUT,
+        "max_retries": OS_MAX_RETRIES,
+        "retry_on_timeout": True,
     }
     # Ne pas passer http_auth si non défini
     if not OS_AUTH[0]:
         del client_args["http_auth"]
-        
-    return OpenSearch(**client_args)
+    return client_args
+
+def create_opensearch_client() -> OpenSearch:
+    """Crée un nouveau client OpenSearch (préférer get_opensearch_client)."""
+    return OpenSearch(**_client_args())
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+# Index (ou alias) dont l'existence a déjà été vérifiée par ensure_index
+_known_indices = set()
+# Arrêt du thread qui attend le cluster au démarrage (ensure_index_when_available)
+_startup_retry_stop = threading.Event()
+
+def get_opensearch_client() -> OpenSearch:
+    """Retourne le client OpenSearch du processus (créé au premier appel, thread-safe)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_opensearch_client()
+    return _client
+
+def close_opensearch_client():
+    """Ferme les connexions du client partagé (arrêt de l'application)."""
+    global _client
+    _startup_retry_stop.set()
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        _known_indices.clear()
+
+def get_async_opensearch_client() -> AsyncOpenSearch:
+    """
+    Retourne le client OpenSearch asynchrone du processus, pour les routes async:
+    les recherches ne bloquent pas l'event loop. À appeler depuis l'event loop
+    (la session HTTP y est rattachée).
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenSearch(**_client_args())
+    return _async_client
+
+async def close_async_opensearch_client():
+    """Ferme les connexions du client asynchrone (arrêt de l'application)."""
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.close()
+
+def forget_index(index_name: str):
+    """Oublie l'existence d'un index (ex: supprimé hors de l'application)."""
+    _known_indices.discard(index_name)
+
+class CircuitBreaker:
+    """
+    Disjoncteur (thread-safe): après `failure_threshold` échecs consécutifs,
+    allow() refuse les appels pendant `reset_timeout` s, puis laisse passer un
+    seul appel d'essai. Succès -> fermé; échec -> ouvert pour un nouveau délai.
+    Un essai sans résultat enregistré (ex: servi par le cache) expire après
+    `reset_timeout` s et un nouvel essai est autorisé.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started_at: Optional[float] = None
+        self._rejected = 0
+        self._trips = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            trial_expired = self._trial_started_at is None or now - self._trial_started_at >= self.reset_timeout
+            if trial_expired and now - self._opened_at >= self.reset_timeout:
+                self._trial_started_at = now
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_started_at = None
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self._trips += 1
+                self._opened_at = time.monotonic()
+
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._trial_started_at is not None else "open"
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state()
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "trips": self._trips,
+                "rejected": self._rejected,
+            }
+
+search_breaker = CircuitBreaker(OS_BREAKER_FAILURES, OS_BREAKER_RESET_TIMEOUT)
+
+def _is_unavailable(exc: BaseException) -> bool:
+    """Cluster injoignable ou surchargé (connexion, timeout, 429/5xx), par opposition à une requête invalide"""
+    return isinstance(exc, TransportError) and _is_retryable(exc.status_code)
 
 def create_index_mapping(index_name: str):
     """
@@ -38,7 +212,8 @@ def create_index_mapping(index_name: str):
         "settings": {
             "index": {
                 "number_of_shards": 1,
-                "number_of_replicas": 0,
+                "number_of_replicas": OS_INDEX_REPLICAS,
+                "knn": True,
                 "analysis": {
                     "analyzer": {
                         "default": {
@@ -79,12 +254,26 @@ def create_index_mapping(index_name: str):
                 
                 # Le champ de recherche principal pour le RAG
                 "full_text_search": {"type": "text", "analyzer": "french_analyzer"},
+
+                # Embedding de full_text_search (services/embedding_service.py) pour la recherche hybride
+                "embedding": {
+                    "type": "knn_vector",
+                    "dimension": EMBEDDING_DIM,
+                    "method": {"name": "hnsw", "space_type": "cosinesimil", "engine": "lucene"}
+                },
                 
                 # --- Données structurées jointes (basées sur l'UML) ---
                 "organizational_unit": {
                     "type": "object",
                     "properties": {
-                        "name": {"type": "text", "analyzer": "french_analyzer"},
+                        "unit_id": {"type": "integer"},
+                        "identifier": {"type": "keyword"},
+                        # Sous-champ keyword: filtre et facette par unité (/search)
+                        "name": {
+                            "type": "text",
+                            "analyzer": "french_analyzer",
+                            "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}
+                        },
                         "location": {"type": "text", "analyzer": "french_analyzer"}
                     }
                 },
@@ -125,22 +314,147 @@ def create_index_mapping(index_name: str):
         }
     }
 
-# --- FONCTION ensure_index (INCHANGÉE) ---
 def ensure_index(client: OpenSearch, index_name: str):
     """
     S'assure que l'index existe avec le bon mapping (utilisé par main.py).
+    S'il n'existe pas, crée la première version (`<index_name>_v1`) et l'alias
+    `index_name` qui pointe dessus.
+
+    L'existence est mémorisée: les appels suivants ne font aucune requête.
     """
+    if index_name in _known_indices:
+        return
     if not client.indices.exists(index=index_name):
         print(f"Création de l'index '{index_name}'...")
         try:
-            index_body = create_index_mapping(index_name)
-            client.indices.create(index=index_name, body=index_body)
-            print(f"Index '{index_name}' créé avec succès.")
+            version_name = f"{index_name}_v1"
+            client.indices.create(index=version_name, body=create_index_mapping(version_name))
+            client.indices.put_alias(index=version_name, name=index_name)
+            print(f"Index '{version_name}' créé avec succès (alias '{index_name}').")
         except Exception as e:
             print(f"Erreur lors de la création de l'index: {e}")
             raise
     else:
         print(f"L'index '{index_name}' existe déjà.")
+    _known_indices.add(index_name)
+
+def ensure_index_when_available(index_name: str, retry_interval: float = OS_STARTUP_RETRY_INTERVAL) -> bool:
+    """
+    ensure_index pour le démarrage de l'application: si le cluster est
+    injoignable (arrêté, encore en démarrage), l'erreur est journalisée et un
+    thread réessaie toutes les `retry_interval` s au lieu d'empêcher le
+    démarrage. En attendant, les recherches RAG passent par le disjoncteur et
+    l'index local. Retourne True si l'index est prêt dès cet appel.
+    """
+    try:
+        ensure_index(get_opensearch_client(), index_name)
+        return True
+    except Exception as e:
+        if not _is_unavailable(e):
+            raise
+        print(f"OpenSearch injoignable au démarrage ({e!r}): nouvel essai dans {retry_interval:g} s.")
+
+    def retry():
+        while not _startup_retry_stop.wait(retry_interval):
+            try:
+                ensure_index(get_opensearch_client(), index_name)
+                print(f"OpenSearch joignable: index '{index_name}' prêt.")
+                return
+            except Exception as e:
+                if not _is_unavailable(e):
+                    print(f"Erreur lors de la vérification de l'index '{index_name}': {e!r}")
+                    return
+
+    _startup_retry_stop.clear()
+    threading.Thread(target=retry, name="opensearch-startup", daemon=True).start()
+    return False
+
+# --- Index versionnés et bascule d'alias ---
+
+def list_index_versions(client: OpenSearch, alias: str) -> List[Tuple[int, str]]:
+    """Versions existantes `<alias>_v<N>`, triées par N croissant"""
+    prefix = f"{alias}_v"
+    versions = []
+    for name in client.indices.get(index=f"{prefix}*"):
+        suffix = name[len(prefix):]
+        if suffix.isdigit():
+            versions.append((int(suffix), name))
+    return sorted(versions)
+
+def get_alias_targets(client: OpenSearch, alias: str) -> List[str]:
+    """Index actuellement désignés par l'alias (vide si l'alias n'existe pas)"""
+    try:
+        return list(client.indices.get_alias(name=alias))
+    except NotFoundError:
+        return []
+
+def create_versioned_index(client: OpenSearch, alias: str) -> str:
+    """
+    Crée `<alias>_v<N+1>` pour une reconstruction: sans réplica et sans
+    rafraîchissement, le temps du chargement (voir publish_index).
+    """
+    versions = list_index_versions(client, alias)
+    index_name = f"{alias}_v{versions[-1][0] + 1 if versions else 1}"
+    body = create_index_mapping(index_name)
+    body["settings"]["index"]["number_of_replicas"] = 0
+    body["settings"]["index"]["refresh_interval"] = "-1"
+    client.indices.create(index=index_name, body=body)
+    print(f"Index '{index_name}' créé pour la reconstruction.")
+    return index_name
+
+def warm_up_index(client: OpenSearch, index_name: str, queries: Iterable[str] = WARMUP_QUERIES):
+    """Joue quelques recherches représentatives pour charger les caches du nouvel index"""
+    for query_text in queries:
+        search_semantic_incidents(client, index_name, query_text, size=3, use_cache=False)
+
+def publish_index(client: OpenSearch, alias: str, index_name: str):
+    """
+    Rend un index reconstruit servable puis y bascule l'alias:
+    1. restaure réplicas et rafraîchissement, refresh, attente des shards;
+    2. warm-up;
+    3. bascule atomique de l'alias (un seul appel _aliases). Un ancien index
+       concret portant le nom de l'alias est supprimé dans la même opération.
+    """
+    client.indices.put_settings(
+        index=index_name,
+        body={"index": {"number_of_replicas": OS_INDEX_REPLICAS, "refresh_interval": None}},
+    )
+    client.indices.refresh(index=index_name)
+    # Le cluster attend au plus 30s (délai par défaut de wait_for_status)
+    health = client.cluster.health(index=index_name, wait_for_status="green", request_timeout=60)
+    if health.get("timed_out"):
+        print(f"Attention: '{index_name}' n'est pas 'green' ({health.get('status')}), publication quand même.")
+
+    warm_up_index(client, index_name)
+
+    actions = [{"remove": {"index": target, "alias": alias}} for target in get_alias_targets(client, alias)]
+    if not actions and client.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    invalidate_search_cache()
+    print(f"Alias '{alias}' -> '{index_name}'.")
+
+def gc_index_versions(client: OpenSearch, alias: str, keep: int = OS_INDEX_KEEP_VERSIONS) -> List[str]:
+    """
+    Supprime les anciennes versions non désignées par l'alias, en conservant
+    les `keep` plus récentes (retour arrière possible).
+
+    Returns:
+        Les index supprimés
+    """
+    targets = set(get_alias_targets(client, alias))
+    versions = list_index_versions(client, alias)
+    published = [version for version, name in versions if name in targets]
+    if not published:
+        return []
+    # Une version plus récente que l'index publié est une reconstruction en cours: on n'y touche pas
+    old_versions = [name for version, name in versions if version < max(published) and name not in targets]
+    to_delete = old_versions[: max(0, len(old_versions) - keep)]
+    if to_delete:
+        client.indices.delete(index=",".join(to_delete))
+        print(f"Anciennes versions supprimées: {', '.join(to_delete)}")
+    return to_delete
 
 # --- FONCTION index_incident (INCHANGÉE) ---
 def index_incident(client: OpenSearch, index_name: str, doc_id: int, doc_body: dict):
@@ -155,17 +469,291 @@ def index_incident(client: OpenSearch, index_name: str, doc_id: int, doc_body: d
     except Exception as e:
         print(f"Erreur lors de l'indexation du doc {doc_id}: {e}")
 
-# --- FONCTION search_semantic_incidents (REMPLACÉE) ---
-def search_semantic_incidents(
+# --- Indexation en masse (API _bulk) ---
+
+# Statuts pour lesquels un document en échec est renvoyé (surcharge, erreur serveur, erreur réseau)
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def _is_retryable(status: Any) -> bool:
+    # Erreur de transport (connexion, timeout): statut non numérique ("N/A")
+    return not isinstance(status, int) or status in _RETRYABLE_STATUSES
+
+def send_bulk_chunk(
     client: OpenSearch,
     index_name: str,
-    query_text: str,
-    size: int = 3
+    docs: List[Dict[str, Any]],
+    max_retries: int = OS_BULK_MAX_RETRIES,
+    max_chunk_bytes: int = OS_BULK_MAX_CHUNK_BYTES,
+    chunk_size: int = OS_BULK_CHUNK_SIZE,
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Indexe un lot de documents (clé: event_id) avec l'API _bulk, en requêtes
+    d'au plus `chunk_size` documents et `max_chunk_bytes` octets.
+    Les documents en échec pour une raison transitoire (429, 5xx, réseau)
+    sont renvoyés jusqu'à `max_retries` fois avec un backoff exponentiel.
+
+    Returns:
+        (nombre de documents indexés, liste des erreurs définitives {id, status, error})
+    """
+    pending = {str(doc["event_id"]): doc for doc in docs}
+    indexed = 0
+    errors: List[Dict[str, Any]] = []
+
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(min(30.0, 0.5 * 2 ** (attempt - 1)))
+
+        actions = (
+            {"_index": index_name, "_id": doc_id, "_source": doc}
+            for doc_id, doc in pending.items()
+        )
+        ok_count, item_errors = helpers.bulk(
+            client,
+            actions,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            raise_on_error=False,
+            raise_on_exception=False,
+            request_timeout=OS_BULK_REQUEST_TIMEOUT,
+        )
+        indexed += ok_count
+
+        retry = {}
+        for item in item_errors:
+            info = next(iter(item.values()))
+            doc_id = str(info.get("_id"))
+            error = {"id": doc_id, "status": info.get("status"), "error": str(info.get("error"))}
+            if _is_retryable(error["status"]) and doc_id in pending and attempt < max_retries:
+                retry[doc_id] = pending[doc_id]
+            else:
+                errors.append(error)
+
+        if not retry:
+            break
+        pending = retry
+
+    return indexed, errors
+
+def _chunks(docs: Iterable[Dict[str, Any]], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+@contextmanager
+def refresh_disabled(client: OpenSearch, index_name: str):
+    """
+    Désactive le rafraîchissement de l'index pendant un chargement massif,
+    puis restaure le réglage précédent et force un refresh unique à la fin.
+    """
+    settings = client.indices.get_settings(index=index_name, name="index.refresh_interval")
+    previous = None
+    for index_settings in settings.values():
+        previous = index_settings.get("settings", {}).get("index", {}).get("refresh_interval")
+    client.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1"}})
+    try:
+        yield
+    finally:
+        # None remet la valeur par défaut du cluster
+        client.indices.put_settings(index=index_name, body={"index": {"refresh_interval": previous}})
+        client.indices.refresh(index=index_name)
+
+def bulk_index_incidents(
+    client: OpenSearch,
+    index_name: str,
+    docs: Iterable[Dict[str, Any]],
+    chunk_size: int = OS_BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = OS_BULK_MAX_CHUNK_BYTES,
+    workers: int = OS_BULK_WORKERS,
+    max_retries: int = OS_BULK_MAX_RETRIES,
+    disable_refresh: bool = True,
+    max_reported_errors: Optional[int] = 100,
 ) -> Dict[str, Any]:
     """
-    Exécute la recherche sémantique/textuelle pour le RAG.
+    Indexe un flux de documents par lots _bulk envoyés en parallèle (`workers` requêtes
+    simultanées au plus; le flux d'entrée n'est consommé qu'au rythme des envois).
+    max_reported_errors=None conserve toutes les erreurs dans le rapport.
+
+    Returns:
+        Un rapport {indexed, failed, errors (échantillon), seconds, docs_per_sec}
+    """
+    start = time.monotonic()
+    indexed = 0
+    failed = 0
+    errors: List[Dict[str, Any]] = []
+
+    def collect(future):
+        nonlocal indexed, failed
+        ok_count, chunk_errors = future.result()
+        indexed += ok_count
+        failed += len(chunk_errors)
+        if max_reported_errors is None:
+            errors.extend(chunk_errors)
+        else:
+            errors.extend(chunk_errors[: max(0, max_reported_errors - len(errors))])
+
+    def run():
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="os-bulk") as executor:
+            in_flight = set()
+            for chunk in _chunks(docs, chunk_size):
+                # Contre-pression: pas plus de `workers` lots en attente d'envoi
+                if len(in_flight) >= workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                in_flight.add(executor.submit(
+                    send_bulk_chunk, client, index_name, chunk, max_retries, max_chunk_bytes, chunk_size
+                ))
+            for future in in_flight:
+                collect(future)
+
+    if disable_refresh:
+        with refresh_disabled(client, index_name):
+            run()
+    else:
+        run()
+
+    seconds = time.monotonic() - start
+    report = {
+        "indexed": indexed,
+        "failed": failed,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(indexed / seconds, 1) if seconds > 0 else 0.0,
+    }
+    print(f"Bulk '{index_name}': {indexed} indexés, {failed} en échec, "
+          f"{report['seconds']}s ({report['docs_per_sec']} docs/s)")
+    return report
+
+def bulk_delete_incidents(
+    client: OpenSearch,
+    index_name: str,
+    event_ids: Iterable[int],
+    chunk_size: int = OS_BULK_CHUNK_SIZE,
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Supprime des documents par lots _bulk. Un document déjà absent (404)
+    n'est pas une erreur.
+
+    Returns:
+        (nombre de documents supprimés, liste des erreurs {id, status, error})
+    """
+    actions = (
+        {"_op_type": "delete", "_index": index_name, "_id": str(event_id)}
+        for event_id in event_ids
+    )
+    deleted = 0
+    errors: List[Dict[str, Any]] = []
+    for ok, item in helpers.streaming_bulk(
+        client,
+        actions,
+        chunk_size=chunk_size,
+        raise_on_error=False,
+        raise_on_exception=False,
+        request_timeout=OS_BULK_REQUEST_TIMEOUT,
+    ):
+        info = next(iter(item.values()))
+        if ok:
+            deleted += 1
+        elif info.get("status") != 404:
+            errors.append({"id": str(info.get("_id")), "status": info.get("status"), "error": str(info.get("error"))})
+    return deleted, errors
+
+# --- Cache des recherches ---
+
+search_cache = TTLCache(
+    ttl=SEARCH_CACHE_TTL,
+    max_entries=10000,
+    max_bytes=SEARCH_CACHE_MAX_BYTES,
+    sizeof=lambda result: len(dumps(result)),
+)
+_generation_cache = TTLCache(ttl=SEARCH_GENERATION_PROBE_TTL, max_entries=64)
+
+def normalize_query_text(query_text: str) -> str:
+    """
+    Forme canonique d'une question pour la clé de cache: Unicode NFC et espaces
+    normalisés. La casse et la ponctuation sont conservées: elles changent le
+    résultat (champs keyword type/classification, syntaxe simple_query_string).
+    """
+    return " ".join(unicodedata.normalize("NFC", query_text).split())
+
+def _generation_from_stats(stats: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Génération de l'index: index concret(s) désigné(s) par l'alias, nombre de
+    refresh et d'écritures. Change à chaque bascule d'alias, écriture ou refresh.
+    """
+    primaries = stats.get("_all", {}).get("primaries", {})
+    return (
+        tuple(sorted(stats.get("indices", {}))),
+        primaries.get("refresh", {}).get("total"),
+        primaries.get("indexing", {}).get("index_total"),
+        primaries.get("indexing", {}).get("delete_total"),
+    )
+
+def get_index_generation(client: OpenSearch, index_name: str) -> Tuple[Any, ...]:
+    """Génération courante de l'index (sonde mémorisée SEARCH_GENERATION_PROBE_TTL s)"""
+    return _generation_cache.get_or_compute(
+        index_name,
+        lambda: _generation_from_stats(client.indices.stats(index=index_name, metric="refresh,indexing")),
+    )
+
+async def get_index_generation_async(client: AsyncOpenSearch, index_name: str) -> Tuple[Any, ...]:
+    generation = _generation_cache.get(index_name)
+    if generation is MISSING:
+        stats = await client.indices.stats(index=index_name, metric="refresh,indexing")
+        generation = _generation_from_stats(stats)
+        _generation_cache.set(index_name, generation)
+    return generation
+
+def invalidate_search_cache():
+    """Vide le cache des recherches (ex: après une indexation dans ce processus)"""
+    search_cache.invalidate()
+    _generation_cache.invalidate()
+
+def get_search_cache_stats() -> Dict[str, Any]:
+    return {"results": search_cache.stats(), "generation_probe": _generation_cache.stats()}
+
+# Profils de récupération: champs du _source et surlignage demandés par
+# chaque consommateur (moins d'octets transférés et décodés par recherche)
+RETRIEVAL_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Document complet (hors embedding) + surlignage
+    "full": {"source": {"excludes": ["embedding"]}, "highlight": True},
+    # Contexte RAG: champs lus par format_rag_context_from_hits (ai_router, report_router)
+    "rag": {
+        "source": {
+            "includes": [
+                "event_id",
+                "description",
+                "risks.name",
+                "risks.gravity",
+                "corrective_measures.name",
+                "involved_employees.name",
+                "involved_employees.family_name",
+            ]
+        },
+        "highlight": False,
+    },
+}
+DEFAULT_RETRIEVAL_PROFILE = "full"
+
+def get_retrieval_profile(name: str) -> Dict[str, Any]:
+    try:
+        return RETRIEVAL_PROFILES[name]
+    except KeyError:
+        raise Exception(f"Profil de récupération inconnu: '{name}'")
+
+# --- FONCTION search_semantic_incidents (REMPLACÉE) ---
+def build_search_body(query_text: str, size: int = 3, profile: str = DEFAULT_RETRIEVAL_PROFILE) -> Dict[str, Any]:
+    """
+    Construit la requête de recherche sémantique/textuelle pour le RAG.
     CORRIGÉE pour inclure les employés et améliorer la recherche de mots-clés.
+    `profile` (RETRIEVAL_PROFILES) choisit les champs renvoyés et le surlignage.
     """
+    retrieval = get_retrieval_profile(profile)
     
     # 1. Recherche de texte principale (pour les descriptions, noms, etc.)
     base_match = {
@@ -225,6 +813,7 @@ def search_semantic_incidents(
     # Combinaison : Doit correspondre à l'un de ces blocs
     search_body = {
         "size": size,
+        "_source": retrieval["source"],
         "query": {
             "bool": {
                 "should": [
@@ -236,8 +825,10 @@ def search_semantic_incidents(
                 ],
                 "minimum_should_match": 1 
             }
-        },
-        "highlight": {
+        }
+    }
+    if retrieval["highlight"]:
+        search_body["highlight"] = {
             "fields": {
                 "full_text_search": {},
                 "description": {}
@@ -245,14 +836,364 @@ def search_semantic_incidents(
             "fragment_size": 150,
             "number_of_fragments": 3
         }
+    return search_body
+
+def build_knn_body(vector: List[float], size: int, profile: str = DEFAULT_RETRIEVAL_PROFILE) -> Dict[str, Any]:
+    """Recherche des plus proches voisins sur le champ embedding"""
+    return {
+        "size": size,
+        "_source": get_retrieval_profile(profile)["source"],
+        "query": {"knn": {"embedding": {"vector": vector, "k": size}}},
+    }
+
+def _normalized_scores(hits: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Scores ramenés sur [0, 1] (min-max) pour rendre BM25 et k-NN comparables"""
+    scores = {hit["_id"]: hit.get("_score") or 0.0 for hit in hits}
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {doc_id: 1.0 for doc_id in scores}
+    return {doc_id: (score - low) / (high - low) for doc_id, score in scores.items()}
+
+def fuse_hybrid_responses(
+    responses: List[Dict[str, Any]],
+    size: int,
+    alpha: float = HYBRID_ALPHA,
+) -> Dict[str, Any]:
+    """
+    Fusionne les réponses [lexicale, k-NN] d'un _msearch:
+    score = alpha * lexical + (1 - alpha) * vecteur, chaque liste normalisée
+    min-max. Les hits lexicaux (avec surlignage) sont préférés aux hits k-NN
+    pour un même document. Si la partie k-NN échoue, renvoie le lexical seul.
+    """
+    lexical, vector = responses
+    if lexical.get("error"):
+        raise Exception(f"Recherche lexicale en échec: {lexical['error']}")
+    lexical_hits = lexical["hits"]["hits"]
+    if vector.get("error"):
+        print(f"Recherche k-NN en échec, résultats lexicaux seuls: {vector['error']}")
+        return {**lexical, "hits": {**lexical["hits"], "hits": lexical_hits[:size]}}
+
+    vector_hits = vector["hits"]["hits"]
+    lexical_scores = _normalized_scores(lexical_hits)
+    vector_scores = _normalized_scores(vector_hits)
+
+    hits_by_id = {hit["_id"]: hit for hit in vector_hits}
+    hits_by_id.update({hit["_id"]: hit for hit in lexical_hits})
+    fused = [
+        {
+            **hit,
+            "_score": alpha * lexical_scores.get(doc_id, 0.0) + (1 - alpha) * vector_scores.get(doc_id, 0.0),
+        }
+        for doc_id, hit in hits_by_id.items()
+    ]
+    fused.sort(key=lambda hit: hit["_score"], reverse=True)
+    return {
+        "took": max(lexical.get("took", 0), vector.get("took", 0)),
+        "hits": {
+            "total": lexical["hits"]["total"],
+            "max_score": fused[0]["_score"] if fused else None,
+            "hits": fused[:size],
+        },
     }
 
-    try:
-        print(f"Exécution de la recherche RAG (Corrigée v2) pour: '{query_text}'")
-        return client.search(index=index_name, body=search_body)
-    except NotFoundError:
+def _search_request(
+    index_name: str,
+    query_text: str,
+    size: int,
+    mode: str,
+    generation: Optional[Tuple[Any, ...]],
+    profile: str = DEFAULT_RETRIEVAL_PROFILE,
+) -> Tuple[str, Any]:
+    """
+    Requête à exécuter: ("search", corps) ou ("msearch", lignes) en mode
+    hybride. Le modèle d'embeddings est celui de l'index concret désigné par
+    l'alias; sans modèle (index antérieur) ou sans terme connu dans la
+    question, la recherche reste lexicale.
+    """
+    if mode == "hybrid":
+        concrete = generation[0][0] if generation and len(generation[0]) == 1 else index_name
+        model = get_embedding_model(concrete)
+        vector = model.embed_query(query_text) if model else None
+        if vector is not None:
+            candidates = max(size, HYBRID_CANDIDATES)
+            return "msearch", [
+                {}, build_search_body(query_text, candidates, profile),
+                {}, build_knn_body(vector, candidates, profile),
+            ]
+    return "search", build_search_body(query_text, size, profile)
+
+def _empty_search_result() -> Dict[str, Any]:
+    return {"hits": {"hits": [], "total": {"value": 0}}}
+
+def _local_fallback(query_text: str, size: int, reason: str) -> Dict[str, Any]:
+    """Recherche sur l'index BM25 local (dernière reconstruction) quand OpenSearch ne répond pas"""
+    print(f"Recherche RAG sur l'index local ({reason}) pour: '{query_text}'")
+    return search_local_incidents(query_text, size)
+
+def get_search_status() -> Dict[str, Any]:
+    """État du disjoncteur des recherches et de l'index local de repli"""
+    return {"breaker": search_breaker.stats(), "local_index": get_local_index_stats()}
+
+# Étapes communes à search_semantic_incidents et à sa variante asynchrone:
+# seuls les appels au cluster (sonde de génération, recherche) diffèrent.
+
+def _search_cache_key(index_name: str, query_text: str, size: int, mode: str, profile: str) -> Tuple[Any, ...]:
+    return (index_name, normalize_query_text(query_text), size, mode, profile)
+
+def _needs_generation(use_cache: bool, mode: str) -> bool:
+    # Génération: clé du cache, et index concret (modèle d'embeddings) en mode hybride
+    return use_cache or mode == "hybrid"
+
+def _generation_error(e: Exception, index_name: str) -> Optional[str]:
+    """Sonde de génération en échec: raison du repli local, ou None (recherche sans cache)"""
+    if _is_unavailable(e):
+        search_breaker.record_failure()
+        return f"OpenSearch indisponible: {e}"
+    print(f"Sonde de génération de l'index '{index_name}' impossible, recherche sans cache: {e}")
+    return None
+
+def _cached_search(key: Tuple[Any, ...], generation: Optional[Tuple[Any, ...]], query_text: str) -> Any:
+    cached = search_cache.get(key, generation)
+    if cached is not MISSING:
+        print(f"Recherche RAG servie depuis le cache pour: '{query_text}'")
+    return cached
+
+def _search_error(e: Exception, index_name: str) -> Optional[str]:
+    """Recherche en échec: raison du repli local (index absent, cluster indisponible), ou None (résultat vide)"""
+    if isinstance(e, NotFoundError):
         print(f"Erreur: Index '{index_name}' non trouvé lors de la recherche.")
-        return {"hits": {"hits": [], "total": {"value": 0}}}
+        search_breaker.record_success()
+        return "index absent"
+    print(f"Erreur lors de la recherche OpenSearch: {e}")
+    if _is_unavailable(e):
+        search_breaker.record_failure()
+        return "OpenSearch indisponible"
+    search_breaker.record_success()
+    return None
+
+def _search_done(
+    key: Tuple[Any, ...], result: Dict[str, Any], generation: Optional[Tuple[Any, ...]], use_cache: bool
+) -> Dict[str, Any]:
+    search_breaker.record_success()
+    if use_cache:
+        search_cache.set(key, result, generation)
+    return result
+
+def search_semantic_incidents(
+    client: OpenSearch,
+    index_name: str,
+    query_text: str,
+    size: int = 3,
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+    profile: str = DEFAULT_RETRIEVAL_PROFILE,
+) -> Dict[str, Any]:
+    """
+    Exécute la recherche sémantique/textuelle pour le RAG (voir build_search_body).
+    mode: "lexical" ou "hybrid" (défaut: SEARCH_MODE), voir fuse_hybrid_responses.
+    profile: champs renvoyés et surlignage (RETRIEVAL_PROFILES); "rag" pour
+    un contexte LLM.
+
+    Les résultats sont mis en cache par (index, question normalisée, size, mode, profil)
+    pour la génération courante de l'index: une bascule d'alias, une écriture ou
+    un refresh les invalide (au plus SEARCH_GENERATION_PROBE_TTL s plus tard).
+    Le résultat renvoyé peut être partagé: ne pas le modifier.
+
+    Si le cluster est injoignable (ou l'index absent), la recherche est servie
+    par l'index local (search_local_incidents, réponse marquée "engine": "local").
+    Après OS_BREAKER_FAILURES échecs consécutifs, OpenSearch n'est plus
+    interrogé pendant OS_BREAKER_RESET_TIMEOUT s: le repli est alors immédiat.
+    """
+    mode = mode or SEARCH_MODE
+    if not search_breaker.allow():
+        return _local_fallback(query_text, size, "disjoncteur ouvert")
+    key = _search_cache_key(index_name, query_text, size, mode, profile)
+    generation = None
+    if _needs_generation(use_cache, mode):
+        try:
+            generation = get_index_generation(client, index_name)
+        except Exception as e:
+            reason = _generation_error(e, index_name)
+            if reason:
+                return _local_fallback(query_text, size, reason)
+            use_cache = False
+    if use_cache:
+        cached = _cached_search(key, generation, query_text)
+        if cached is not MISSING:
+            return cached
+
+    kind, request = _search_request(index_name, query_text, size, mode, generation, profile)
+    print(f"Exécution de la recherche RAG (Corrigée v2, {kind}) pour: '{query_text}'")
+    try:
+        if kind == "msearch":
+            result = fuse_hybrid_responses(client.msearch(index=index_name, body=request)["responses"], size)
+        else:
+            result = client.search(index=index_name, body=request)
+    except Exception as e:
+        reason = _search_error(e, index_name)
+        return _local_fallback(query_text, size, reason) if reason else _empty_search_result()
+    return _search_done(key, result, generation, use_cache)
+
+async def search_semantic_incidents_async(
+    client: AsyncOpenSearch,
+    index_name: str,
+    query_text: str,
+    size: int = 3,
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+    profile: str = DEFAULT_RETRIEVAL_PROFILE,
+) -> Dict[str, Any]:
+    """
+    Variante asynchrone de search_semantic_incidents (n'occupe pas l'event loop
+    pendant la recherche). Le calcul de l'embedding de la question (mode
+    hybride) et le repli sur l'index local s'exécutent dans le threadpool.
+    """
+    mode = mode or SEARCH_MODE
+    if not search_breaker.allow():
+        return await run_in_threadpool(_local_fallback, query_text, size, "disjoncteur ouvert")
+    key = _search_cache_key(index_name, query_text, size, mode, profile)
+    generation = None
+    if _needs_generation(use_cache, mode):
+        try:
+            generation = await get_index_generation_async(client, index_name)
+        except Exception as e:
+            reason = _generation_error(e, index_name)
+            if reason:
+                return await run_in_threadpool(_local_fallback, query_text, size, reason)
+            use_cache = False
+    if use_cache:
+        cached = _cached_search(key, generation, query_text)
+        if cached is not MISSING:
+            return cached
+
+    if mode == "hybrid":
+        # Chargement du modèle d'embeddings (disque) et embed_query: hors de l'event loop
+        kind, request = await run_in_threadpool(_search_request, index_name, query_text, size, mode, generation, profile)
+    else:
+        kind, request = _search_request(index_name, query_text, size, mode, generation, profile)
+    print(f"Exécution de la recherche RAG (Corrigée v2, {kind}) pour: '{query_text}'")
+    try:
+        if kind == "msearch":
+            response = await client.msearch(index=index_name, body=request)
+            result = fuse_hybrid_responses(response["responses"], size)
+        else:
+            result = await client.search(index=index_name, body=request)
     except Exception as e:
-        print(f"Erreur lors de la recherche OpenSearch: {e}")
-        return {"hits": {"hits": [], "total": {"value": 0}}}
\ No newline at end of file
+        reason = _search_error(e, index_name)
+        if reason:
+            return await run_in_threadpool(_local_fallback, query_text, size, reason)
+        return _empty_search_result()
+    return _search_done(key, result, generation, use_cache)
+
+# --- Recherche publique à facettes (/search) ---
+
+# Champs renvoyés par /search (ni full_text_search ni embedding)
+FACETED_SEARCH_SOURCE = [
+    "event_id", "type", "classification", "start_datetime", "end_datetime",
+    "description", "organizational_unit", "declared_by",
+]
+
+def faceted_search_sort(query_text: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Tri de /search: pertinence si une question est donnée, sinon incidents les
+    plus récents. event_id (unique) départage les égalités: indispensable pour
+    que search_after ne saute ni ne répète aucun document.
+    """
+    if query_text:
+        return [{"_score": "desc"}, {"event_id": "asc"}]
+    return [{"start_datetime": {"order": "desc", "missing": "_last"}}, {"event_id": "asc"}]
+
+def build_faceted_search_body(
+    query_text: Optional[str] = None,
+    event_types: Optional[List[str]] = None,
+    classifications: Optional[List[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    unit: Optional[str] = None,
+    unit_id: Optional[int] = None,
+    size: int = 20,
+    search_after: Optional[List[Any]] = None,
+    with_facets: bool = True,
+) -> Dict[str, Any]:
+    """
+    Requête de /search: texte intégral (french_analyzer) + filtres exacts,
+    facettes (agrégations) et surlignage. Les filtres sont en contexte
+    "filter" (non notés, mis en cache par OpenSearch); les facettes portent
+    donc sur les résultats filtrés.
+
+    Args:
+        start / end: Bornes ISO de start_datetime, intervalle [start, end)
+        search_after: Valeurs de tri du dernier résultat de la page précédente
+    """
+    filters: List[Dict[str, Any]] = []
+    if event_types:
+        filters.append({"terms": {"type": event_types}})
+    if classifications:
+        filters.append({"terms": {"classification": classifications}})
+    if start or end:
+        date_range = {}
+        if start:
+            date_range["gte"] = start
+        if end:
+            date_range["lt"] = end
+        filters.append({"range": {"start_datetime": date_range}})
+    if unit:
+        filters.append({"term": {"organizational_unit.name.keyword": unit}})
+    if unit_id is not None:
+        filters.append({"term": {"organizational_unit.unit_id": unit_id}})
+
+    must: List[Dict[str, Any]] = []
+    if query_text:
+        must.append({
+            "simple_query_string": {
+                "query": query_text,
+                # full_text_search contient déjà risques, mesures et personnes (champs nested)
+                "fields": ["description^3", "full_text_search"],
+                "default_operator": "AND",
+            }
+        })
+
+    body: Dict[str, Any] = {
+        "size": size,
+        "_source": FACETED_SEARCH_SOURCE,
+        "query": {"bool": {"must": must or [{"match_all": {}}], "filter": filters}},
+        "sort": faceted_search_sort(query_text),
+        "track_total_hits": True,
+    }
+    if query_text:
+        body["highlight"] = {
+            "fields": {"description": {}, "full_text_search": {}},
+            "pre_tags": ["<em>"],
+            "post_tags": ["</em>"],
+            "fragment_size": 150,
+            "number_of_fragments": 2,
+        }
+    if search_after:
+        body["search_after"] = search_after
+    if with_facets:
+        body["aggs"] = {
+            "type": {"terms": {"field": "type", "size": SEARCH_FACET_SIZE}},
+            "classification": {"terms": {"field": "classification", "size": SEARCH_FACET_SIZE}},
+            "unit": {"terms": {"field": "organizational_unit.name.keyword", "size": SEARCH_FACET_SIZE}},
+            "month": {
+                "date_histogram": {
+                    "field": "start_datetime",
+                    "calendar_interval": "month",
+                    "format": "yyyy-MM",
+                    "min_doc_count": 1,
+                }
+            },
+        }
+    return body
+
+def parse_facets(aggregations: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Agrégations -> {facette: [{value, count}]}"""
+    facets = {}
+    for name, aggregation in aggregations.items():
+        facets[name] = [
+            {"value": bucket.get("key_as_string", bucket["key"]), "count": bucket["doc_count"]}
+            for bucket in aggregation.get("buckets", [])
+        ]
+    return facets
@@ -1,7 +1,7 @@
 # services/sql_service.py
 
 import os
-from database import query_db, get_db_connection
+from database import query_db, get_db_connection, release_db_connection, run_in_db_executor
 from psycopg2.extras import RealDictCursor
 from typing import List, Dict, Any, Tuple
 
@@ -83,7 +83,7 @@ def get_database_schema() -> str:
         return "Error: Could not retrieve schema."
     finally:
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 def execute_safe_sql(sql_query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
     """
@@ -117,4 +117,8 @@ def execute_safe_sql(sql_query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
     except Exception as e:
         print(f"Error during SQL execution: {e}")
         # Renvoyer l'erreur pour que le LLM puisse la corriger
-        return [{"Error": str(e)}], []  
\ No newline at end of file
+        return [{"Error": str(e)}], []  
+
+async def execute_safe_sql_async(sql_query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Version async de execute_safe_sql (exécutée dans l'exécuteur DB, hors de l'event loop)."""
+    return await run_in_db_executor(execute_safe_sql, sql_query)
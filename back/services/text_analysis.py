@@ -0,0 +1,97 @@
+# services/text_analysis.py
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+# Analyse de texte française en Python pur, proche du "french_analyzer" de
+# l'index OpenSearch (minuscules, suppression des accents, élisions, mots
+# vides, racinisation légère). Sert aux modèles calculés localement
+# (embeddings, moteur de recherche embarqué).
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Ligatures non décomposées par NFKD
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents ni ligatures (équivalent lowercase + asciifolding)"""
+    decomposed = unicodedata.normalize("NFKD", text.translate(_LIGATURES))
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+# Liste "_french_" de Lucene (mots vides), repliée comme les tokens
+FRENCH_STOPWORDS = frozenset(fold(word) for word in """
+    au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me même
+    mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton
+    tu un une vos votre vous c d j l à m n s t y été étée étées étés étant étante étants étantes
+    suis es est sommes êtes sont serai seras sera serons serez seront serais serait serions seriez
+    seraient étais était étions étiez étaient fus fut fûmes fûtes furent sois soit soyons soyez
+    soient fusse fusses fût fussions fussiez fussent ayant ayante ayantes ayants eu eue eues eus
+    ai as avons avez ont aurai auras aura aurons aurez auront aurais aurait aurions auriez auraient
+    avais avait avions aviez avaient eut eûmes eûtes eurent aie aies ait ayons ayez aient eusse
+    eusses eût eussions eussiez eussent ceci cela celà cet cette ici ils les leurs quel quels
+    quelle quelles sans soi
+""".split())
+
+# Suffixes retirés par stem(): (suffixe, remplacement, longueur minimale du mot)
+_SUFFIX_RULES = (
+    ("issement", "ir", 9),    # établissement -> établir
+    ("issant", "ir", 8),      # glissant -> glisir (même racine que glissement)
+    ("ivement", "if", 8),     # préventivement -> préventif
+    ("ement", "", 7),         # rapidement -> rapid
+    ("atrice", "at", 8),
+    ("ateur", "at", 7),       # opérateur -> opérat
+    ("ation", "at", 7),       # opération -> opérat
+    ("euse", "eu", 6),        # dangereuse -> dangereu (comme dangereux)
+    ("ive", "if", 5),         # préventive -> préventif
+    ("elle", "el", 6),        # manuelle -> manuel
+    ("enne", "en", 6),
+    ("iere", "ier", 6),       # première -> premier
+    ("ite", "", 6),           # sécurité -> sécur
+)
+
+
+@lru_cache(maxsize=100_000)
+def stem(token: str) -> str:
+    """
+    Racinisation légère (approximation du stemmer "light_french" de Lucene):
+    pluriels, principaux suffixes dérivationnels, e final et consonne doublée.
+    Le token doit déjà être replié (fold).
+    """
+    if len(token) <= 3 or token.isdigit():
+        return token
+
+    word = token
+    # Pluriels: -aux -> -al (chevaux), puis x / s final
+    if len(word) > 5 and word.endswith("aux") and not word.endswith("eaux"):
+        word = word[:-3] + "al"
+    elif word[-1] in "xs":
+        word = word[:-1]
+
+    for suffix, replacement, min_length in _SUFFIX_RULES:
+        if len(word) >= min_length and word.endswith(suffix):
+            word = word[: -len(suffix)] + replacement
+            break
+
+    if len(word) > 4 and word.endswith("e"):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] == word[-2] and word[-1].isalpha():
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens alphanumériques repliés (les élisions l', d'... deviennent des tokens isolés)"""
+    return _TOKEN_RE.findall(fold(text or ""))
+
+
+def analyze(text: str) -> List[str]:
+    """Termes indexables d'un texte: tokens repliés, sans mots vides, racinisés"""
+    return [
+        stem(token)
+        for token in tokenize(text)
+        if (len(token) > 1 or token.isdigit()) and token not in FRENCH_STOPWORDS
+    ]
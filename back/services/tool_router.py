@@ -0,0 +1,330 @@
+# services/tool_router.py
+
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.text_analysis import fold, stem
+
+# Routage local des questions de l'agent ("sql" ou "search") avant l'appel
+# Bedrock decide_tool: règles (expressions régulières tirées des exemples du
+# prompt de routage) + régression logistique NumPy sur les règles et des
+# n-grammes hachés, entraînable sur les décisions du LLM journalisées.
+# Le LLM n'est appelé que si la probabilité reste entre les deux seuils.
+TOOL_ROUTER_MODE = os.getenv("TOOL_ROUTER_MODE", "hybrid")  # hybrid | llm | local
+TOOL_ROUTER_THRESHOLD = float(os.getenv("TOOL_ROUTER_THRESHOLD", "0.85"))  # confiance minimale sans LLM
+_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+TOOL_ROUTER_MODEL = os.getenv("TOOL_ROUTER_MODEL", os.path.join(_MODELS_DIR, "tool_router.npz"))
+TOOL_ROUTER_LOG = os.getenv("TOOL_ROUTER_LOG", os.path.join(_MODELS_DIR, "tool_router_decisions.jsonl"))
+
+ROUTER_MODES = ("hybrid", "llm", "local")
+HASH_BUCKETS = 2048
+
+# (nom, motif sur le texte replié, poids initial: > 0 vers "sql", < 0 vers "search")
+ROUTING_RULES: Tuple[Tuple[str, str, float], ...] = (
+    # --- Comptages, agrégats, listes filtrées: "sql" ---
+    ("combien", r"\bcombien\b|\bhow (many|much)\b", 3.0),
+    ("nombre", r"\bnombres? (de\b|d['’]|total\b)|\bnumber of\b", 3.0),
+    ("top_n", r"\btop\b|\b\d+ (premiers|premieres|plus)\b", 3.0),
+    ("superlatif", r"\ble (plus|moins) (de\b|d['’])|\bles plus (frequent|courant)|\b(the )?(most|least) (common|frequent)\b", 3.0),
+    ("agregat", r"\b(moyennes?|totals?|totaux|sommes?|pourcentages?|proportions?|taux|ratios?|average|sum|percentage)\b", 3.0),
+    ("graphique", r"\b(graphiques?|graphes?|graphs?|diagrammes?|charts?|histogrammes?|courbes?|camemberts?|plots?)\b", 3.0),
+    ("regroupement", r"\b(par|per|by) (mois|annees?|ans|semaines?|jours?|trimestres?|unites?|types?|classifications?"
+                     r"|regions?|sites?|employes?|services?|month|year|week|day|unit|type)\b", 3.0),
+    ("statistiques", r"\b(repartition|statistiques?|stats|distribution|evolution|tendances?|classement)\b", 2.5),
+    ("compter", r"\b(compter?|comptes|denombre\w*|count)\b", 3.0),
+    ("export", r"\b(tableau|csv|excel)\b", 2.0),
+    ("lister", r"\b(liste[rsz]?|affiche[rsz]?|montre[rsz]?|enumere\w*|list|show|display)\b", 1.5),
+    ("tous_les", r"\b(tous|toutes) (les|mes)\b|\ball (the )?(incidents|events|evenements)\b", 1.5),
+    ("periode", r"\b(dernier|derniere|derniers|dernieres|ce|cette|cet|last|this) (mois|annee|semaine|trimestre"
+                r"|month|year|week|quarter)\b|\bdepuis\b|\bsince\b|\b(19|20)\d\d\b", 1.5),
+    ("type_de", r"\bquel(le)?s? (types?|sortes?|categories?|genres?) d|\bwhich (types?|kinds?) of\b", 1.5),
+    # --- Questions ouvertes, raisonnement, recommandations: "search" ---
+    ("pourquoi", r"\bpourquoi\b|\bwhy\b", -3.0),
+    ("prevention", r"\bcomment (prevenir|eviter|reduire|ameliorer|empecher|limiter)\b|\bprevenir\b|\bprevention\b"
+                   r"|\bhow (to|can we|could we|do we) (prevent|avoid|reduce|improve)\b", -3.0),
+    ("recommandation", r"\b(propose[rsz]?|suggere[rsz]?|recommand\w*|conseil\w*|bonnes? pratiques?|suggest\w*"
+                       r"|recommend\w*|advice)\b", -3.0),
+    ("plan_action", r"\bplans? d['’]actions?\b|\baction plans?\b", -3.0),
+    ("recit", r"\bque s['’]est-il passe\b|\bqu['’]est-il arrive\b|\bwhat happened\b|\bdecri[rst]\w*|\bdescribe\b"
+              r"|\braconte\w*|\bexplique\w*|\bexplain\w*|\bresume[rsz]?\b|\bsummari[sz]e\b", -3.0),
+    ("contrefactuel", r"\b(auraient|aurait|aurions|auriez) pu\b|\bevitables?\b|\bcould have been\b|\bpreventable\b", -5.0),
+    ("causes", r"\b(causes?|raisons?|facteurs?|origines?) (de\b|du\b|des\b|d['’]|principales?|racines?|profondes?)"
+               r"|\broot causes?\b|\bcontributing factors?\b|\blecons?\b|\blessons?\b", -3.0),
+    ("implication", r"\bimpliqu\w*|\binvolv\w*|\bconcern\w*|\ben lien avec\b|\brelated to\b", -2.0),
+    ("similarite", r"\b(similaires?|semblables?|comparables?|similar)\b|\bressembl\w*", -2.5),
+    ("circonstances", r"\bpar temps\b|\bquand\b|\blorsque\b|\bdans quelles? (circonstances?|conditions?)\b|\bwhen\b", -1.5),
+    ("exemples", r"\b(exemples?|cas|examples?)\b", -1.5),
+)
+
+_COMPILED_RULES = [(name, re.compile(pattern), weight) for name, pattern, weight in ROUTING_RULES]
+RULE_NAMES = tuple(name for name, _, _ in ROUTING_RULES)
+
+# Exemples de routage du prompt de BedrockService.decide_tool (contrôle des règles)
+SEED_EXAMPLES: Tuple[Tuple[str, str], ...] = (
+    ("Affiche tous les événements du dernier mois en Abitibi", "sql"),
+    ("Quels événements impliquent des escaliers par temps froid?", "search"),
+    ("Liste toutes les blessures qui auraient pu être évitées avec un casque", "search"),
+    ("Quels types de machines sont impliquées dans le plus de blessures ?", "sql"),
+    ("Propose un plan d'action pour réduire la gravité...", "search"),
+    ("How many incidents happened last month?", "sql"),
+    ("Give me the top 5 units by number of incidents", "sql"),
+    ("Generate a graph of incidents per month", "sql"),
+    ("Why do falls happen in the warehouse?", "search"),
+    ("How to prevent back injuries?", "search"),
+    ("What happened during the forklift incident?", "search"),
+)
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=4096)
+def extract_features(user_query: str) -> np.ndarray:
+    """
+    Indices des caractéristiques actives (binaires): règles déclenchées puis
+    unigrammes et bigrammes racinisés hachés dans HASH_BUCKETS cases.
+    Les mots interrogatifs sont gardés (pas de suppression des mots vides).
+    Mémorisé: les mêmes questions reviennent souvent (tableau à ne pas modifier).
+    """
+    folded = fold(user_query or "")
+    active = {i for i, (_, pattern, _) in enumerate(_COMPILED_RULES) if pattern.search(folded)}
+    tokens = [stem(token) for token in _TOKEN_RE.findall(folded)]
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    offset = len(_COMPILED_RULES)
+    # crc32: hachage stable entre processus (hash() est salé)
+    active.update(offset + zlib.crc32(gram.encode()) % HASH_BUCKETS for gram in grams)
+    return np.fromiter(sorted(active), dtype=np.int64)
+
+
+class ToolRouterModel:
+    """Régression logistique: probabilité que la question relève de l'outil "sql" """
+
+    def __init__(self, weights: np.ndarray, bias: float, rule_names: Sequence[str] = RULE_NAMES, trained_on: int = 0):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.rule_names = tuple(rule_names)
+        self.trained_on = trained_on
+
+    @classmethod
+    def seed(cls) -> "ToolRouterModel":
+        """Modèle initial: poids des règles, n-grammes neutres"""
+        weights = np.zeros(len(_COMPILED_RULES) + HASH_BUCKETS)
+        weights[:len(_COMPILED_RULES)] = [weight for _, _, weight in _COMPILED_RULES]
+        return cls(weights, 0.0)
+
+    def probability(self, user_query: str) -> float:
+        logit = self.bias + self.weights[extract_features(user_query)].sum()
+        return float(1.0 / (1.0 + np.exp(-logit)))
+
+    def save(self, path: str):
+        """Enregistre le modèle (npz, écriture atomique)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                weights=self.weights,
+                bias=np.array(self.bias),
+                rule_names=np.array(self.rule_names, dtype=str),
+                trained_on=np.array(self.trained_on),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ToolRouterModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["weights"], float(data["bias"]), data["rule_names"].tolist(), int(data["trained_on"]))
+
+
+def train_tool_router(
+    examples: Sequence[Tuple[str, str]],
+    epochs: int = 300,
+    learning_rate: float = 0.5,
+    l2: float = 1e-3,
+) -> ToolRouterModel:
+    """
+    Entraîne le modèle sur des (question, outil) par descente de gradient
+    (log-loss, lot complet). Les poids partent de ceux des règles et la
+    régularisation L2 les y ramène: avec peu d'exemples, le modèle reste
+    proche des règles.
+    """
+    if not examples:
+        raise Exception("Aucun exemple pour entraîner le routeur")
+
+    seed = ToolRouterModel.seed()
+    features = [extract_features(query) for query, _ in examples]
+    rows = np.repeat(np.arange(len(features)), [len(f) for f in features])
+    cols = np.concatenate(features)
+    labels = np.array([1.0 if tool == "sql" else 0.0 for _, tool in examples])
+    n_examples, n_features = len(examples), len(seed.weights)
+
+    weights, bias = seed.weights.copy(), 0.0
+    for _ in range(epochs):
+        # Matrice creuse binaire (rows, cols): X.w et X^T.erreur par bincount
+        logits = bias + np.bincount(rows, weights=weights[cols], minlength=n_examples)
+        errors = 1.0 / (1.0 + np.exp(-logits)) - labels
+        gradient = np.bincount(cols, weights=errors[rows], minlength=n_features) / n_examples
+        weights -= learning_rate * (gradient + l2 * (weights - seed.weights))
+        bias -= learning_rate * errors.mean()
+
+    return ToolRouterModel(weights, bias, trained_on=n_examples)
+
+
+# ==================== DÉCISIONS DU LLM ====================
+
+_log_lock = threading.Lock()
+
+
+def log_decision(user_query: str, tool: str, probability: float):
+    """Journalise une décision du LLM (exemple d'entraînement); une erreur d'écriture est ignorée"""
+    if not TOOL_ROUTER_LOG:
+        return
+    line = json.dumps({"query": user_query, "tool": tool, "p_sql": round(probability, 4), "ts": time.time()},
+                      ensure_ascii=False)
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(TOOL_ROUTER_LOG)), exist_ok=True)
+            with open(TOOL_ROUTER_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        print(f"[ROUTER] Journal des décisions non écrit: {e}")
+
+
+def load_decision_log(path: str = TOOL_ROUTER_LOG) -> List[Tuple[str, str]]:
+    """(question, outil) journalisés; la dernière décision l'emporte pour une même question"""
+    decisions: Dict[str, str] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # ligne tronquée (écriture interrompue)
+                if entry.get("tool") in ("sql", "search") and entry.get("query"):
+                    decisions[entry["query"]] = entry["tool"]
+    except FileNotFoundError:
+        pass
+    return list(decisions.items())
+
+
+# ==================== ROUTAGE ====================
+
+_model: Optional[ToolRouterModel] = None
+_model_mtime: Optional[float] = None
+_model_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"local_sql": 0, "local_search": 0, "llm": 0, "local_seconds": 0.0}
+
+
+def get_tool_router_model() -> ToolRouterModel:
+    """Modèle entraîné (rechargé si le fichier change), ou modèle initial des règles"""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(TOOL_ROUTER_MODEL)
+    except OSError:
+        mtime = None
+
+    with _model_lock:
+        if _model is not None and mtime == _model_mtime:
+            return _model
+        model = None
+        if mtime is not None:
+            try:
+                model = ToolRouterModel.load(TOOL_ROUTER_MODEL)
+                if model.rule_names != RULE_NAMES or len(model.weights) != len(RULE_NAMES) + HASH_BUCKETS:
+                    print(f"[ROUTER] Modèle {TOOL_ROUTER_MODEL} appris sur d'autres règles, ignoré (à réentraîner).")
+                    model = None
+            except Exception as e:
+                print(f"[ROUTER] Modèle illisible {TOOL_ROUTER_MODEL}: {e}")
+        _model, _model_mtime = model or ToolRouterModel.seed(), mtime
+        return _model
+
+
+def classify_query(user_query: str, threshold: float = TOOL_ROUTER_THRESHOLD) -> Tuple[Optional[str], float]:
+    """(outil, probabilité "sql"); outil None si la confiance est sous le seuil"""
+    probability = get_tool_router_model().probability(user_query)
+    if probability >= threshold:
+        return "sql", probability
+    if probability <= 1.0 - threshold:
+        return "search", probability
+    return None, probability
+
+
+def _classify_for_route(user_query: str, mode: str) -> Tuple[Optional[str], float, float]:
+    """(outil ou None si incertain, probabilité "sql", durée en s)"""
+    started = time.perf_counter()
+    tool, probability = classify_query(user_query, 0.5 if mode == "local" else TOOL_ROUTER_THRESHOLD)
+    return tool, probability, time.perf_counter() - started
+
+
+def _record_local_decision(tool: str, probability: float, elapsed: float):
+    with _stats_lock:
+        _stats[f"local_{tool}"] += 1
+        _stats["local_seconds"] += elapsed
+    print(f"[ROUTER] Décision locale: {tool} (p_sql={probability:.3f}, {elapsed * 1e6:.0f} µs)")
+
+
+def local_decision(user_query: str, mode: str = TOOL_ROUTER_MODE) -> Optional[str]:
+    """
+    Décision locale sûre, comptée comme un routage local (l'appelant n'appelle
+    alors pas route_tool), ou None: route_tool consultera le LLM.
+    """
+    if mode == "llm":
+        return None
+    tool, probability, elapsed = _classify_for_route(user_query, mode)
+    if tool is not None:
+        _record_local_decision(tool, probability, elapsed)
+    return tool
+
+
+def route_tool(user_query: str, llm_decide: Callable[[str], str], mode: str = TOOL_ROUTER_MODE) -> str:
+    """
+    Choisit l'outil de l'agent:
+    - "hybrid": décision locale si elle est sûre, sinon llm_decide (journalisé)
+    - "llm": toujours llm_decide (journalisé, pour constituer les données d'entraînement)
+    - "local": jamais de LLM (outil le plus probable)
+    """
+    if mode == "llm":
+        tool = llm_decide(user_query)
+        log_decision(user_query, tool, get_tool_router_model().probability(user_query))
+        with _stats_lock:
+            _stats["llm"] += 1
+        return tool
+
+    tool, probability, elapsed = _classify_for_route(user_query, mode)
+    if tool is not None:
+        _record_local_decision(tool, probability, elapsed)
+        return tool
+
+    tool = llm_decide(user_query)
+    log_decision(user_query, tool, probability)
+    with _stats_lock:
+        _stats["llm"] += 1
+        _stats["local_seconds"] += elapsed
+    print(f"[ROUTER] Incertain (p_sql={probability:.3f}), décision du LLM: {tool}")
+    return tool
+
+
+def get_tool_router_stats() -> Dict[str, object]:
+    with _stats_lock:
+        stats = dict(_stats)
+    model = get_tool_router_model()
+    decisions = stats["local_sql"] + stats["local_search"] + stats["llm"]
+    local = stats["local_sql"] + stats["local_search"]
+    return {
+        "mode": TOOL_ROUTER_MODE,
+        "threshold": TOOL_ROUTER_THRESHOLD,
+        "model": "trained" if model.trained_on else "rules",
+        "trained_on": model.trained_on,
+        **{key: value for key, value in stats.items() if key != "local_seconds"},
+        "local_rate": round(local / decisions, 4) if decisions else 0.0,
+        "avg_local_us": round(stats["local_seconds"] / decisions * 1e6, 1) if decisions else 0.0,
+    }
@@ -86,28 +86,68 @@ export function Chatbot() {
         }
     }
 
+    // --- MODE QUERY EN STREAMING (Server-Sent Events de /ai/query/stream) ---
     const handleQueryMode = async (userMessage: string) => {
         setIsLoading(true)
         try {
-            const response = await fetch(`${API_BASE_URL}/ai/query`, {
+            const response = await fetch(`${API_BASE_URL}/ai/query/stream`, {
                 method: "POST",
-                headers: { "Content-Type": "application/json", accept: "application/json" },
+                headers: { "Content-Type": "application/json", accept: "text/event-stream" },
                 body: JSON.stringify({ query: userMessage }),
             })
-            const body = (await response.json()) as Record<string, unknown>
-            let answerText = "Je n'ai pas pu obtenir de réponse."
+            if (!response.ok || !response.body) {
+                setMessages((prev) => [...prev, { role: "bot", content: `Erreur API: statut ${response.status}` }])
+                return
+            }
+
+            // La réponse du bot est ajoutée au premier jeton puis complétée au fil du flux
+            let answerText = ""
+            let answerShown = false
+            const showAnswer = (text: string) => {
+                const append = !answerShown
+                answerShown = true
+                setMessages((prev) =>
+                    append
+                        ? [...prev, { role: "bot", content: text }]
+                        : [...prev.slice(0, -1), { role: "bot", content: text }],
+                )
+            }
+
+            const reader = response.body.getReader()
+            const decoder = new TextDecoder()
+            let buffer = ""
+            while (true) {
+                const { done, value } = await reader.read()
+                if (done) break
+                buffer += decoder.decode(value, { stream: true })
 
-            if (body && typeof body.response === "string") {
-                answerText = body.response
-            } else if (!response.ok) {
-                answerText = `Erreur API: statut ${response.status}`
+                // Un événement SSE se termine par une ligne vide
+                let separator
+                while ((separator = buffer.indexOf("\n\n")) !== -1) {
+                    const rawEvent = buffer.slice(0, separator)
+                    buffer = buffer.slice(separator + 2)
+                    const event = rawEvent.match(/^event: (.*)$/m)?.[1]
+                    const data = rawEvent.match(/^data: (.*)$/m)?.[1]
+                    if (!event || !data) continue
+
+                    const payload = JSON.parse(data) as Record<string, unknown>
+                    if (event === "token" && typeof payload.text === "string") {
+                        answerText += payload.text
+                        showAnswer(answerText)
+                    } else if (event === "error") {
+                        showAnswer(answerText || `Erreur de l'agent: ${String(payload.message)}`)
+                    }
+                }
+            }
+
+            if (!answerShown) {
+                showAnswer("Je n'ai pas pu obtenir de réponse.")
             }
-            setMessages((prev) => [...prev, { role: "bot", content: answerText }])
         } catch (error) {
-            console.error("Error calling /ai/query:", error)
-            throw error 
+            console.error("Error calling /ai/query/stream:", error)
+            throw error
         } finally {
-            setIsLoading(false) 
+            setIsLoading(false)
         }
     }
 